@@ -1,30 +1,49 @@
 import streamlit as st
 import datetime
 import pytz
+from config import ConfigError, get_settings
 from db.utils import SessionLocal
 from db.models import ScheduledPost
+from db.migrations import run_migrations
 
 from utils.auth import require_auth, logout_button
-from services.aws_utils import upload_to_cloudinary
-from services.instagram_api import get_instagram_accounts, post_to_instagram
+from services.aws_utils import upload_to_cloudinary, upload_multiple_to_s3
+from services.instagram_api import CAROUSEL_MAX_ITEMS
 from services.scheduler import schedule_post
-from utils.cache import get_groups_cache
+from services.account_activity import find_schedule_conflicts, SCHEDULE_CONFLICT_MINUTES
+from services.scheduling_policy import PRIORITY_LABELS, PRIORITY_NORMAL
+from services.jobs import enqueue_post_job, get_jobs
+from services.recurrence import REPEAT_PRESETS, create_template, list_templates, parse_rule, stop_template
+from utils.cache import get_groups_cache, get_account_directory
+from utils.s3_uploader import s3_uploader, take_direct_upload
 
 st.set_page_config(page_title="Instagram Bulk Poster", page_icon="📲")
 
 IST = pytz.timezone("Asia/Kolkata")
 
+# ============================== CONFIG (FAIL FAST)
+try:
+    get_settings().require("database_url", "fb_access_token")
+except ConfigError as e:
+    st.error(f"❌ {e}")
+    st.stop()
+
+# ============================== SCHEMA (ONCE PER PROCESS)
+@st.cache_resource
+def ensure_schema():
+    # Converting old unpartitioned log tables is left to `python -m db.migrations`
+    run_migrations(convert_legacy_logs=False)
+    return True
+
+ensure_schema()
+
 # ============================== AUTH
 require_auth()
 logout_button()
 
 # ============================== GET IG ACCOUNTS (FETCH ONCE AND CACHE)
-# Cache accounts in session state to avoid repeated API calls
-if 'ig_accounts' not in st.session_state:
-    with st.spinner("Loading Instagram accounts..."):
-        st.session_state.ig_accounts = get_instagram_accounts()
-
-ig_accounts = st.session_state.ig_accounts
+# Shared account directory: discovery runs once per cache period, not per session
+ig_accounts = get_account_directory()
 
 if not ig_accounts:
     st.error("❌ No linked Instagram accounts found.")
@@ -74,11 +93,41 @@ final_accounts = list(dict.fromkeys(selected_accounts + expanded_group_accounts)
 # --- Upload + Caption ---
 st.subheader("2️⃣ Upload Media & Caption")
 
-uploaded_file = st.file_uploader(
-    "Upload an image or video", 
-    type=["png","jpg","jpeg","mp4","mov","avi"],
-    help="Supported formats: Images (PNG, JPG) and Videos (MP4, MOV, AVI)"
+post_type = st.radio(
+    "Post type",
+    options=["single", "carousel"],
+    format_func=lambda x: "Single image/video" if x == "single" else f"Carousel (2-{CAROUSEL_MAX_ITEMS} items)",
+    horizontal=True,
 )
+is_carousel = post_type == "carousel"
+
+if is_carousel:
+    uploaded_files = st.file_uploader(
+        "Upload carousel images/videos (in display order)",
+        type=["png","jpg","jpeg","mp4","mov","avi"],
+        accept_multiple_files=True,
+        help=f"Upload 2 to {CAROUSEL_MAX_ITEMS} files; they appear in the carousel in upload order"
+    ) or []
+    uploaded_file = None
+    direct_upload = False
+else:
+    direct_upload = st.toggle(
+        "Upload straight to S3",
+        help="Your browser sends the file directly to S3 instead of through this app (best for large videos)"
+    )
+    if direct_upload:
+        uploaded_file = s3_uploader()
+    else:
+        uploaded_file = st.file_uploader(
+            "Upload an image or video", 
+            type=["png","jpg","jpeg","mp4","mov","avi"],
+            help="Supported formats: Images (PNG, JPG) and Videos (MP4, MOV, AVI)"
+        )
+    uploaded_files = []
+
+has_media = (2 <= len(uploaded_files) <= CAROUSEL_MAX_ITEMS) if is_carousel else bool(uploaded_file)
+if is_carousel and len(uploaded_files) > CAROUSEL_MAX_ITEMS:
+    st.warning(f"⚠️ A carousel can have at most {CAROUSEL_MAX_ITEMS} items")
 
 caption = st.text_area(
     "Caption", 
@@ -86,6 +135,25 @@ caption = st.text_area(
     help="Add your Instagram caption with hashtags and mentions"
 )
 
+def upload_media():
+    """
+    Upload the selected media to S3.
+    Returns (media_url, public_id, media_type, media_items); media_url is None on failure.
+    """
+    if direct_upload:
+        # Already in S3 and verified with HEAD; nothing to upload
+        media_url, public_id, media_type = take_direct_upload()
+        return media_url, public_id, media_type, None
+    if not is_carousel:
+        media_url, public_id, media_type = upload_to_cloudinary(uploaded_file)
+        return media_url, public_id, media_type, None
+
+    media_items, error = upload_multiple_to_s3(uploaded_files)
+    if not media_items:
+        return None, None, error, None
+    # First item doubles as the post's primary media for older views/logs
+    return media_items[0]["url"], media_items[0]["key"], "carousel", media_items
+
 # --- Schedule inputs ---
 st.subheader("3️⃣ Schedule or Post Now")
 
@@ -98,22 +166,79 @@ if "schedule_time" not in st.session_state:
     default_dt = (now_local + datetime.timedelta(minutes=5)).replace(second=0, microsecond=0)
     st.session_state.schedule_time = default_dt.time()
 
-col_date, col_time = st.columns(2)
+col_date, col_time, col_priority = st.columns(3)
 with col_date:
     schedule_date = st.date_input("📅 Schedule Date", key="schedule_date")
 with col_time:
     schedule_time = st.time_input("⏰ Schedule Time", key="schedule_time")
+with col_priority:
+    priority = st.selectbox(
+        "🚦 Priority",
+        options=list(PRIORITY_LABELS.keys()),
+        index=list(PRIORITY_LABELS.keys()).index(PRIORITY_NORMAL),
+        format_func=lambda p: PRIORITY_LABELS[p],
+        help="When several posts are due, higher priority posts go first. Use Bulk for large batches."
+    )
+
+col_repeat, col_until = st.columns(2)
+with col_repeat:
+    repeat = st.selectbox(
+        "🔁 Repeat (Post Later)",
+        options=["Does not repeat"] + list(REPEAT_PRESETS.keys()) + ["Custom rule"],
+        help="Recurring posts reuse the same media and caption at the chosen time"
+    )
+with col_until:
+    repeat_until = st.date_input("Ends on (optional)", value=None, disabled=repeat == "Does not repeat")
+if repeat == "Custom rule":
+    custom_rule = st.text_input(
+        "RRULE",
+        placeholder="FREQ=WEEKLY;BYDAY=MO,TH;BYHOUR=9,18;BYMINUTE=0",
+        help="iCalendar recurrence rule; the first occurrence is the date and time above"
+    )
+
+def build_repeat_rule():
+    """RRULE for the selected repeat option, or None for a one-off post."""
+    if repeat == "Does not repeat":
+        return None
+    rule = custom_rule.strip() if repeat == "Custom rule" else REPEAT_PRESETS[repeat]
+    if repeat_until:
+        rule += f";UNTIL={repeat_until.strftime('%Y%m%d')}T235959"
+    return rule
+
+@st.cache_data(ttl=30, show_spinner=False)
+def load_upcoming_scheduled_posts():
+    """Next 10 scheduled posts as plain dicts; cached so reruns don't re-query."""
+    db = SessionLocal()
+    try:
+        upcoming = db.query(
+            ScheduledPost.scheduled_time, ScheduledPost.ig_ids, ScheduledPost.caption
+        ).filter(
+            ScheduledPost.scheduled_time > datetime.datetime.utcnow()
+        ).order_by(ScheduledPost.scheduled_time).limit(10).all()
+        return [row._asdict() for row in upcoming]
+    finally:
+        db.close()
 
 # --- Buttons ---
 col1, col2 = st.columns(2)
 
 with col1:
     if st.button("📅 Post Later", type="secondary", use_container_width=True):
-        if not uploaded_file or not caption or not final_accounts:
+        repeat_rule = build_repeat_rule()
+        repeat_error = None
+        if repeat_rule:
+            try:
+                parse_rule(repeat_rule, datetime.datetime.combine(schedule_date, schedule_time))
+            except ValueError as e:
+                repeat_error = e
+
+        if not has_media or not caption or not final_accounts:
             st.error("⚠️ Please provide media, caption, and select at least one account")
+        elif repeat_error:
+            st.error(f"❌ Invalid repeat rule: {repeat_error}")
         else:
             with st.spinner("Uploading to AWS S3..."):
-                media_url, public_id, media_type = upload_to_cloudinary(uploaded_file)
+                media_url, public_id, media_type, media_items = upload_media()
             
             if not media_url:
                 st.error("❌ AWS upload failed.")
@@ -127,95 +252,155 @@ with col1:
                 # Convert to UTC (naive)
                 utc_dt = local_dt_tz.astimezone(datetime.timezone.utc).replace(tzinfo=None)
 
-                # Save UTC datetime to DB
-                schedule_post(
-                    final_accounts,
-                    caption,
-                    media_url,
-                    public_id,
-                    media_type,
-                    utc_dt,
-                    st.session_state.username,
-                )
+                if repeat_rule:
+                    create_template(
+                        caption[:40],
+                        final_accounts,
+                        caption,
+                        media_url,
+                        public_id,
+                        media_type,
+                        repeat_rule,
+                        naive_local,
+                        st.session_state.username,
+                        media_items=media_items,
+                        priority=priority,
+                        timezone=IST.zone,
+                    )
+                    load_upcoming_scheduled_posts.clear()
+                    st.success(f"🔁 Recurring schedule created ({repeat_rule}), first post {local_dt_tz.strftime('%Y-%m-%d %H:%M %Z')}")
+                else:
+                    conflicts = find_schedule_conflicts(final_accounts, utc_dt)
+
+                    # Save UTC datetime to DB
+                    schedule_post(
+                        final_accounts,
+                        caption,
+                        media_url,
+                        public_id,
+                        media_type,
+                        utc_dt,
+                        st.session_state.username,
+                        media_items=media_items,
+                        priority=priority,
+                    )
 
-                st.success(
-                    f"✅ Scheduled for {local_dt_tz.strftime('%Y-%m-%d %H:%M:%S %Z')}"
-                )
+                    st.success(
+                        f"✅ Scheduled for {local_dt_tz.strftime('%Y-%m-%d %H:%M:%S %Z')}"
+                    )
+                    load_upcoming_scheduled_posts.clear()
+                    if conflicts:
+                        names = sorted({ig_accounts.get(ig_id, ig_id) for ig_id, _, _ in conflicts})
+                        st.warning(
+                            f"⚠️ {len(names)} account(s) already have a post within {SCHEDULE_CONFLICT_MINUTES} "
+                            f"minutes of this one: {', '.join(names[:5])}{'...' if len(names) > 5 else ''}"
+                        )
                 st.info("📝 Note: Posts are processed every 15-20 minutes from 9am to 8pm")
 
 with col2:
     if st.button("⚡ Post Now", type="primary", use_container_width=True):
-        if not uploaded_file or not caption or not final_accounts:
+        if not has_media or not caption or not final_accounts:
             st.error("⚠️ Please provide media, caption, and select at least one account")
         else:
             with st.spinner("Uploading to AWS S3..."):
-                media_url, public_id, media_type = upload_to_cloudinary(uploaded_file)
+                media_url, public_id, media_type, media_items = upload_media()
             
             if not media_url:
                 st.error("❌ AWS upload failed.")
             else:
-                with st.spinner(f"Posting to {len(final_accounts)} accounts... Do not refresh or close the tab."):
-                    results = post_to_instagram(
-                        final_accounts, 
-                        media_url, 
-                        caption, 
-                        public_id, 
-                        media_type, 
-                        username=st.session_state.username
-                    )
-                
-                st.subheader("📊 Results")
-                successful = len([r for r in results if "✅" in r])
-                st.metric("Success Rate", f"{successful}/{len(final_accounts)}")
-                
-                for r in results:
-                    if "✅" in r:
-                        st.success(r)
-                    else:
-                        st.error(r)
+                job_id = enqueue_post_job(
+                    final_accounts,
+                    caption,
+                    media_url,
+                    public_id,
+                    media_type,
+                    st.session_state.username,
+                    media_items=media_items,
+                )
+                st.success(f"✅ Posting started in the background (job `{job_id[:8]}`)")
+                st.info("📝 You can keep working or close this tab - progress is shown below")
+
+# ============================== Post Now Jobs (polls lightweight progress from the DB)
+@st.fragment(run_every=5)
+def show_post_jobs():
+    jobs = get_jobs(st.session_state.username)
+    if not jobs:
+        return
+
+    st.subheader("📊 Post Now Jobs")
+    for job in jobs:
+        created = job["created_at"].replace(tzinfo=datetime.timezone.utc).astimezone(IST)
+        label = f"`{job['id'][:8]}` · {job['media_type']} · {created.strftime('%Y-%m-%d %H:%M IST')}"
+
+        if job["status"] in ("queued", "running"):
+            done = job["completed"]
+            st.progress(
+                done / job["total"] if job["total"] else 0.0,
+                text=f"⏳ {label} - {job['status']} ({done}/{job['total']} accounts)",
+            )
+            continue
+
+        icon = "✅" if job["status"] == "done" and job["succeeded"] == job["total"] else "⚠️"
+        with st.expander(f"{icon} {label} - {job['succeeded']}/{job['total']} posted"):
+            if job["error"]:
+                st.error(f"❌ {job['error']}")
+            for r in (job["results"] or "").splitlines():
+                if "✅" in r:
+                    st.success(r)
+                else:
+                    st.error(r)
+
+show_post_jobs()
 
 # ============================== Show Upcoming Scheduled Posts
 def show_upcoming_scheduled_posts():
     """Display upcoming scheduled posts in the sidebar"""
-    db = SessionLocal()
     try:
-        # Get upcoming scheduled posts
-        upcoming = db.query(ScheduledPost).filter(
-            ScheduledPost.scheduled_time > datetime.datetime.utcnow()
-        ).order_by(ScheduledPost.scheduled_time).limit(10).all()
+        upcoming = load_upcoming_scheduled_posts()
         
         if upcoming:
             st.sidebar.subheader("📅 Upcoming Scheduled Posts")
-            st.sidebar.caption("(May take a few minutes to process)")
+            st.sidebar.caption("(May take a few minutes to process) · per-account view on the Timeline page")
             
             for post in upcoming:
                 # Convert UTC to IST for display
-                utc_time = post.scheduled_time.replace(tzinfo=datetime.timezone.utc)
+                utc_time = post["scheduled_time"].replace(tzinfo=datetime.timezone.utc)
                 ist_time = utc_time.astimezone(IST)
                 
                 # Get account names
-                account_ids = post.ig_ids.split(',')
-                account_names = []
-                for ig_id in account_ids:
-                    name = ig_accounts.get(ig_id, f"ID:{ig_id}")
-                    account_names.append(name)
+                account_names = [ig_accounts.get(ig_id, f"ID:{ig_id}") for ig_id in post["ig_ids"].split(',')]
                 
                 # Display post info
                 st.sidebar.write("---")
                 st.sidebar.write(f"⏰ **{ist_time.strftime('%Y-%m-%d %H:%M IST')}**")
                 st.sidebar.write(f"📱 {', '.join(account_names[:2])}{'...' if len(account_names) > 2 else ''}")
-                st.sidebar.write(f"💬 {post.caption[:50]}{'...' if len(post.caption) > 50 else ''}") # type: ignore
+                st.sidebar.write(f"💬 {post['caption'][:50]}{'...' if len(post['caption']) > 50 else ''}")
         else:
             st.sidebar.info("No upcoming scheduled posts")
             
     except Exception as e:
         st.sidebar.error(f"Error loading scheduled posts: {e}")
-    finally:
-        db.close()
 
 # Show upcoming posts
 show_upcoming_scheduled_posts()
 
+# ============================== Recurring schedules
+def show_recurring_schedules():
+    """List the user's active recurring schedules in the sidebar, with a Stop button."""
+    templates = list_templates(username=st.session_state.username)
+    if not templates:
+        return
+    st.sidebar.markdown("---")
+    st.sidebar.subheader("🔁 Recurring Schedules")
+    for t in templates:
+        st.sidebar.write(f"**{t['name']}** · {t['media_type']}")
+        st.sidebar.caption(f"{t['rrule']} from {t['dtstart'].strftime('%Y-%m-%d %H:%M')} {t['timezone']}")
+        if st.sidebar.button("⏹️ Stop", key=f"stop_template_{t['id']}"):
+            stop_template(t["id"])
+            st.rerun()
+
+show_recurring_schedules()
+
 # Add scheduler status in sidebar
 st.sidebar.markdown("---")
 st.sidebar.subheader("⚙️ Scheduler Status")
@@ -0,0 +1,218 @@
+"""
+End-to-end throughput benchmark for services/instagram_api.post_to_instagram.
+
+Runs the real posting engine against the local fake Graph API and reports, for
+every (media type x account count) combination: wall time, simulated wall time,
+Graph API call count (per endpoint) and success rate.
+
+Sleeps inside the posting engine and processing latency in the fake server are
+both compressed by --time-scale, so a 30-account video run takes seconds.
+The DB log write, account leases, publish records and S3 cleanup are skipped;
+only the Graph API path is measured.
+
+Examples:
+    python -m benchmarks.bench_posting --accounts 1,10,30 --media image,video,carousel
+    python -m benchmarks.bench_posting --save-baseline benchmarks/baseline.json
+    python -m benchmarks.bench_posting --baseline benchmarks/baseline.json  # exits 1 on regression
+    python -m benchmarks.bench_posting --accounts 20 --shards 1,2,4  # parallel heavy workers
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fake_graph_api import FakeGraphConfig, start_in_background
+
+CAROUSEL_ITEMS = [
+    {"url": "https://example.com/1.jpg", "key": "uploads/1.jpg", "type": "image"},
+    {"url": "https://example.com/2.jpg", "key": "uploads/2.jpg", "type": "image"},
+    {"url": "https://example.com/3.mp4", "key": "uploads/3.mp4", "type": "video"},
+]
+
+class ScaledTime:
+    """Stand-in for the time module inside the posting engine that compresses sleeps."""
+
+    def __init__(self, scale):
+        self.scale = scale
+
+    def sleep(self, seconds):
+        time.sleep(seconds * self.scale)
+
+    def monotonic(self):
+        return time.monotonic() / self.scale
+
+    def __getattr__(self, name):
+        return getattr(time, name)
+
+def load_engine(base_url, time_scale):
+    """Import services.instagram_api wired to the fake server."""
+    os.environ["GRAPH_API_URL"] = base_url
+    os.environ.setdefault("FB_ACCESS_TOKEN", "fake-user-token")
+    os.environ.setdefault("DATABASE_URL", "sqlite://")  # never connected: DB writes are skipped
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "fake")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "fake")
+
+    from config import get_settings
+    from services import instagram_api, token_manager, processing_model
+
+    get_settings()  # load settings up front so it isn't counted in the first case
+    instagram_api.time = ScaledTime(time_scale)
+    instagram_api.log_post = lambda *args, **kwargs: None
+    instagram_api.delete_from_cloudinary = lambda *args, **kwargs: None
+    # DB-backed guards from services/concurrency.py: every account is free, nothing published yet
+    instagram_api.acquire_account_lease = lambda *args, **kwargs: True
+    instagram_api.wait_for_account_lease = lambda *args, **kwargs: True
+    instagram_api.holds_account_lease = lambda *args, **kwargs: True
+    instagram_api.LeaseHeartbeat.start = lambda self: self  # no background renewals
+    instagram_api.LeaseHeartbeat.stop = lambda self: None
+    instagram_api.release_account_lease = lambda *args, **kwargs: None
+    instagram_api.get_publish_record = lambda *args, **kwargs: None
+    # DB-backed token cache from services/token_manager.py: keep tokens in memory only
+    token_manager._load_tokens = lambda *args, **kwargs: {}
+    token_manager._save_tokens = lambda *args, **kwargs: None
+    # Processing history from services/processing_model.py: start without any (hand-tuned defaults)
+    processing_model._load_samples = lambda *args, **kwargs: []
+    instagram_api.record_processing_time = lambda *args, **kwargs: None
+    instagram_api.media_size_bytes = lambda *args, **kwargs: None
+    return instagram_api
+
+def run_case(engine, state, ig_ids, media_type, time_scale, verbose=False, shards=1):
+    """
+    Post to ig_ids once. With shards > 1 the accounts are split with shard_for(),
+    as the heavy workflow's matrix does, and each slice is posted by its own
+    thread standing in for one runner.
+    """
+    from services import graph_cache
+    from services.scheduling_policy import shard_for
+
+    state.reset_stats()
+    engine.metrics.reset()
+    graph_cache.clear()  # every case starts cold, as a fresh process would
+    media_items = CAROUSEL_ITEMS if media_type == "carousel" else None
+    media_url = "https://example.com/media.mp4" if media_type == "video" else "https://example.com/media.jpg"
+
+    engine_output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+    with engine_output:
+        slices = [[i for i in ig_ids if shard_for(i, shards) == shard] for shard in range(shards)]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=shards) as runners:
+            results = [r for rs in runners.map(lambda slice_ids: engine.post_to_instagram(
+                slice_ids, media_url, "benchmark caption", "uploads/media", media_type,
+                username="benchmark", media_items=media_items,
+            ), slices) for r in rs]
+        wall = time.perf_counter() - start
+
+    stats = state.stats()
+    successful = len([r for r in results if "✅" in r])
+    return {
+        "media_type": media_type,
+        "accounts": len(ig_ids),
+        "shards": shards,
+        "wall_seconds": round(wall, 3),
+        "simulated_seconds": round(wall / time_scale, 1),
+        "api_calls": stats["total_calls"],
+        "calls_by_endpoint": stats["calls"],
+        "published": stats["published"],
+        "success_rate": round(successful / len(ig_ids), 3),
+        "peak_rate_limit_usage_pct": stats["peak_usage_pct"],
+    }
+
+def find_regressions(results, baseline, tolerance):
+    """Compare against a saved baseline; returns a list of human-readable regressions."""
+    previous = {(b["media_type"], b["accounts"], b.get("shards", 1)): b for b in baseline}
+    regressions = []
+    for r in results:
+        b = previous.get((r["media_type"], r["accounts"], r["shards"]))
+        if not b:
+            continue
+        label = f"{r['media_type']} x {r['accounts']}" + (f" / {r['shards']} shards" if r["shards"] > 1 else "")
+        if r["simulated_seconds"] > b["simulated_seconds"] * (1 + tolerance):
+            regressions.append(f"{label}: time {b['simulated_seconds']}s -> {r['simulated_seconds']}s")
+        if r["api_calls"] > b["api_calls"] * (1 + tolerance):
+            regressions.append(f"{label}: API calls {b['api_calls']} -> {r['api_calls']}")
+        if r["success_rate"] < b["success_rate"] - tolerance:
+            regressions.append(f"{label}: success rate {b['success_rate']} -> {r['success_rate']}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark post_to_instagram against a fake Graph API")
+    parser.add_argument("--accounts", default="1,5,20", help="Comma-separated account counts")
+    parser.add_argument("--media", default="image,video,carousel", help="Comma-separated media types")
+    parser.add_argument("--shards", default="1", help="Comma-separated parallel worker counts")
+    parser.add_argument("--time-scale", type=float, default=0.01, help="Real seconds per simulated second")
+    parser.add_argument("--image-seconds", type=float, default=5.0, help="Simulated image processing time")
+    parser.add_argument("--video-seconds", type=float, default=60.0, help="Simulated video processing time")
+    parser.add_argument("--create-failure-rate", type=float, default=0.0)
+    parser.add_argument("--processing-error-rate", type=float, default=0.0)
+    parser.add_argument("--not-ready-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-calls", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results as JSON lines to this file")
+    parser.add_argument("--baseline", help="Baseline JSON file to compare against")
+    parser.add_argument("--save-baseline", help="Save these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression")
+    parser.add_argument("--verbose", action="store_true", help="Show the posting engine's own output")
+    args = parser.parse_args()
+
+    account_counts = [int(n) for n in args.accounts.split(",")]
+    media_types = args.media.split(",")
+    shard_counts = [int(n) for n in args.shards.split(",")]
+
+    config = FakeGraphConfig(
+        accounts=max(account_counts),
+        image_processing_seconds=args.image_seconds,
+        video_processing_seconds=args.video_seconds,
+        create_failure_rate=args.create_failure_rate,
+        processing_error_rate=args.processing_error_rate,
+        not_ready_rate=args.not_ready_rate,
+        rate_limit_calls=args.rate_limit_calls,
+        time_scale=args.time_scale,
+        seed=args.seed,
+    )
+    server, state = start_in_background(config)
+    engine = load_engine(server.base_url, args.time_scale)
+    all_ig_ids = [p["ig_id"] for p in state.pages]
+
+    results = []
+    try:
+        for media_type in media_types:
+            for n in account_counts:
+                for shards in shard_counts:
+                    result = run_case(engine, state, all_ig_ids[:n], media_type, args.time_scale, args.verbose, shards)
+                    results.append(result)
+                    print(json.dumps(result), file=sys.stderr)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    print(f"\n{'media':<10}{'accounts':>9}{'shards':>7}{'sim s':>10}{'wall s':>9}{'calls':>7}{'success':>9}")
+    for r in results:
+        print(f"{r['media_type']:<10}{r['accounts']:>9}{r['shards']:>7}{r['simulated_seconds']:>10}"
+              f"{r['wall_seconds']:>9}{r['api_calls']:>7}{r['success_rate']:>9.0%}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            for r in results:
+                f.write(json.dumps(r) + "\n")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n💾 Baseline saved to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = find_regressions(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\n❌ Performance regressions:")
+            for r in regressions:
+                print(f"  - {r}")
+            sys.exit(1)
+        print("\n✅ No regressions against baseline")
+
+if __name__ == "__main__":
+    main()
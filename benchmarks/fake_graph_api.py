@@ -0,0 +1,333 @@
+"""
+Local fake of the parts of the Facebook Graph API used by services/instagram_api.py.
+
+Simulates /me/accounts pagination, page -> Instagram account lookup, container
+creation (IMAGE, REELS, carousel items and CAROUSEL parents), processing latency,
+status polls, media_publish (including error 9007 "media not ready"), failure
+rates, app rate limiting with X-App-Usage headers, and ETag / If-None-Match
+(304 Not Modified) on successful GETs.
+
+Run standalone:
+    python -m benchmarks.fake_graph_api --accounts 30 --port 8765
+then point the app at it with GRAPH_API_URL=http://127.0.0.1:8765/v21.0
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, urlencode
+
+API_VERSION = "v21.0"
+
+@dataclass
+class FakeGraphConfig:
+    accounts: int = 10                      # Facebook pages, each with one IG account
+    max_page_size: int = 25                 # /me/accounts caps "limit" at this value
+    image_processing_seconds: float = 5.0   # simulated time to FINISHED
+    video_processing_seconds: float = 60.0
+    processing_jitter: float = 0.2          # +/- fraction applied per container
+    create_failure_rate: float = 0.0        # container creation returns an error
+    processing_error_rate: float = 0.0      # container ends in ERROR instead of FINISHED
+    not_ready_rate: float = 0.0             # publish returns 9007 even when FINISHED
+    rate_limit_calls: int = 0               # calls allowed per window (0 = unlimited)
+    rate_limit_window: float = 3600.0       # simulated seconds
+    time_scale: float = 1.0                 # real seconds per simulated second
+    seed: int = 0
+
+@dataclass
+class FakeContainer:
+    id: str
+    ig_id: str
+    media_type: str
+    created_at: float
+    ready_after: float
+    will_fail: bool = False
+    is_carousel_item: bool = False
+    children: list = field(default_factory=list)
+    published: bool = False
+
+class FakeGraphState:
+    """Thread-safe in-memory state shared by all request handlers."""
+
+    def __init__(self, config: FakeGraphConfig):
+        self.config = config
+        self.lock = threading.Lock()
+        self.random = random.Random(config.seed)
+        self.pages = [
+            {
+                "id": f"page_{i}",
+                "name": f"Fake Account {i}",
+                "access_token": f"page_token_{i}",
+                "ig_id": f"1784{i:011d}",
+            }
+            for i in range(config.accounts)
+        ]
+        self.pages_by_id = {p["id"]: p for p in self.pages}
+        self.ig_ids = {p["ig_id"] for p in self.pages}
+        self.containers = {}
+        self.published_media = []
+        self.calls = Counter()
+        self.window_start = time.monotonic()
+        self.window_calls = 0
+        self.peak_usage = 0
+
+    def reset_stats(self):
+        with self.lock:
+            self.calls.clear()
+            self.published_media.clear()
+            self.containers.clear()
+            self.window_start = time.monotonic()
+            self.window_calls = 0
+            self.peak_usage = 0
+
+    def stats(self):
+        with self.lock:
+            return {
+                "calls": dict(self.calls),
+                "total_calls": sum(self.calls.values()),
+                "published": len(self.published_media),
+                "peak_usage_pct": self.peak_usage,
+            }
+
+    # ---------------------------------------------------------------- helpers
+    def _simulated_now(self):
+        return time.monotonic() / self.config.time_scale
+
+    def record_call(self, endpoint):
+        """Count a call and return (usage_pct, limited)."""
+        with self.lock:
+            self.calls[endpoint] += 1
+            cfg = self.config
+            if not cfg.rate_limit_calls:
+                return 0, False
+            window_real = cfg.rate_limit_window * cfg.time_scale
+            if time.monotonic() - self.window_start > window_real:
+                self.window_start = time.monotonic()
+                self.window_calls = 0
+            self.window_calls += 1
+            usage = int(100 * self.window_calls / cfg.rate_limit_calls)
+            self.peak_usage = max(self.peak_usage, usage)
+            return usage, self.window_calls > cfg.rate_limit_calls
+
+    def _processing_seconds(self, media_type):
+        cfg = self.config
+        base = cfg.video_processing_seconds if media_type in ("REELS", "VIDEO") else cfg.image_processing_seconds
+        jitter = 1 + self.random.uniform(-cfg.processing_jitter, cfg.processing_jitter)
+        return base * jitter
+
+    def create_container(self, ig_id, params):
+        with self.lock:
+            if ig_id not in self.ig_ids:
+                return 400, _error(100, f"Unsupported post request. Object with ID '{ig_id}' does not exist")
+            if self.random.random() < self.config.create_failure_rate:
+                return 400, _error(2, "An unexpected error has occurred. Please retry your request later.")
+
+            media_type = params.get("media_type", "IMAGE")
+            now = self._simulated_now()
+            container = FakeContainer(
+                id=str(uuid.uuid4().int)[:17],
+                ig_id=ig_id,
+                media_type=media_type,
+                created_at=now,
+                ready_after=now,
+                is_carousel_item=params.get("is_carousel_item") == "true",
+            )
+
+            if media_type == "CAROUSEL":
+                child_ids = [c for c in params.get("children", "").split(",") if c]
+                children = [self.containers.get(c) for c in child_ids]
+                if not 2 <= len(children) <= 10 or not all(children):
+                    return 400, _error(100, "Invalid children for carousel container")
+                if not all(c.is_carousel_item and self._status(c) == "FINISHED" for c in children):
+                    return 400, _error(9007, "Media ID is not available", subcode=2207027)
+                container.children = child_ids
+                container.ready_after = now + 1
+            else:
+                container.ready_after = now + self._processing_seconds(media_type)
+                container.will_fail = self.random.random() < self.config.processing_error_rate
+
+            self.containers[container.id] = container
+            return 200, {"id": container.id}
+
+    def _status(self, container):
+        if container.published:
+            return "PUBLISHED"
+        if self._simulated_now() < container.ready_after:
+            return "IN_PROGRESS"
+        return "ERROR" if container.will_fail else "FINISHED"
+
+    def container_status(self, container_id):
+        with self.lock:
+            container = self.containers.get(container_id)
+            if not container:
+                return 400, _error(100, f"Object with ID '{container_id}' does not exist")
+            return 200, {"status_code": self._status(container), "id": container_id}
+
+    def publish(self, ig_id, creation_id):
+        with self.lock:
+            container = self.containers.get(creation_id)
+            if not container or container.ig_id != ig_id or container.is_carousel_item:
+                return 400, _error(100, "Invalid creation_id")
+            status = self._status(container)
+            if status == "PUBLISHED":
+                return 400, _error(-1, "Media already published")
+            if status != "FINISHED" or self.random.random() < self.config.not_ready_rate:
+                return 400, _error(9007, "Media ID is not available", subcode=2207027)
+            container.published = True
+            media_id = str(uuid.uuid4().int)[:17]
+            self.published_media.append((ig_id, media_id))
+            return 200, {"id": media_id}
+
+def _error(code, message, subcode=None):
+    err = {"message": message, "type": "OAuthException", "code": code, "fbtrace_id": uuid.uuid4().hex[:20]}
+    if subcode:
+        err["error_subcode"] = subcode
+    return {"error": err}
+
+class FakeGraphHandler(BaseHTTPRequestHandler):
+    state: FakeGraphState = None  # set by make_server()
+
+    def log_message(self, format, *args):
+        pass  # keep benchmark output clean
+
+    def _send(self, status, body, usage_pct=0):
+        payload = json.dumps(body).encode()
+        etag = None
+        if self.command == "GET" and status == 200:
+            etag = f'"{hashlib.md5(payload).hexdigest()}"'
+            if self.headers.get("If-None-Match") == etag:
+                status, payload = 304, b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        if etag:
+            self.send_header("ETag", etag)
+        usage = json.dumps({"call_count": usage_pct, "total_cputime": 0, "total_time": 0})
+        self.send_header("X-App-Usage", usage)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _route(self, method):
+        parsed = urlparse(self.path)
+        params = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+        if method == "POST":
+            length = int(self.headers.get("Content-Length") or 0)
+            if length:
+                body = self.rfile.read(length).decode()
+                params.update({k: v[-1] for k, v in parse_qs(body).items()})
+
+        parts = [p for p in parsed.path.split("/") if p]
+        if parts and parts[0].startswith("v") and "." in parts[0]:
+            parts = parts[1:]
+
+        if not params.get("access_token"):
+            return self._send(400, _error(190, "An active access token must be used"))
+
+        if method == "GET" and parts == ["me", "accounts"]:
+            endpoint = "me/accounts"
+        elif method == "POST" and len(parts) == 2 and parts[1] == "media":
+            endpoint = "media"
+        elif method == "POST" and len(parts) == 2 and parts[1] == "media_publish":
+            endpoint = "media_publish"
+        elif method == "GET" and len(parts) == 1 and parts[0] in self.state.pages_by_id:
+            endpoint = "page"
+        elif method == "GET" and len(parts) == 1:
+            endpoint = "status"
+        else:
+            return self._send(404, _error(803, f"Unknown path {parsed.path}"))
+
+        usage, limited = self.state.record_call(endpoint)
+        if limited:
+            return self._send(400, _error(4, "Application request limit reached"), usage)
+
+        if endpoint == "me/accounts":
+            status, body = self._accounts_page(params)
+        elif endpoint == "page":
+            page = self.state.pages_by_id[parts[0]]
+            status, body = 200, {"id": page["id"], "instagram_business_account": {"id": page["ig_id"]}}
+        elif endpoint == "media":
+            status, body = self.state.create_container(parts[0], params)
+        elif endpoint == "media_publish":
+            status, body = self.state.publish(parts[0], params.get("creation_id"))
+        else:
+            status, body = self.state.container_status(parts[0])
+        self._send(status, body, usage)
+
+    def _accounts_page(self, params):
+        limit = min(int(params.get("limit", 25)), self.state.config.max_page_size)
+        offset = int(params.get("after", 0))
+        pages = self.state.pages[offset:offset + limit]
+        body = {
+            "data": [{"id": p["id"], "name": p["name"], "access_token": p["access_token"]} for p in pages],
+            "paging": {"cursors": {"before": str(offset), "after": str(offset + len(pages))}},
+        }
+        if offset + limit < len(self.state.pages):
+            host, port = self.server.server_address[:2]
+            query = urlencode({"access_token": params["access_token"], "limit": limit, "after": offset + limit})
+            body["paging"]["next"] = f"http://{host}:{port}/{API_VERSION}/me/accounts?{query}"
+        return 200, body
+
+    def do_GET(self):
+        self._route("GET")
+
+    def do_POST(self):
+        self._route("POST")
+
+def make_server(config: FakeGraphConfig, host="127.0.0.1", port=0):
+    """
+    Create (but don't start) a fake Graph API server.
+    Returns (server, state); server.base_url is the value for GRAPH_API_URL.
+    """
+    state = FakeGraphState(config)
+    handler = type("BoundFakeGraphHandler", (FakeGraphHandler,), {"state": state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.base_url = f"http://{host}:{server.server_address[1]}/{API_VERSION}"
+    return server, state
+
+def start_in_background(config: FakeGraphConfig, host="127.0.0.1", port=0):
+    """Start a fake server on a daemon thread. Returns (server, state)."""
+    server, state = make_server(config, host, port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local fake Facebook Graph API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--accounts", type=int, default=10)
+    parser.add_argument("--image-seconds", type=float, default=5.0)
+    parser.add_argument("--video-seconds", type=float, default=60.0)
+    parser.add_argument("--create-failure-rate", type=float, default=0.0)
+    parser.add_argument("--processing-error-rate", type=float, default=0.0)
+    parser.add_argument("--not-ready-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-calls", type=int, default=0)
+    args = parser.parse_args()
+
+    config = FakeGraphConfig(
+        accounts=args.accounts,
+        image_processing_seconds=args.image_seconds,
+        video_processing_seconds=args.video_seconds,
+        create_failure_rate=args.create_failure_rate,
+        processing_error_rate=args.processing_error_rate,
+        not_ready_rate=args.not_ready_rate,
+        rate_limit_calls=args.rate_limit_calls,
+    )
+    server, _ = make_server(config, args.host, args.port)
+    print(f"🧪 Fake Graph API listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
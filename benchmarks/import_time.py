@@ -0,0 +1,114 @@
+"""
+Cold-start benchmark: measures `python -X importtime` for the app's entry modules
+and appends the results to a JSON-lines history so regressions show up over time.
+
+Also checks that heavy dependencies stay lazy, e.g. the heavy worker must not
+import streamlit and no entry module should import boto3 up front.
+
+Examples:
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --history benchmarks/importtime_history.jsonl --budget-ms 1500
+"""
+
+import argparse
+import datetime
+import json
+import os
+import re
+import subprocess
+import sys
+
+# module -> heavy packages it must NOT import at startup
+ENTRY_MODULES = {
+    "heavy_worker": ["streamlit", "boto3"],
+    "smart_checker": ["streamlit", "boto3"],
+    "services.scheduler": ["streamlit", "boto3"],
+    "services.instagram_api": ["streamlit", "boto3"],
+    "services.aws_utils": ["boto3"],
+    "utils.auth": ["boto3"],
+}
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+def measure(module, repeat=3):
+    """
+    Import `module` in fresh interpreters and return the best run.
+    Returns {"module", "cumulative_ms", "imported": set of top-level packages}.
+    """
+    env = dict(os.environ)
+    # Config lookups must not fall back to streamlit secrets during the benchmark
+    env.setdefault("GITHUB_ACTIONS", "true")
+    env.setdefault("DATABASE_URL", "postgresql://bench@localhost/bench")
+
+    best = None
+    for _ in range(repeat):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            capture_output=True, text=True, env=env,
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+
+        cumulative_us = 0
+        imported = set()
+        for line in proc.stderr.splitlines():
+            match = IMPORTTIME_LINE.match(line)
+            if not match:
+                continue
+            _, cumulative, indent, name = match.groups()
+            imported.add(name.split(".")[0])
+            if len(indent) == 1:  # top-level imports of the -c statement
+                cumulative_us += int(cumulative)
+
+        if best is None or cumulative_us < best["cumulative_ms"] * 1000:
+            best = {"module": module, "cumulative_ms": round(cumulative_us / 1000, 1), "imported": imported}
+    return best
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Track cold-start import time of entry modules")
+    parser.add_argument("--history", default="importtime_history.jsonl", help="JSON-lines file to append to")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--budget-ms", type=float, help="Fail if any module exceeds this import time")
+    args = parser.parse_args()
+
+    record = {
+        "ts": datetime.datetime.utcnow().isoformat(),
+        "revision": git_revision(),
+        "python": sys.version.split()[0],
+        "modules": {},
+    }
+    problems = []
+
+    print(f"{'module':<28}{'import ms':>10}  lazy deps")
+    for module, forbidden in ENTRY_MODULES.items():
+        result = measure(module, args.repeat)
+        leaked = sorted(set(forbidden) & result["imported"])
+        record["modules"][module] = {"cumulative_ms": result["cumulative_ms"], "eager_heavy_imports": leaked}
+        status = "✅" if not leaked else f"❌ imports {', '.join(leaked)}"
+        print(f"{module:<28}{result['cumulative_ms']:>10.1f}  {status}")
+
+        if leaked:
+            problems.append(f"{module} imports {', '.join(leaked)} at startup")
+        if args.budget_ms and result["cumulative_ms"] > args.budget_ms:
+            problems.append(f"{module} took {result['cumulative_ms']} ms (budget {args.budget_ms} ms)")
+
+    with open(args.history, "a") as f:
+        f.write(json.dumps(record) + "\n")
+    print(f"\n💾 Appended results to {args.history}")
+
+    if problems:
+        print("\n❌ Cold-start problems:")
+        for p in problems:
+            print(f"  - {p}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
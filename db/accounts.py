@@ -0,0 +1,86 @@
+"""
+Normalized account tables (scheduled_post_accounts, post_log_accounts).
+
+The comma-joined ig_ids columns are still written for compatibility, and
+these tables are written alongside them in the same transaction, so per-account
+questions become indexed lookups instead of full scans with LIKE.
+
+Rows created before the tables existed are filled in by backfill_account_tables()
+(`python -m db.migrations --backfill-accounts`).
+"""
+
+from sqlalchemy import insert, select, exists
+from db.utils import SessionLocal
+from db.models import ScheduledPost, ScheduledPostAccount, PostLog, PostLogAccount
+
+BACKFILL_BATCH_SIZE = 1000
+
+def split_ig_ids(ig_ids):
+    """"1,2,3" -> ["1", "2", "3"] (order kept, blanks and duplicates dropped)."""
+    return list(dict.fromkeys(i.strip() for i in (ig_ids or "").split(",") if i.strip()))
+
+def scheduled_post_account_rows(post_id, ig_ids):
+    return [{"post_id": post_id, "ig_id": ig_id, "position": i} for i, ig_id in enumerate(split_ig_ids(ig_ids))]
+
+def post_log_account_rows(log_id, ig_ids, logged_at):
+    return [{"log_id": log_id, "ig_id": ig_id, "logged_at": logged_at} for ig_id in split_ig_ids(ig_ids)]
+
+def bulk_insert_scheduled_posts(db, params):
+    """
+    Insert many ScheduledPosts and their account rows with two executemany calls
+    on the caller's session (the caller commits). Returns the new post ids in order.
+    """
+    if not params:
+        return []
+    post_ids = db.scalars(
+        insert(ScheduledPost).returning(ScheduledPost.id, sort_by_parameter_order=True), params
+    ).all()
+    account_rows = []
+    for post_id, p in zip(post_ids, params):
+        account_rows.extend(scheduled_post_account_rows(post_id, p["ig_ids"]))
+    if account_rows:
+        db.execute(insert(ScheduledPostAccount), account_rows)
+    return post_ids
+
+def _backfill(db, model, columns, account_model, fk_column, build_rows, batch_size):
+    """Fill account rows for `model` rows that have none, in id order. Returns rows processed."""
+    processed, last_id = 0, 0
+    while True:
+        batch = db.execute(
+            select(model.id, *columns)
+            .where(model.id > last_id)
+            .where(~exists().where(fk_column == model.id))
+            .order_by(model.id)
+            .limit(batch_size)
+        ).all()
+        if not batch:
+            return processed
+
+        rows = [r for item in batch for r in build_rows(item)]
+        if rows:
+            db.execute(insert(account_model), rows)
+        db.commit()
+        processed += len(batch)
+        last_id = batch[-1].id
+        print(f"   … {model.__tablename__}: {processed} rows backfilled")
+
+def backfill_account_tables(batch_size=BACKFILL_BATCH_SIZE):
+    """
+    Populate scheduled_post_accounts and post_log_accounts from the ig_ids columns
+    for rows written before the tables existed. Idempotent and resumable: rows that
+    already have account rows are skipped, and each batch commits on its own.
+    """
+    db = SessionLocal()
+    try:
+        posts = _backfill(
+            db, ScheduledPost, [ScheduledPost.ig_ids], ScheduledPostAccount, ScheduledPostAccount.post_id,
+            lambda p: scheduled_post_account_rows(p.id, p.ig_ids), batch_size,
+        )
+        logs = _backfill(
+            db, PostLog, [PostLog.ig_ids, PostLog.timestamp], PostLogAccount, PostLogAccount.log_id,
+            lambda l: post_log_account_rows(l.id, l.ig_ids, l.timestamp), batch_size,
+        )
+    finally:
+        db.close()
+    print(f"✅ Backfilled accounts for {posts} scheduled posts and {logs} post logs")
+    return posts, logs
@@ -0,0 +1,77 @@
+from sqlalchemy import text
+from db.utils import get_engine
+from db.models import Base
+from db.partitions import PARTITIONED_TABLES, convert_legacy_log_tables, ensure_log_partitions, is_legacy_log_table
+
+# create_all() only creates missing tables, it never alters existing ones.
+# Columns and indexes added to existing tables are listed here as idempotent DDL.
+COLUMN_MIGRATIONS = [
+    "ALTER TABLE scheduled_posts ADD COLUMN IF NOT EXISTS media_items TEXT",
+    "ALTER TABLE scheduled_posts ADD COLUMN IF NOT EXISTS priority INTEGER NOT NULL DEFAULT 1",
+    "ALTER TABLE scheduled_posts ADD COLUMN IF NOT EXISTS template_id INTEGER "
+    "REFERENCES schedule_templates(id) ON DELETE SET NULL",
+    "ALTER TABLE scheduled_posts ADD COLUMN IF NOT EXISTS keep_media BOOLEAN NOT NULL DEFAULT false",
+    "ALTER TABLE scheduled_posts ADD COLUMN IF NOT EXISTS claimed_by VARCHAR",
+    "ALTER TABLE scheduled_posts ADD COLUMN IF NOT EXISTS claimed_at TIMESTAMP",
+    "ALTER TABLE users ADD COLUMN IF NOT EXISTS last_login_at TIMESTAMP",
+    "ALTER TABLE post_jobs ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP",
+    "ALTER TABLE post_jobs ADD COLUMN IF NOT EXISTS claim_token VARCHAR",
+    "ALTER TABLE scheduled_post_accounts ADD COLUMN IF NOT EXISTS claimed_by VARCHAR",
+    "ALTER TABLE scheduled_post_accounts ADD COLUMN IF NOT EXISTS done BOOLEAN NOT NULL DEFAULT false",
+    "CREATE INDEX IF NOT EXISTS ix_scheduled_posts_scheduled_time ON scheduled_posts (scheduled_time)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_scheduled_posts_template_time "
+    "ON scheduled_posts (template_id, scheduled_time)",
+    # Drop duplicate memberships (older versions could insert them) before making them unique
+    "DELETE FROM group_accounts a USING group_accounts b "
+    "WHERE a.group_id = b.group_id AND a.ig_id = b.ig_id AND a.id > b.id",
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_group_accounts_group_ig ON group_accounts (group_id, ig_id)",
+    "CREATE INDEX IF NOT EXISTS ix_post_logs_username_timestamp ON post_logs (username, timestamp)",
+]
+
+# Until `python -m db.migrations` converts them, the app keeps logging to unpartitioned
+# tables; databases from before post_log_accounts existed get it in its old shape.
+LEGACY_LOG_MIGRATIONS = [
+    "CREATE TABLE IF NOT EXISTS post_log_accounts ("
+    "log_id INTEGER NOT NULL REFERENCES post_logs(id) ON DELETE CASCADE, "
+    "ig_id VARCHAR NOT NULL, logged_at TIMESTAMP NOT NULL, PRIMARY KEY (log_id, ig_id))",
+    "CREATE INDEX IF NOT EXISTS ix_post_log_accounts_ig_id_logged_at ON post_log_accounts (ig_id, logged_at)",
+]
+
+def run_migrations(convert_legacy_logs=True):
+    """
+    Bring the database schema up to date.
+    Safe to run repeatedly (every statement is idempotent).
+    convert_legacy_logs=False (the app) leaves unpartitioned log tables from older
+    versions alone: their one-time conversion rewrites every log row, so it only
+    runs from `python -m db.migrations`.
+    """
+    engine = get_engine()
+    with engine.begin() as conn:
+        if convert_legacy_logs:
+            # Before create_all(): the partitioned post_log_accounts needs a partitioned post_logs
+            convert_legacy_log_tables(conn)
+        legacy_logs = is_legacy_log_table(conn)
+    if legacy_logs:
+        print("⚠️ post_logs is not partitioned yet; run `python -m db.migrations` to convert it")
+        tables = [table for name, table in Base.metadata.tables.items() if name not in PARTITIONED_TABLES]
+        Base.metadata.create_all(engine, tables=tables)
+    else:
+        Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        for statement in COLUMN_MIGRATIONS + (LEGACY_LOG_MIGRATIONS if legacy_logs else []):
+            conn.execute(text(statement))
+        if not legacy_logs:
+            ensure_log_partitions(conn)
+    print("✅ Database schema is up to date")
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Apply idempotent schema migrations")
+    parser.add_argument("--backfill-accounts", action="store_true",
+                        help="Also fill the normalized account tables from existing ig_ids columns")
+    args = parser.parse_args()
+
+    run_migrations()
+    if args.backfill_accounts:
+        from db.accounts import backfill_account_tables
+        backfill_account_tables()
@@ -1,6 +1,9 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, Boolean, Enum
+from sqlalchemy import (
+    Column, Integer, BigInteger, Float, String, ForeignKey, ForeignKeyConstraint, DateTime, Text, Boolean, Enum, Index,
+)
 from sqlalchemy.orm import declarative_base, relationship
 import datetime
+import json
 import uuid
 import enum
 
@@ -18,6 +21,7 @@ class User(Base):
     role = Column(Enum(UserRole), nullable=False, default=UserRole.INTERN)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     is_active = Column(Boolean, default=True, nullable=False)
+    last_login_at = Column(DateTime, nullable=True)
     
     # Relationship to sessions
     sessions = relationship("Session", back_populates="user", cascade="all, delete-orphan")
@@ -30,13 +34,43 @@ class Group(Base):
 
 class GroupAccount(Base):
     __tablename__ = "group_accounts"
+    # An account is a member of a group at most once; also the index for membership diffs
+    __table_args__ = (Index("uq_group_accounts_group_ig", "group_id", "ig_id", unique=True),)
     id = Column(Integer, primary_key=True, autoincrement=True)
     group_id = Column(Integer, ForeignKey("groups.id"))
     ig_id = Column(String, nullable=False)
     group = relationship("Group", back_populates="accounts")
 
+class ScheduleTemplate(Base):
+    """
+    A recurring post. services/recurrence.py materializes its occurrences a bounded
+    horizon ahead into scheduled_posts, so the due-query never evaluates rules.
+    """
+    __tablename__ = "schedule_templates"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    name = Column(String, nullable=False)
+    username = Column(String, nullable=False, index=True)
+    ig_ids = Column(Text, nullable=False)
+    caption = Column(Text, nullable=False)
+    media_url = Column(String, nullable=False)
+    public_id = Column(String)
+    media_type = Column(String, nullable=False)
+    media_items = Column(Text, nullable=True)
+    priority = Column(Integer, nullable=False, default=1)
+    rrule = Column(Text, nullable=False)  # RFC 5545 rule, e.g. "FREQ=WEEKLY;BYDAY=MO,WE,FR"
+    dtstart = Column(DateTime, nullable=False)  # first occurrence, naive local time in `timezone`
+    timezone = Column(String, nullable=False, default="Asia/Kolkata")
+    active = Column(Boolean, nullable=False, default=True)
+    expanded_until = Column(DateTime, nullable=True)  # UTC; occurrences up to here are materialized
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
 class ScheduledPost(Base):
     __tablename__ = "scheduled_posts"
+    __table_args__ = (
+        Index("ix_scheduled_posts_scheduled_time", "scheduled_time"),
+        # Makes template expansion idempotent (NULL template_id rows are not constrained)
+        Index("uq_scheduled_posts_template_time", "template_id", "scheduled_time", unique=True),
+    )
     id = Column(Integer, primary_key=True, index=True)
     ig_ids = Column(String)
     caption = Column(String)
@@ -46,16 +80,144 @@ class ScheduledPost(Base):
     scheduled_time = Column(DateTime)
     username = Column(String)
     in_progress = Column(Boolean, default=False, nullable=False)
+    # JSON list of {"url", "key", "type"} dicts for carousel posts (media_type == "carousel")
+    media_items = Column(Text, nullable=True)
+    # Priority class (services/scheduling_policy.py): 0 = high, 1 = normal, 2 = bulk
+    priority = Column(Integer, nullable=False, default=1, server_default="1")
+    # Set for occurrences of a ScheduleTemplate; their media is shared, so it is kept after posting
+    template_id = Column(Integer, ForeignKey("schedule_templates.id", ondelete="SET NULL"), nullable=True)
+    keep_media = Column(Boolean, nullable=False, default=False, server_default="false")
+    # claim_label() of the unsharded heavy run that set in_progress, and when; lets the
+    # next run return the post to pending if that run died (db/workflow_lock.py)
+    claimed_by = Column(String, nullable=True)
+    claimed_at = Column(DateTime, nullable=True)
+
+    # Normalized copy of ig_ids for indexed per-account lookups (written alongside ig_ids)
+    accounts = relationship(
+        "ScheduledPostAccount", cascade="all, delete-orphan", passive_deletes=True,
+        order_by="ScheduledPostAccount.position",
+    )
+
+    def get_media_items(self):
+        # instance attribute, decoded to a plain list (None for single-media posts)
+        return json.loads(self.media_items) if self.media_items else None
+
+class PrewarmedContainer(Base):
+    """A container created and processed ahead of a ScheduledPost's time (services/prewarm.py)."""
+    __tablename__ = "prewarmed_containers"
+    post_id = Column(Integer, ForeignKey("scheduled_posts.id", ondelete="CASCADE"), primary_key=True)
+    ig_id = Column(String, primary_key=True)
+    container_id = Column(String, nullable=True)  # None if pre-warming failed
+    status = Column(String, nullable=False)  # ready | failed (created at publish time instead)
+    created_at = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
+
+class ScheduledPostAccount(Base):
+    """One row per (scheduled post, account); mirrors ScheduledPost.ig_ids."""
+    __tablename__ = "scheduled_post_accounts"
+    post_id = Column(Integer, ForeignKey("scheduled_posts.id", ondelete="CASCADE"), primary_key=True)
+    ig_id = Column(String, primary_key=True, index=True)
+    position = Column(Integer, nullable=False, default=0)  # order within ig_ids
+    # Set when a sharded heavy run (services/scheduler.py) claims this account of the post
+    claimed_by = Column(String, nullable=True)
+    done = Column(Boolean, nullable=False, default=False, server_default="false")
+
+class PostJob(Base):
+    """An immediate ("Post Now") job run by the background worker pool in services/jobs.py."""
+    __tablename__ = "post_jobs"
+    __table_args__ = (Index("ix_post_jobs_username_created_at", "username", "created_at"),)
+    id = Column(String, primary_key=True, default=lambda: uuid.uuid4().hex)
+    username = Column(String, nullable=False)
+    ig_ids = Column(Text, nullable=False)
+    caption = Column(Text, nullable=False)
+    media_url = Column(String, nullable=False)
+    public_id = Column(String)
+    media_type = Column(String, nullable=False)
+    media_items = Column(Text, nullable=True)
+    status = Column(String, nullable=False, default="queued", index=True)  # queued | running | done | failed
+    total = Column(Integer, nullable=False, default=0)
+    completed = Column(Integer, nullable=False, default=0)
+    succeeded = Column(Integer, nullable=False, default=0)
+    results = Column(Text, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, nullable=True)  # Heartbeat while running; stale jobs are re-queued
+    claim_token = Column(String, nullable=True)  # Run that claimed the job; only it may record progress
+    finished_at = Column(DateTime, nullable=True)
+
+    def get_media_items(self):
+        return json.loads(self.media_items) if self.media_items else None
+
+class AccountLease(Base):
+    """Per-account lease so only one run posts to an ig_id at a time (services/concurrency.py)."""
+    __tablename__ = "account_leases"
+    ig_id = Column(String, primary_key=True)
+    holder = Column(String, nullable=False)
+    acquired_at = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False)
+
+class PublishRecord(Base):
+    """Idempotency record per (post, account), written around media_publish."""
+    __tablename__ = "publish_records"
+    key = Column(String, primary_key=True)  # "<post key>:<ig_id>", e.g. "scheduled:42:1784..."
+    ig_id = Column(String, nullable=False)
+    container_id = Column(String, nullable=True)
+    media_id = Column(String, nullable=True)
+    status = Column(String, nullable=False, default="publishing")  # publishing | published
+    created_at = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
+    published_at = Column(DateTime, nullable=True)
+
+class ProcessingObservation(Base):
+    """Seconds a container took to reach FINISHED, per account (services/processing_model.py)."""
+    __tablename__ = "processing_observations"
+    __table_args__ = (Index("ix_processing_observations_account", "ig_id", "kind", "observed_at"),)
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    ig_id = Column(String, nullable=False)
+    kind = Column(String, nullable=False)  # image | video | carousel | carousel_video
+    size_bytes = Column(BigInteger, nullable=True)
+    seconds = Column(Float, nullable=False)
+    observed_at = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
+
+class AccessToken(Base):
+    """Cached Graph API tokens (services/token_manager.py): the long-lived user token and per-account page tokens."""
+    __tablename__ = "access_tokens"
+    key = Column(String, primary_key=True)  # "user" or "page:<ig_id>"
+    source = Column(String, nullable=False, index=True)  # fingerprint of the FB_ACCESS_TOKEN it derives from
+    token = Column(Text, nullable=False)
+    page_id = Column(String, nullable=True)
+    expires_at = Column(DateTime, nullable=True)  # None: doesn't expire (or unknown)
+    updated_at = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
 
 class PostLog(Base):
+    """Partitioned by month on timestamp (db/partitions.py), which is why it is part of the key."""
     __tablename__ = "post_logs"
+    __table_args__ = (
+        # Per-user activity on the Users page ("posts this week")
+        Index("ix_post_logs_username_timestamp", "username", "timestamp"),
+        {"postgresql_partition_by": "RANGE (timestamp)"},
+    )
     id = Column(Integer, primary_key=True, autoincrement=True)
     username = Column(String, nullable=False)
     ig_ids = Column(Text, nullable=False)
     caption = Column(Text, nullable=False)
     media_type = Column(String, nullable=False)
     results = Column(Text, nullable=False)
-    timestamp = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
+    timestamp = Column(DateTime, primary_key=True, default=datetime.datetime.utcnow)
+
+class PostLogAccount(Base):
+    """One row per (post log, account); mirrors PostLog.ig_ids for "recent posts to account X"."""
+    __tablename__ = "post_log_accounts"
+    __table_args__ = (
+        ForeignKeyConstraint(
+            ["log_id", "logged_at"], ["post_logs.id", "post_logs.timestamp"], ondelete="CASCADE"
+        ),
+        Index("ix_post_log_accounts_ig_id_logged_at", "ig_id", "logged_at"),
+        {"postgresql_partition_by": "RANGE (logged_at)"},
+    )
+    log_id = Column(Integer, primary_key=True)
+    ig_id = Column(String, primary_key=True)
+    # Copy of PostLog.timestamp so the index covers ordering; partitioned by month like post_logs
+    logged_at = Column(DateTime, primary_key=True)
     
 class Session(Base):
     __tablename__ = "sessions"
@@ -0,0 +1,16 @@
+import json
+from sqlalchemy import text
+
+# Postgres channel used to wake the dispatcher (smart_checker.py --listen)
+SCHEDULE_CHANNEL = "scheduled_posts"
+
+def notify_scheduled(db, post_id, scheduled_time):
+    """
+    Queue a NOTIFY for a newly scheduled post on the session's transaction.
+    Postgres delivers it on commit, so listeners never see uncommitted rows.
+    No-op on other databases.
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        return
+    payload = json.dumps({"id": post_id, "scheduled_time": scheduled_time.isoformat()})
+    db.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": SCHEDULE_CHANNEL, "payload": payload})
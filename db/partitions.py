@@ -0,0 +1,149 @@
+"""
+Monthly range partitions for post_logs and post_log_accounts (PostgreSQL).
+
+Both tables are partitioned by their timestamp (post_logs.timestamp,
+post_log_accounts.logged_at) into one partition per month, named
+"<table>_yYYYYmMM", plus a "<table>_default" catch-all so an insert never
+fails for lack of a partition. Queries that filter on the timestamp (the Logs
+page, per-account history) only touch the months they need, and old months can
+be archived and dropped as a whole (services/log_archive.py) instead of with a
+slow DELETE.
+
+run_migrations() calls
+- convert_legacy_log_tables() before create_all(), which converts unpartitioned
+  tables from older versions once (copying their rows; only from the
+  `python -m db.migrations` CLI, never from the app), and
+- ensure_log_partitions() after it, which creates the partitions for the
+  current month and PARTITION_MONTHS_AHEAD more.
+"""
+
+import datetime
+import re
+from sqlalchemy import text
+
+PARTITIONED_TABLES = {"post_logs": "timestamp", "post_log_accounts": "logged_at"}
+PARTITION_MONTHS_AHEAD = 3  # Rows only land in the default partition if migrations don't run for this long
+
+_PARTITION_NAME = re.compile(r"_y(\d{4})m(\d{2})$")
+
+def month_start(value):
+    """First instant of value's month (naive datetime)."""
+    return datetime.datetime(value.year, value.month, 1)
+
+def add_months(month, count):
+    """month (a month_start) moved by count months."""
+    index = month.year * 12 + month.month - 1 + count
+    return datetime.datetime(index // 12, index % 12 + 1, 1)
+
+def partition_name(table, month):
+    return f"{table}_y{month:%Y}m{month:%m}"
+
+def _relkind(conn, table):
+    """'p' for a partitioned table, 'r' for a plain one, None if missing."""
+    return conn.execute(
+        text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:table)"), {"table": table}
+    ).scalar()
+
+def is_legacy_log_table(conn):
+    """True while post_logs is still an unpartitioned table from an older version."""
+    return _relkind(conn, "post_logs") == "r"
+
+def list_partitions(conn, table):
+    """{month: partition name} of a table's monthly partitions (the default partition is left out)."""
+    rows = conn.execute(text("""
+        SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(:table)
+    """), {"table": table}).scalars()
+    partitions = {}
+    for name in rows:
+        match = _PARTITION_NAME.search(name)
+        if match and name.startswith(f"{table}_"):
+            partitions[datetime.datetime(int(match.group(1)), int(match.group(2)), 1)] = name
+    return partitions
+
+def _create_partitions(conn, table, first_month, last_month):
+    """Create the default partition and one partition per month in [first_month, last_month]."""
+    column = PARTITIONED_TABLES[table]
+    conn.execute(text(f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT"))
+    existing = list_partitions(conn, table)
+    month = first_month
+    while month <= last_month:
+        following = add_months(month, 1)
+        if month not in existing:
+            # A month whose rows already went to the default partition can't get its own partition
+            stranded = conn.execute(text(
+                f"SELECT EXISTS (SELECT 1 FROM {table}_default WHERE {column} >= :start AND {column} < :end)"
+            ), {"start": month, "end": following}).scalar()
+            if stranded:
+                print(f"⚠️ {table}_default has rows for {month:%Y-%m}; that month stays in the default partition")
+            else:
+                conn.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {partition_name(table, month)} PARTITION OF {table} "
+                    f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{following:%Y-%m-%d}')"
+                ))
+        month = following
+
+def _rename_legacy(conn, table):
+    """Move an unpartitioned table, its indexes and its id sequence out of the way."""
+    conn.execute(text(f"ALTER TABLE {table} RENAME TO {table}_legacy"))
+    indexes = conn.execute(
+        text("SELECT indexname FROM pg_indexes WHERE tablename = :table"), {"table": f"{table}_legacy"}
+    ).scalars().all()
+    for index in indexes:
+        conn.execute(text(f"ALTER INDEX {index} RENAME TO {index}_legacy"))
+    sequence = conn.execute(
+        text("SELECT pg_get_serial_sequence(:table, 'id')"), {"table": f"{table}_legacy"}
+    ).scalar() if table == "post_logs" else None
+    if sequence:
+        conn.execute(text(f"ALTER SEQUENCE {sequence} RENAME TO {table}_legacy_id_seq"))
+
+def convert_legacy_log_tables(conn, now=None):
+    """
+    One-time conversion of unpartitioned post_logs / post_log_accounts: create the
+    partitioned tables, copy every row into them and drop the old tables.
+    Runs in the caller's transaction, so a failure leaves the old tables untouched.
+    Does nothing once post_logs is partitioned (or doesn't exist yet).
+    """
+    from db.models import PostLog, PostLogAccount
+    if not is_legacy_log_table(conn):
+        return
+    now = now or datetime.datetime.utcnow()
+    print("🔧 Converting post_logs to monthly partitions (one-time)...")
+    if _relkind(conn, "post_log_accounts") == "r":
+        _rename_legacy(conn, "post_log_accounts")
+    _rename_legacy(conn, "post_logs")
+
+    PostLog.__table__.create(conn)
+    PostLogAccount.__table__.create(conn)
+    oldest = conn.execute(text("SELECT min(timestamp) FROM post_logs_legacy")).scalar()
+    first_month = month_start(oldest or now)
+    last_month = add_months(month_start(now), PARTITION_MONTHS_AHEAD)
+    for table in PARTITIONED_TABLES:
+        _create_partitions(conn, table, first_month, last_month)
+
+    logs = conn.execute(text("""
+        INSERT INTO post_logs (id, username, ig_ids, caption, media_type, results, timestamp)
+        SELECT id, username, ig_ids, caption, media_type, results, timestamp FROM post_logs_legacy
+    """)).rowcount
+    accounts = 0
+    if _relkind(conn, "post_log_accounts_legacy") == "r":
+        # logged_at is taken from the log itself: it is now part of the foreign key
+        accounts = conn.execute(text("""
+            INSERT INTO post_log_accounts (log_id, ig_id, logged_at)
+            SELECT a.log_id, a.ig_id, l.timestamp
+            FROM post_log_accounts_legacy a JOIN post_logs_legacy l ON l.id = a.log_id
+        """)).rowcount
+    conn.execute(text(
+        "SELECT setval(pg_get_serial_sequence('post_logs', 'id'), "
+        "COALESCE((SELECT max(id) FROM post_logs), 0) + 1, false)"
+    ))
+    conn.execute(text("DROP TABLE IF EXISTS post_log_accounts_legacy"))
+    conn.execute(text("DROP TABLE post_logs_legacy"))
+    print(f"✅ Moved {logs} post logs and {accounts} account rows into monthly partitions")
+
+def ensure_log_partitions(conn, now=None):
+    """Create missing partitions up to PARTITION_MONTHS_AHEAD months ahead. Idempotent."""
+    now = now or datetime.datetime.utcnow()
+    this_month = month_start(now)
+    for table in PARTITIONED_TABLES:
+        _create_partitions(conn, table, this_month, add_months(this_month, PARTITION_MONTHS_AHEAD))
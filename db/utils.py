@@ -1,23 +1,47 @@
-from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import NullPool
-from config import get_database_url
+from config import get_database_url, on_settings_reload
 
-DATABASE_URL = get_database_url()
+_engine = None
+_session_factory = None
 
-if not DATABASE_URL:
-    raise ValueError("No database URL found. Set DATABASE_URL environment variable or configure Streamlit secrets.")
+def get_engine():
+    """
+    Return the shared SQLAlchemy engine, creating it on first use.
+    Nothing connects (or even reads DATABASE_URL) until a session is needed,
+    so importing modules that use the DB stays cheap.
+    """
+    global _engine
+    if _engine is None:
+        from sqlalchemy import create_engine
+        from sqlalchemy.pool import NullPool
 
-# Use NullPool to avoid connection timeout issues
-# This creates a new connection each time instead of pooling
-engine = create_engine(
-    DATABASE_URL,
-    poolclass=NullPool,  # Don't pool connections - create fresh ones
-    pool_pre_ping=True,  # Test connections before using them
-    connect_args={
-        "connect_timeout": 10,
-        "options": "-c statement_timeout=30000"  # 30 second statement timeout
-    }
-)
+        database_url = get_database_url()  # raises ConfigError if not configured
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
\ No newline at end of file
+        # Use NullPool to avoid connection timeout issues
+        # This creates a new connection each time instead of pooling
+        _engine = create_engine(
+            database_url,
+            poolclass=NullPool,  # Don't pool connections - create fresh ones
+            pool_pre_ping=True,  # Test connections before using them
+            connect_args={
+                "connect_timeout": 10,
+                "options": "-c statement_timeout=30000"  # 30 second statement timeout
+            }
+        )
+    return _engine
+
+def SessionLocal():
+    """Open a new DB session (drop-in for the former module-level sessionmaker)."""
+    global _session_factory
+    if _session_factory is None:
+        _session_factory = sessionmaker(autocommit=False, autoflush=False, bind=get_engine())
+    return _session_factory()
+
+def _reset_engine_on_reload(old, new):
+    global _engine, _session_factory
+    if old is not None and old.database_url != new.database_url and _engine is not None:
+        _engine.dispose()
+        _engine = None
+        _session_factory = None
+
+on_settings_reload(_reset_engine_on_reload)
@@ -0,0 +1,181 @@
+"""
+Lease-based workflow lock (the workflow_locks table), shared by smart_checker.py
+and heavy_worker.py. Only needs SQLAlchemy, so the lightweight checker can use it.
+
+- A lock is held until expires_at. The holder renews it every HEARTBEAT_SECONDS
+  from a background thread, so a crashed or killed run loses it within
+  LOCK_TTL_SECONDS instead of blocking posting for hours.
+- Every acquisition increments fencing_token. Writes made on behalf of the lock
+  (claiming a scheduled post) include fence_clause(), so a run that lost its
+  lock without noticing (e.g. a long GC or network pause) can't claim more work.
+- Releasing expires the row instead of deleting it, so fencing tokens keep
+  increasing across runs.
+- Work claimed on behalf of a lock records claim_label() ("<lock name>:<token>"),
+  so the next holder can tell (live_claim_clause()) whether the claiming run
+  still holds its lock and take back the work of one that died.
+- A sharded heavy run (one job per shard) takes one lock per shard,
+  "instagram_poster:shard-<i>". get_lock_holder(LOCK_NAME) also reports those.
+"""
+
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import text, table, column, String, DateTime, BigInteger, cast, exists, or_, and_
+
+LOCK_NAME = "instagram_poster"
+LOCK_TTL_SECONDS = 180  # A holder that misses heartbeats for this long loses the lock
+HEARTBEAT_SECONDS = 60
+
+# Rows written before expires_at existed count as live for one TTL after locked_at
+LIVE_CONDITION = "(expires_at > :now OR (expires_at IS NULL AND locked_at > :legacy_cutoff))"
+
+SCHEMA_STATEMENTS = [
+    """
+    CREATE TABLE IF NOT EXISTS workflow_locks (
+        lock_name VARCHAR(100) PRIMARY KEY,
+        locked_at TIMESTAMP NOT NULL,
+        locked_by VARCHAR(200)
+    )
+    """,
+    "ALTER TABLE workflow_locks ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMP",
+    "ALTER TABLE workflow_locks ADD COLUMN IF NOT EXISTS expires_at TIMESTAMP",
+    "ALTER TABLE workflow_locks ADD COLUMN IF NOT EXISTS fencing_token BIGINT NOT NULL DEFAULT 0",
+]
+
+_workflow_locks = table(
+    "workflow_locks",
+    column("lock_name", String), column("fencing_token", BigInteger),
+    column("locked_at", DateTime), column("expires_at", DateTime),
+)
+
+def shard_lock_name(shard_index=0, shard_count=1):
+    """Lock taken by one shard of a heavy run (LOCK_NAME when the run isn't sharded)."""
+    return LOCK_NAME if shard_count <= 1 else f"{LOCK_NAME}:shard-{shard_index}"
+
+def ensure_lock_table(conn):
+    """Create workflow_locks or add the lease columns to a table created by older versions."""
+    for statement in SCHEMA_STATEMENTS:
+        conn.execute(text(statement))
+    conn.commit()
+
+def get_lock_holder(engine, name=LOCK_NAME):
+    """
+    (locked_by, locked_at, heartbeat_at) of the live holder, or None if the lock is free.
+    Shard locks ("<name>:shard-<i>") count as holders of `name`.
+    """
+    now = datetime.utcnow()
+    with engine.connect() as conn:
+        ensure_lock_table(conn)
+        row = conn.execute(text(f"""
+            SELECT locked_by, locked_at, heartbeat_at FROM workflow_locks
+            WHERE (lock_name = :name OR lock_name LIKE :shards) AND {LIVE_CONDITION}
+            ORDER BY locked_at
+            LIMIT 1
+        """), {
+            "name": name, "shards": f"{name}:shard-%", "now": now,
+            "legacy_cutoff": now - timedelta(seconds=LOCK_TTL_SECONDS),
+        }).fetchone()
+    return tuple(row) if row else None
+
+def acquire_lock(engine, holder, name=LOCK_NAME, ttl=LOCK_TTL_SECONDS):
+    """
+    Take the lock if it is free or its holder stopped heartbeating.
+    Returns the new fencing token, or None if a live holder has it.
+    """
+    now = datetime.utcnow()
+    with engine.connect() as conn:
+        ensure_lock_table(conn)
+        token = conn.execute(text("""
+            INSERT INTO workflow_locks (lock_name, locked_at, locked_by, heartbeat_at, expires_at, fencing_token)
+            VALUES (:name, :now, :holder, :now, :expires_at, 1)
+            ON CONFLICT (lock_name) DO UPDATE SET
+                locked_at = :now, locked_by = :holder, heartbeat_at = :now, expires_at = :expires_at,
+                fencing_token = workflow_locks.fencing_token + 1
+            WHERE workflow_locks.expires_at <= :now
+               OR (workflow_locks.expires_at IS NULL AND workflow_locks.locked_at <= :legacy_cutoff)
+            RETURNING fencing_token
+        """), {
+            "name": name, "holder": holder, "now": now,
+            "expires_at": now + timedelta(seconds=ttl),
+            "legacy_cutoff": now - timedelta(seconds=ttl),
+        }).scalar()
+        conn.commit()
+    return token
+
+def renew_lock(engine, token, name=LOCK_NAME, ttl=LOCK_TTL_SECONDS):
+    """Heartbeat: extend the lock. Returns False if it now belongs to someone else."""
+    now = datetime.utcnow()
+    with engine.connect() as conn:
+        renewed = conn.execute(text("""
+            UPDATE workflow_locks SET heartbeat_at = :now, expires_at = :expires_at
+            WHERE lock_name = :name AND fencing_token = :token
+        """), {"name": name, "token": token, "now": now, "expires_at": now + timedelta(seconds=ttl)}).rowcount
+        conn.commit()
+    return renewed == 1
+
+def release_lock(engine, token, name=LOCK_NAME):
+    """Expire the lock if this token still holds it. Returns True if it did."""
+    with engine.connect() as conn:
+        released = conn.execute(text("""
+            UPDATE workflow_locks SET expires_at = :now
+            WHERE lock_name = :name AND fencing_token = :token
+        """), {"name": name, "token": token, "now": datetime.utcnow()}).rowcount
+        conn.commit()
+    return released == 1
+
+def fence_clause(token, name=LOCK_NAME):
+    """
+    SQL condition that is true only while `token` holds a live lock.
+    Build it right before the write it guards (it captures the current time).
+    """
+    return text(
+        "EXISTS (SELECT 1 FROM workflow_locks WHERE lock_name = :fence_name "
+        "AND fencing_token = :fence_token AND expires_at > :fence_now)"
+    ).bindparams(fence_name=name, fence_token=token, fence_now=datetime.utcnow())
+
+class LockHeartbeat:
+    """
+    Renews a held lock every HEARTBEAT_SECONDS on a daemon thread.
+    `lost` becomes True if a renewal finds the lock taken over.
+    """
+
+    def __init__(self, engine, token, name=LOCK_NAME, interval=HEARTBEAT_SECONDS, ttl=LOCK_TTL_SECONDS):
+        self.engine, self.token, self.name = engine, token, name
+        self.interval, self.ttl = interval, ttl
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="workflow-lock-heartbeat", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                if not renew_lock(self.engine, self.token, self.name, self.ttl):
+                    self.lost = True
+                    print(f"❌ Workflow lock {self.name} was taken over (token {self.token})")
+                    return
+            except Exception as e:
+                # A missed beat is fine; the lock only expires after several
+                print(f"⚠️ Lock heartbeat failed: {e}")
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=5)
+
+def claim_label(token, name=LOCK_NAME):
+    """Value written to claimed_by columns: the lock acquisition that claimed the work."""
+    return f"{name}:{token if token is not None else 'unfenced'}"
+
+def live_claim_clause(claimed_by, now=None, ttl=LOCK_TTL_SECONDS):
+    """
+    SQL condition that is true while the claim_label() stored in the claimed_by
+    column still names a live lock. Unfenced and missing labels never match.
+    """
+    now = now or datetime.utcnow()
+    locks = _workflow_locks.c
+    return exists().where(
+        (locks.lock_name + ":" + cast(locks.fencing_token, String)) == claimed_by,
+        or_(locks.expires_at > now, and_(locks.expires_at.is_(None), locks.locked_at > now - timedelta(seconds=ttl))),
+    )
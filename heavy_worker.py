@@ -0,0 +1,155 @@
+"""
+Heavy posting worker run by the instagram-poster-heavy workflow.
+Acquires the workflow lock, runs all due scheduled posts and always releases the lock.
+The lock is a lease (db.workflow_lock) renewed by a heartbeat thread while the
+run is alive; if another run holds it, this one exits without posting.
+Never imports streamlit, so it starts quickly on a fresh runner.
+
+With PREWARM_LEAD_MINUTES set it also pre-warms containers for posts due within
+that window, then stays until those posts are due (at most MAX_WAIT_MINUTES
+after starting) so they are published on time. Due posts always go first:
+a pre-warm pass ends as soon as a post falls due.
+
+SHARD_INDEX / SHARD_COUNT (set by the workflow's matrix) make this one of
+several parallel workers that each post to their own slice of the accounts.
+Only shard 0 expands recurring schedules and runs orphaned Post Now jobs.
+"""
+
+import os
+import sys
+import time
+import traceback
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+from sqlalchemy.pool import NullPool
+
+from config import ConfigError, get_settings, install_sighup_reload
+from db.workflow_lock import acquire_lock, release_lock, get_lock_holder, shard_lock_name, LockHeartbeat
+
+MAX_WAIT_MINUTES = 300  # Stop waiting for pre-warmed posts well before the 6h GitHub Actions limit
+
+def release(engine, heartbeat, token, run_id):
+    """Stop heartbeating and release the workflow lock if this run still holds it."""
+    print('\n🔓 Releasing workflow lock...')
+    heartbeat.stop()
+    try:
+        if release_lock(engine, token, heartbeat.name):
+            print(f'✅ Lock released successfully by run {run_id}')
+        else:
+            print(f'⚠️ Lock no longer held by run {run_id} (it expired or was taken over)')
+    except Exception as lock_err:
+        print(f'❌ Error releasing lock: {lock_err}')
+        # Don't fail the workflow just because lock release failed; it expires on its own
+
+def main():
+    run_id = os.getenv('GITHUB_RUN_ID', 'unknown')
+    shard_index = int(os.getenv('SHARD_INDEX') or 0)
+    shard_count = int(os.getenv('SHARD_COUNT') or 1)
+    if not 0 <= shard_index < shard_count:
+        print(f'❌ SHARD_INDEX {shard_index} is out of range for SHARD_COUNT {shard_count}')
+        sys.exit(1)
+    is_first_shard = shard_index == 0
+
+    # Fail fast on misconfiguration instead of discovering it mid-run
+    try:
+        settings = get_settings().require('database_url', 'fb_access_token')
+    except ConfigError as e:
+        print(f'❌ {e}')
+        sys.exit(1)
+    db_url = settings.database_url
+
+    # `kill -HUP <pid>` re-reads settings without restarting a long run
+    install_sighup_reload()
+
+    print('=' * 60)
+    print(f'🚀 Heavy Poster Started at {datetime.utcnow()} UTC')
+    print(f'🔑 Run ID: {run_id}')
+    if shard_count > 1:
+        print(f'🧩 Shard {shard_index + 1} of {shard_count}')
+    print('=' * 60)
+
+    # Acquire lock at the START of heavy workflow
+    engine = create_engine(db_url, poolclass=NullPool)
+    lock_name = shard_lock_name(shard_index, shard_count)
+    token = acquire_lock(engine, run_id, lock_name)
+    if token is None:
+        holder = get_lock_holder(engine)
+        print(f"⏭️  Lock held by '{holder[0] if holder else 'another run'}', exiting without posting")
+        return
+    print(f'🔒 Lock acquired by run {run_id} (fencing token {token})')
+    heartbeat = LockHeartbeat(engine, token, lock_name).start()
+
+    try:
+        # Imported here so the lock is taken before the heavier modules load
+        from services.scheduler import run_scheduled_posts, has_due_posts
+        from services.jobs import run_orphaned_jobs
+        from services.recurrence import expand_templates
+        from services.prewarm import (
+            prewarm_upcoming, next_prewarmed_due_time, PREWARM_POLL_SECONDS, PREWARM_PASS_SECONDS,
+        )
+        from services.processing_model import prune_processing_history
+        from services.log_archive import archive_old_logs
+
+        # Top up recurring schedules whose materialized occurrences are running low
+        if is_first_shard:
+            expand_templates()
+
+        # Run the actual posting; pre-warmed posts are published once they are due
+        wait_until = datetime.utcnow() + timedelta(minutes=MAX_WAIT_MINUTES)
+        results = []
+        while True:
+            # Due posts first: pre-warming later posts must never make them late
+            results.extend(run_scheduled_posts(token, shard_index, shard_count))
+            if heartbeat.lost:
+                break
+            pass_ends = datetime.utcnow() + timedelta(seconds=PREWARM_PASS_SECONDS)
+            def should_stop():
+                return heartbeat.lost or datetime.utcnow() >= pass_ends or has_due_posts(shard_index, shard_count)
+            prewarm_upcoming(shard_index=shard_index, shard_count=shard_count, should_stop=should_stop)
+            if heartbeat.lost or datetime.utcnow() >= wait_until:
+                break
+            if should_stop():
+                continue  # Publish what fell due, then resume pre-warming
+            next_due = next_prewarmed_due_time()
+            if next_due is None or next_due > wait_until:
+                break
+            wait = max((next_due - datetime.utcnow()).total_seconds(), 1)
+            print(f'⏰ Next pre-warmed post is due at {next_due:%H:%M:%S} UTC')
+            time.sleep(min(wait, PREWARM_POLL_SECONDS))
+        if is_first_shard and not heartbeat.lost:
+            results.extend(run_orphaned_jobs())
+
+        # Processing times older than the model's window are no longer used
+        if is_first_shard:
+            prune_processing_history()
+
+        # Months of post logs past LOG_RETENTION_MONTHS move to S3; a failure must not fail the run
+        if is_first_shard and not heartbeat.lost:
+            try:
+                archive_old_logs()
+            except Exception as archive_err:
+                print(f'⚠️ Log archiving failed (will retry next run): {archive_err}')
+
+        if results:
+            print(f'\n✅ Successfully processed {len(results)} posts:')
+            for result in results:
+                print(f'  - {result}')
+        else:
+            print('\n📭 No posts were due (they may have been processed already)')
+
+        print('\n' + '=' * 60)
+        print('✅ Heavy Poster Complete')
+        print('=' * 60)
+
+    except Exception as e:
+        print(f'\n❌ Error in heavy poster: {e}')
+        traceback.print_exc()
+        sys.exit(1)
+
+    finally:
+        # Always release lock when workflow completes
+        release(engine, heartbeat, token, run_id)
+
+if __name__ == "__main__":
+    main()
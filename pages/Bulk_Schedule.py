@@ -0,0 +1,84 @@
+import io
+import streamlit as st
+from services.bulk_schedule import parse_calendar, bulk_schedule, BULK_MAX_ROWS, DEFAULT_TIMEZONE
+from utils.auth import require_auth, logout_button
+from utils.cache import get_account_directory
+
+require_auth()
+logout_button()
+
+st.title("🗓️ Bulk Schedule")
+st.caption(f"Import a CSV/JSON content calendar (up to {BULK_MAX_ROWS} posts) in one go")
+
+with st.expander("📄 Calendar format"):
+    st.markdown(
+        "One row per post. Times without an offset are IST.\n\n"
+        "- `scheduled_time`: `2026-11-01 09:30`\n"
+        "- `caption`\n"
+        "- `media`: uploaded file name(s) or http(s) URLs; several separated by `;` make a carousel\n"
+        "- `accounts`: Instagram account IDs separated by `;`, and/or\n"
+        "- `groups`: group names separated by `;`\n"
+        "- `priority` (optional): `high`, `normal` or `low`"
+    )
+    st.code(
+        "scheduled_time,caption,media,accounts,groups,priority\n"
+        "2026-11-01 09:30,Launch day!,launch.jpg,,Brand Accounts,high\n"
+        "2026-11-02 18:00,Behind the scenes,bts1.jpg;bts2.jpg;bts3.mp4,17841400000000001,,normal\n",
+        language="csv",
+    )
+
+calendar_file = st.file_uploader("Calendar (.csv or .json)", type=["csv", "json"])
+media_files = st.file_uploader(
+    "Media files referenced by the calendar",
+    type=["png", "jpg", "jpeg", "mp4", "mov", "avi"],
+    accept_multiple_files=True,
+) or []
+
+if calendar_file:
+    try:
+        raw_rows = parse_calendar(calendar_file.getvalue(), calendar_file.name)
+    except ValueError as e:
+        st.error(f"❌ Could not read calendar: {e}")
+        st.stop()
+
+    st.write(f"📋 {len(raw_rows)} rows, {len(media_files)} media files")
+    media_by_name = {f.name: f for f in media_files}
+
+    def open_media(name):
+        # A fresh buffer per row: uploads run in parallel and each post deletes its own copy
+        buffer = io.BytesIO(media_by_name[name].getvalue())
+        buffer.name = name
+        return buffer
+
+    def show_errors(errors):
+        st.dataframe(
+            [{"Row": row, "Problem": message} for row, message in errors],
+            width="stretch", hide_index=True,
+        )
+
+    col_check, col_schedule = st.columns(2)
+    with col_check:
+        check = st.button("🔍 Validate", use_container_width=True)
+    with col_schedule:
+        schedule = st.button("📅 Schedule all valid rows", type="primary", use_container_width=True)
+
+    if check or schedule:
+        with st.spinner("Uploading media and scheduling..." if schedule else "Validating..."):
+            result = bulk_schedule(
+                raw_rows,
+                st.session_state.username,
+                open_media,
+                known_accounts=get_account_directory() or None,  # Skip the check if discovery failed
+                media_exists=lambda name: name in media_by_name,
+                tz_name=DEFAULT_TIMEZONE,
+                dry_run=not schedule,
+            )
+
+        if schedule:
+            st.success(f"✅ Scheduled {result.scheduled}/{len(raw_rows)} posts")
+        else:
+            st.info(f"🔍 {result.scheduled}/{len(raw_rows)} rows are valid")
+
+        if result.errors:
+            st.warning(f"⚠️ {len(result.errors)} rows were skipped")
+            show_errors(result.errors)
@@ -1,8 +1,6 @@
 import streamlit as st
-from db.utils import SessionLocal
-from db.models import Group, GroupAccount
-from services.instagram_api import get_instagram_accounts
-from utils.cache import get_groups_cache
+from services.groups import create_group, update_group_members, delete_group
+from utils.cache import get_groups_cache, get_account_directory
 from utils.auth import require_auth, logout_button, require_role
 
 # Require authentication and admin role
@@ -13,42 +11,45 @@ logout_button()
 st.title("👥 Manage Groups")
 st.caption("Admin Only - Create and manage account groups")
 
-# Get all Instagram accounts (this should ALWAYS work independently of groups)
-ig_accounts = get_instagram_accounts()
+# Shared, cached account directory (this should ALWAYS work independently of groups)
+ig_accounts = get_account_directory()
 if not ig_accounts:
     st.error("❌ No linked accounts.")
+    if st.button("🔄 Retry account discovery"):
+        get_account_directory(force=True)
+        st.rerun()
     st.stop()
 
 # Get groups for display/management
 groups_cache = get_groups_cache()
 
+def account_rows(ig_ids, query=""):
+    """Dataframe rows for accounts, filtered by a case-insensitive name/ID search."""
+    query = query.strip().lower()
+    rows = [{"Account": ig_accounts.get(ig, f"Unknown ({ig})"), "Instagram ID": ig} for ig in ig_ids]
+    if query:
+        rows = [r for r in rows if query in r["Account"].lower() or query in r["Instagram ID"]]
+    return rows
+
 # Create group
 st.subheader("➕ Create New Group")
 with st.form("create_group_form", clear_on_submit=True):
     gname = st.text_input("New Group Name")
     gaccounts = st.multiselect(
-        "Accounts", 
-        list(ig_accounts.keys()), 
+        "Accounts",
+        list(ig_accounts.keys()),
         format_func=lambda x: ig_accounts[x]
     )
     if st.form_submit_button("Create Group", use_container_width=True):
         if gname and gaccounts:
-            db = SessionLocal()
             try:
-                if db.query(Group).filter_by(name=gname).first():
-                    st.error("❌ Group exists.")
-                else:
-                    grp = Group(name=gname)
-                    db.add(grp)
-                    db.commit()
-                    for acc in gaccounts:
-                        db.add(GroupAccount(group_id=grp.id, ig_id=acc))
-                    db.commit()
-                    st.success(f"✅ Created group {gname}")
-                    get_groups_cache(force=True)
-                    st.rerun()
-            finally:
-                db.close()
+                create_group(gname, gaccounts)
+            except ValueError as e:
+                st.error(f"❌ {e}")
+            else:
+                st.success(f"✅ Created group {gname}")
+                get_groups_cache(force=True)
+                st.rerun()
         else:
             st.warning("⚠️ Please provide a group name and select at least one account")
 
@@ -59,32 +60,64 @@ st.subheader("📋 Existing Groups")
 if not groups_cache:
     st.info("No groups created yet")
 else:
+    if "group_saved" in st.session_state:
+        st.success(st.session_state.pop("group_saved"))
+    group_query = st.text_input("🔍 Search groups", placeholder="Group or account name").strip().lower()
     for gname, members in groups_cache.items():
-        # Show group with member names
-        member_names = [ig_accounts.get(ig, f"Unknown ({ig})") for ig in members]
-        
+        if group_query and group_query not in gname.lower() and not account_rows(members, group_query):
+            continue
+
         with st.expander(f"📌 **{gname}** ({len(members)} accounts)"):
-            st.write("**Accounts in this group:**")
-            for name in member_names:
-                st.write(f"  • {name}")
-            
+            # One virtualized table instead of a widget per member
+            st.dataframe(account_rows(members), width="stretch", hide_index=True)
+
+            with st.form(f"edit_{gname}"):
+                new_members = st.multiselect(
+                    "Members",
+                    list(dict.fromkeys(list(ig_accounts.keys()) + members)),
+                    default=members,
+                    format_func=lambda x: ig_accounts.get(x, f"Unknown ({x})"),
+                    key=f"members_{gname}",
+                )
+                if st.form_submit_button("💾 Save Members", use_container_width=True):
+                    if not new_members:
+                        st.warning("⚠️ A group needs at least one account (delete it instead)")
+                    else:
+                        try:
+                            added, removed = update_group_members(gname, new_members)
+                        except ValueError as e:
+                            st.error(f"❌ {e}")
+                        else:
+                            get_groups_cache(force=True)
+                            st.session_state["group_saved"] = f"✅ {gname}: {len(added)} added, {len(removed)} removed"
+                            st.rerun()
+
             if st.button(f"🗑️ Delete Group", key=f"del_{gname}", type="secondary"):
-                db = SessionLocal()
-                try:
-                    grp = db.query(Group).filter_by(name=gname).first()
-                    if grp:
-                        db.delete(grp)
-                        db.commit()
-                        get_groups_cache(force=True)
-                        st.success(f"🗑️ Deleted group '{gname}'")
-                        st.info("ℹ️ Note: Individual accounts are still accessible for posting")
-                        st.rerun()
-                finally:
-                    db.close()
+                if delete_group(gname):
+                    get_groups_cache(force=True)
+                    st.success(f"🗑️ Deleted group '{gname}'")
+                    st.info("ℹ️ Note: Individual accounts are still accessible for posting")
+                    st.rerun()
 
 # Show all available accounts for reference
 st.markdown("---")
 st.subheader("📱 All Available Instagram Accounts")
-st.caption(f"Total: {len(ig_accounts)} accounts")
-for ig_id, name in ig_accounts.items():
-    st.write(f"✅ {name} (`{ig_id}`)")
\ No newline at end of file
+col_search, col_refresh = st.columns([3, 1])
+with col_search:
+    account_query = st.text_input("🔍 Search accounts", placeholder="Name or Instagram ID")
+with col_refresh:
+    st.write("")
+    if st.button("🔄 Refresh accounts", use_container_width=True, help="Discover accounts again (e.g. after connecting a Page)"):
+        get_account_directory(force=True)
+        st.rerun()
+
+groups_by_account = {}
+for gname, members in groups_cache.items():
+    for ig in members:
+        groups_by_account.setdefault(ig, []).append(gname)
+
+rows = account_rows(ig_accounts.keys(), account_query)
+for row in rows:
+    row["Groups"] = ", ".join(groups_by_account.get(row["Instagram ID"], []))
+st.caption(f"Showing {len(rows)} of {len(ig_accounts)} accounts")
+st.dataframe(rows, width="stretch", hide_index=True)
@@ -1,8 +1,15 @@
+import os
+import functools
 import streamlit as st
 from db.utils import SessionLocal
 from db.models import PostLog
-from datetime import timezone, timedelta
+from datetime import datetime, timezone, timedelta, time
 from utils.auth import require_auth, logout_button
+from services.account_activity import get_recent_posts_for_account
+from services.log_export import (
+    EXPORT_FORMATS, EXPORT_INLINE_MAX_BYTES, export_logs, new_export_path, publish_export,
+)
+from utils.cache import get_account_directory
 
 require_auth()
 logout_button()
@@ -10,9 +17,41 @@ logout_button()
 st.title("📜 Logs of Past Posts")
 
 IST = timezone(timedelta(hours=5, minutes=30))  # IST offset
+LOG_WINDOWS = {"Last 7 days": 7, "Last 30 days": 30, "Last 90 days": 90, "Last year": 365}
+MAX_LOG_ROWS = 500
+EXPORT_MIME_TYPES = {"csv": "text/csv", "csv.gz": "application/gzip", "parquet": "application/vnd.apache.parquet"}
+
+def read_export(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+ig_accounts = get_account_directory()
+account_filter = st.selectbox(
+    "Filter by account",
+    options=[None] + list(ig_accounts.keys()),
+    format_func=lambda x: "All accounts" if x is None else ig_accounts[x],
+)
+window = st.selectbox(
+    "Period", list(LOG_WINDOWS.keys()), index=1, disabled=bool(account_filter),
+    help="Per-account logs always show that account's latest 200 posts",
+)
 
 db = SessionLocal()
-logs = db.query(PostLog).order_by(PostLog.timestamp.desc()).all()
+if account_filter:
+    # Indexed lookup on post_log_accounts instead of scanning ig_ids
+    logs = [PostLog(**row) for row in get_recent_posts_for_account(account_filter, limit=200)]
+else:
+    # Filtering on timestamp lets Postgres read only the matching monthly partitions
+    since = datetime.utcnow() - timedelta(days=LOG_WINDOWS[window])
+    logs = (
+        db.query(PostLog)
+        .filter(PostLog.timestamp >= since)
+        .order_by(PostLog.timestamp.desc())
+        .limit(MAX_LOG_ROWS)
+        .all()
+    )
+    if len(logs) == MAX_LOG_ROWS:
+        st.caption(f"Showing the latest {MAX_LOG_ROWS} posts of this period")
 
 if not logs:
     st.info("No logs yet.")
@@ -31,4 +70,62 @@ else:
         })
     st.dataframe(data, width="stretch")
 
-db.close()
\ No newline at end of file
+db.close()
+
+# ============================== Export (streamed to a file, never through the dataframe)
+st.subheader("⬇️ Export")
+with st.form("export_form"):
+    col_kind, col_format = st.columns(2)
+    with col_kind:
+        export_kind = st.selectbox(
+            "Rows",
+            options=["logs", "deliveries"],
+            format_func=lambda k: "One row per post" if k == "logs" else "One row per account delivery",
+        )
+    with col_format:
+        export_format = st.selectbox("Format", options=list(EXPORT_FORMATS))
+    today = datetime.utcnow().date()
+    export_dates = st.date_input("Dates (UTC)", value=(today - timedelta(days=30), today))
+    account_note = f" for {ig_accounts.get(account_filter, account_filter)}" if account_filter else ""
+    prepare = st.form_submit_button(f"Prepare export{account_note}", use_container_width=True)
+
+if prepare:
+    if len(export_dates) != 2:
+        st.warning("⚠️ Pick a start and an end date")
+    else:
+        previous = st.session_state.pop("log_export", None)
+        if previous and previous.get("path") and os.path.exists(previous["path"]):
+            os.remove(previous["path"])
+
+        start, end = export_dates
+        file_name = f"post-{export_kind}-{start:%Y%m%d}-{end:%Y%m%d}.{export_format}"
+        path = new_export_path(export_format)
+        try:
+            with st.spinner("Exporting..."):
+                rows = export_logs(
+                    path, export_kind, export_format,
+                    datetime.combine(start, time.min), datetime.combine(end + timedelta(days=1), time.min),
+                    ig_id=account_filter,
+                )
+                export = {"file_name": file_name, "format": export_format, "rows": rows, "path": path}
+                if os.path.getsize(path) > EXPORT_INLINE_MAX_BYTES:
+                    # Too big to serve from the app: hand out a presigned S3 link instead
+                    export.update(url=publish_export(path, file_name), path=None)
+                    os.remove(path)
+            st.session_state["log_export"] = export
+        except Exception as e:
+            os.remove(path)
+            st.error(f"❌ Export failed: {e}")
+
+export = st.session_state.get("log_export")
+if export and export.get("url"):
+    st.link_button(f"⬇️ Download {export['file_name']} ({export['rows']} rows)", export["url"])
+    st.caption("The link is valid for one hour")
+elif export and export.get("path") and os.path.exists(export["path"]):
+    st.download_button(
+        f"⬇️ Download {export['file_name']} ({export['rows']} rows)",
+        data=functools.partial(read_export, export["path"]),
+        file_name=export["file_name"],
+        mime=EXPORT_MIME_TYPES[export["format"]],
+        on_click="ignore",
+    )
\ No newline at end of file
@@ -0,0 +1,143 @@
+import datetime
+import pytz
+import streamlit as st
+from services.account_activity import (
+    get_upcoming_posts, get_post_history, count_upcoming_by_day, SCHEDULE_CONFLICT_MINUTES,
+)
+from utils.cache import get_groups_cache, get_account_directory
+from utils.auth import require_auth, logout_button
+
+require_auth()
+logout_button()
+
+st.title("🗓️ Account Timeline")
+st.caption("Upcoming and delivered posts for one account or group")
+
+IST = pytz.timezone("Asia/Kolkata")
+PAGE_SIZE = 20
+CACHE_TTL_SECONDS = 60  # Timelines are refreshed at most once a minute per page/cursor
+
+ig_accounts = get_account_directory()
+groups_cache = get_groups_cache()
+
+# Cached, keyset-paginated queries (arguments are hashable so each page caches separately)
+@st.cache_data(ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def load_upcoming(ig_ids, after):
+    return get_upcoming_posts(list(ig_ids), PAGE_SIZE, after)
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def load_history(ig_ids, before):
+    return get_post_history(list(ig_ids), PAGE_SIZE, before)
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def load_day_counts(ig_ids):
+    return count_upcoming_by_day(list(ig_ids))
+
+def to_ist(utc_dt):
+    return utc_dt.replace(tzinfo=datetime.timezone.utc).astimezone(IST)
+
+def account_names(ig_ids_csv):
+    names = [ig_accounts.get(i, f"ID:{i}") for i in ig_ids_csv.split(",")]
+    return ", ".join(names[:3]) + (f" +{len(names) - 3}" if len(names) > 3 else "")
+
+def find_collisions(rows, selected):
+    """Ids of posts within SCHEDULE_CONFLICT_MINUTES of another post to the same selected account."""
+    window = datetime.timedelta(minutes=SCHEDULE_CONFLICT_MINUTES)
+    last_by_account = {}
+    colliding = set()
+    for row in rows:  # rows are sorted by scheduled_time
+        for ig_id in set(row["ig_ids"].split(",")) & selected:
+            previous = last_by_account.get(ig_id)
+            if previous and row["scheduled_time"] - previous["scheduled_time"] < window:
+                colliding.update((previous["id"], row["id"]))
+            last_by_account[ig_id] = row
+    return colliding
+
+def paginator(key, rows, cursor_of):
+    """Prev/Next keyset pagination; cursors are kept per timeline in session state."""
+    cursors = st.session_state.setdefault(key, [None])
+    col_prev, col_page, col_next = st.columns([1, 2, 1])
+    with col_prev:
+        if st.button("⬅️ Previous", key=f"{key}_prev", disabled=len(cursors) == 1):
+            cursors.pop()
+            st.rerun()
+    with col_page:
+        st.caption(f"Page {len(cursors)}")
+    with col_next:
+        if st.button("Next ➡️", key=f"{key}_next", disabled=len(rows) < PAGE_SIZE):
+            cursors.append(cursor_of(rows[-1]))
+            st.rerun()
+
+# --- Selection ---
+mode = st.radio("Show", ["Account", "Group"], horizontal=True)
+if mode == "Account":
+    selected_account = st.selectbox(
+        "Account", options=list(ig_accounts.keys()), format_func=lambda x: ig_accounts[x]
+    )
+    selected = (selected_account,) if selected_account else ()
+else:
+    if not groups_cache:
+        st.info("💡 Create groups in the Groups page")
+        st.stop()
+    selected_group = st.selectbox("Group", options=list(groups_cache.keys()))
+    selected = tuple(sorted(groups_cache.get(selected_group, [])))
+
+if not selected:
+    st.stop()
+
+# Reset pagination when the selection changes
+if st.session_state.get("timeline_selection") != selected:
+    st.session_state.timeline_selection = selected
+    st.session_state.pop("timeline_upcoming", None)
+    st.session_state.pop("timeline_history", None)
+
+# --- Next two weeks at a glance (gaps show up as empty days) ---
+st.subheader("📊 Next 14 days")
+day_counts = load_day_counts(selected)
+st.bar_chart({"Posts": {day.strftime("%a %d %b"): n for day, n in day_counts.items()}})
+empty_days = [day.strftime("%a %d %b") for day, n in day_counts.items() if n == 0]
+if empty_days:
+    st.caption(f"No posts scheduled on: {', '.join(empty_days)}")
+
+upcoming_tab, history_tab = st.tabs(["⏰ Upcoming", "📜 History"])
+
+with upcoming_tab:
+    cursor = st.session_state.get("timeline_upcoming", [None])[-1]
+    rows = load_upcoming(selected, cursor)
+    if not rows:
+        st.info("No upcoming scheduled posts")
+    else:
+        colliding = find_collisions(rows, set(selected))
+        if colliding:
+            st.warning(f"⚠️ {len(colliding)} posts are within {SCHEDULE_CONFLICT_MINUTES} minutes of another post to the same account")
+        st.dataframe(
+            [{
+                "": "⚠️" if row["id"] in colliding else "",
+                "Time (IST)": to_ist(row["scheduled_time"]).strftime("%Y-%m-%d %H:%M"),
+                "Media": row["media_type"],
+                "Accounts": account_names(row["ig_ids"]),
+                "User": row["username"],
+                "Caption": row["caption"][:80] + ("..." if len(row["caption"]) > 80 else ""),
+            } for row in rows],
+            width="stretch", hide_index=True,
+        )
+    paginator("timeline_upcoming", rows, lambda r: (r["scheduled_time"], r["id"]))
+
+with history_tab:
+    cursor = st.session_state.get("timeline_history", [None])[-1]
+    rows = load_history(selected, cursor)
+    if not rows:
+        st.info("No posts yet")
+    else:
+        st.dataframe(
+            [{
+                "Time (IST)": to_ist(row["timestamp"]).strftime("%Y-%m-%d %H:%M"),
+                "Media": row["media_type"],
+                "Accounts": account_names(row["ig_ids"]),
+                "User": row["username"],
+                "Posted": f"{row['results'].count('✅')}/{len(row['ig_ids'].split(','))}",
+                "Caption": row["caption"][:80] + ("..." if len(row["caption"]) > 80 else ""),
+            } for row in rows],
+            width="stretch", hide_index=True,
+        )
+    paginator("timeline_history", rows, lambda r: (r["timestamp"], r["id"]))
@@ -1,6 +1,7 @@
 import streamlit as st
 from db.utils import SessionLocal
 from db.models import User, UserRole
+from services.users import get_user_stats, list_users, count_recent_posts, ACTIVITY_DAYS
 from utils.auth import require_auth, logout_button, require_role, hash_password
 
 st.set_page_config(page_title="User Management", page_icon="👥")
@@ -13,21 +14,17 @@ logout_button()
 st.title("👥 User Management")
 st.caption("Admin Only - Manage user accounts and permissions")
 
-# Get current users
-db = SessionLocal()
-users = db.query(User).order_by(User.created_at.desc()).all()
-db.close()
+PAGE_SIZE = 20
 
-# Display statistics
+# Display statistics (one aggregate query, no user rows loaded)
+stats = get_user_stats()
 col1, col2, col3 = st.columns(3)
 with col1:
-    st.metric("Total Users", len(users))
+    st.metric("Total Users", stats["total"])
 with col2:
-    active_users = len([u for u in users if getattr(u, "is_active", False)])
-    st.metric("Active Users", active_users)
+    st.metric("Active Users", stats["active"])
 with col3:
-    admin_users = len([u for u in users if getattr(u, "role", None) == UserRole.ADMIN])
-    st.metric("Admins", admin_users)
+    st.metric("Admins", stats["admins"])
 
 st.markdown("---")
 
@@ -77,17 +74,26 @@ with st.form("create_user_form", clear_on_submit=True):
 
 st.markdown("---")
 
-# List existing users
+# List existing users (one page at a time, keyset-paginated by username)
 st.subheader("📋 Existing Users")
 
+search = st.text_input("🔍 Search users", placeholder="Part of a username")
+if st.session_state.get("users_search") != search:
+    st.session_state["users_search"] = search
+    st.session_state["users_cursors"] = [None]
+cursors = st.session_state.setdefault("users_cursors", [None])
+users = list_users(search, PAGE_SIZE, cursors[-1])
+recent_posts = count_recent_posts([u["username"] for u in users])
+
 if not users:
     st.info("No users found")
 else:
     for user in users:
-        username = getattr(user, "username", "Unknown")
-        role = getattr(user, "role", UserRole.INTERN)
-        is_active = getattr(user, "is_active", False)
-        created_at = getattr(user, "created_at", None)
+        username = user["username"]
+        role = user["role"] or UserRole.INTERN
+        is_active = user["is_active"]
+        created_at = user["created_at"]
+        last_login_at = user["last_login_at"]
         
         # Create expandable section for each user
         with st.expander(f"{'✅' if is_active else '❌'} **{username}** - {role.value.upper()}"):
@@ -99,6 +105,8 @@ else:
                 st.write(f"**Status:** {'Active' if is_active else 'Inactive'}")
                 if created_at:
                     st.write(f"**Created:** {created_at.strftime('%Y-%m-%d %H:%M')}")
+                st.write(f"**Last login:** {last_login_at.strftime('%Y-%m-%d %H:%M') + ' UTC' if last_login_at else 'Never'}")
+                st.write(f"**Posts in the last {ACTIVITY_DAYS} days:** {recent_posts.get(username, 0)}")
             
             with col2:
                 st.write("**Actions:**")
@@ -181,5 +189,17 @@ else:
                     finally:
                         db.close()
 
+col_prev, col_page, col_next = st.columns([1, 2, 1])
+with col_prev:
+    if st.button("⬅️ Previous", key="users_prev", disabled=len(cursors) == 1):
+        cursors.pop()
+        st.rerun()
+with col_page:
+    st.caption(f"Page {len(cursors)}")
+with col_next:
+    if st.button("Next ➡️", key="users_next", disabled=len(users) < PAGE_SIZE):
+        cursors.append(users[-1]["username"])
+        st.rerun()
+
 st.markdown("---")
 st.caption("💡 Tip: Inactive users cannot log in but their data is preserved")
\ No newline at end of file
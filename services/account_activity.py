@@ -0,0 +1,133 @@
+"""
+Per-account views backed by the normalized account tables (db/accounts.py).
+Every query here is an index lookup on ig_id rather than a scan of the ig_ids columns.
+"""
+
+import datetime
+from sqlalchemy import exists, select, tuple_
+from db.utils import SessionLocal
+from db.models import ScheduledPost, ScheduledPostAccount, PostLog, PostLogAccount
+
+SCHEDULE_CONFLICT_MINUTES = 30  # Posts to the same account closer than this are flagged
+
+def get_upcoming_posts(ig_ids, limit=20, after=None):
+    """
+    Upcoming scheduled posts that target any of ig_ids, soonest first, as plain dicts.
+    Keyset-paginated: pass the previous page's last (scheduled_time, id) as `after`.
+    """
+    if not ig_ids:
+        return []
+    db = SessionLocal()
+    try:
+        query = (
+            db.query(
+                ScheduledPost.id, ScheduledPost.scheduled_time, ScheduledPost.media_type,
+                ScheduledPost.caption, ScheduledPost.username, ScheduledPost.ig_ids,
+            )
+            .filter(exists().where(
+                ScheduledPostAccount.post_id == ScheduledPost.id,
+                ScheduledPostAccount.ig_id.in_(list(ig_ids)),
+            ))
+            .filter(ScheduledPost.scheduled_time >= datetime.datetime.utcnow())
+        )
+        if after:
+            query = query.filter(tuple_(ScheduledPost.scheduled_time, ScheduledPost.id) > tuple_(*after))
+        rows = query.order_by(ScheduledPost.scheduled_time, ScheduledPost.id).limit(limit).all()
+        return [row._asdict() for row in rows]
+    finally:
+        db.close()
+
+def get_post_history(ig_ids, limit=20, before=None):
+    """
+    Delivered posts (post logs) that included any of ig_ids, newest first, as plain dicts.
+    Keyset-paginated: pass the previous page's last (timestamp, id) as `before`.
+    The page is picked from the (ig_id, logged_at) index before any log row is read.
+    """
+    if not ig_ids:
+        return []
+    db = SessionLocal()
+    try:
+        page = (
+            select(PostLogAccount.log_id, PostLogAccount.logged_at)
+            .where(PostLogAccount.ig_id.in_(list(ig_ids)))
+        )
+        if before:
+            page = page.where(tuple_(PostLogAccount.logged_at, PostLogAccount.log_id) < tuple_(*before))
+        page = (
+            page.distinct()
+            .order_by(PostLogAccount.logged_at.desc(), PostLogAccount.log_id.desc())
+            .limit(limit)
+            .subquery()
+        )
+        rows = (
+            db.query(
+                PostLog.id, PostLog.timestamp, PostLog.username, PostLog.media_type,
+                PostLog.caption, PostLog.results, PostLog.ig_ids,
+            )
+            # Joining on the partition key too lets Postgres probe only the partitions holding the page
+            .join(page, (page.c.log_id == PostLog.id) & (page.c.logged_at == PostLog.timestamp))
+            .order_by(page.c.logged_at.desc(), page.c.log_id.desc())
+            .all()
+        )
+        return [row._asdict() for row in rows]
+    finally:
+        db.close()
+
+def get_scheduled_for_account(ig_id, limit=20):
+    """Upcoming scheduled posts for one account as plain dicts, soonest first."""
+    return get_upcoming_posts([ig_id], limit)
+
+def get_recent_posts_for_account(ig_id, limit=20):
+    """Most recent post logs that included one account, newest first."""
+    return get_post_history([ig_id], limit)
+
+def count_upcoming_by_day(ig_ids, days=14, utc_offset=datetime.timedelta(hours=5, minutes=30)):
+    """
+    Number of scheduled posts per local day for the next `days` days (IST by default),
+    including days with none, so gaps in the calendar show up. Returns {date: count}.
+    """
+    now = datetime.datetime.utcnow()
+    today = (now + utc_offset).date()
+    counts = {today + datetime.timedelta(days=i): 0 for i in range(days)}
+    if not ig_ids:
+        return counts
+    db = SessionLocal()
+    try:
+        times = (
+            db.query(ScheduledPost.scheduled_time)
+            .filter(exists().where(
+                ScheduledPostAccount.post_id == ScheduledPost.id,
+                ScheduledPostAccount.ig_id.in_(list(ig_ids)),
+            ))
+            .filter(ScheduledPost.scheduled_time.between(now, now + datetime.timedelta(days=days)))
+            .all()
+        )
+    finally:
+        db.close()
+    for (scheduled_time,) in times:
+        day = (scheduled_time + utc_offset).date()
+        if day in counts:
+            counts[day] += 1
+    return counts
+
+def find_schedule_conflicts(ig_ids, scheduled_time, window_minutes=SCHEDULE_CONFLICT_MINUTES):
+    """
+    Scheduled posts that already target any of ig_ids within window_minutes of
+    scheduled_time (naive UTC). Returns [(ig_id, post_id, scheduled_time)].
+    """
+    if not ig_ids:
+        return []
+    window = datetime.timedelta(minutes=window_minutes)
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(ScheduledPostAccount.ig_id, ScheduledPost.id, ScheduledPost.scheduled_time)
+            .join(ScheduledPost, ScheduledPostAccount.post_id == ScheduledPost.id)
+            .filter(ScheduledPostAccount.ig_id.in_(list(ig_ids)))
+            .filter(ScheduledPost.scheduled_time.between(scheduled_time - window, scheduled_time + window))
+            .order_by(ScheduledPost.scheduled_time)
+            .all()
+        )
+        return [tuple(row) for row in rows]
+    finally:
+        db.close()
@@ -1,22 +1,76 @@
-import boto3
 import uuid
 import os
-from botocore.exceptions import ClientError
-from config import get_config_value
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from config import get_settings, on_settings_reload
+from utils import metrics
 
-# AWS Configuration
-AWS_ACCESS_KEY_ID = get_config_value(["aws", "access_key_id"], "AWS_ACCESS_KEY_ID")
-AWS_SECRET_ACCESS_KEY = get_config_value(["aws", "secret_access_key"], "AWS_SECRET_ACCESS_KEY")
-AWS_BUCKET_NAME = get_config_value(["aws", "bucket_name"], "AWS_BUCKET_NAME", "instagram-media-uploads")
-AWS_REGION = get_config_value(["aws", "region"], "AWS_REGION", "eu-north-1")
+_s3_client = None
+_s3_client_lock = threading.Lock()
 
-# Initialize S3 client
-s3_client = boto3.client(
-    's3',
-    aws_access_key_id=AWS_ACCESS_KEY_ID,
-    aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-    region_name=AWS_REGION
-)
+VIDEO_EXTENSIONS = ['mp4', 'mov', 'avi', 'mkv']
+
+# Content types for better browser handling
+CONTENT_TYPES = {
+    'jpg': 'image/jpeg',
+    'jpeg': 'image/jpeg',
+    'png': 'image/png',
+    'gif': 'image/gif',
+    'mp4': 'video/mp4',
+    'mov': 'video/quicktime',
+    'avi': 'video/x-msvideo'
+}
+
+def get_s3_client():
+    """
+    Return the shared S3 client, creating it on first use.
+    boto3 is slow to import and to build clients, so pages and workers that
+    never touch S3 don't pay for it.
+    """
+    global _s3_client
+    if _s3_client is None:
+        with _s3_client_lock:
+            if _s3_client is None:
+                import boto3
+                from botocore.config import Config
+                settings = get_settings()
+                _s3_client = boto3.client(
+                    's3',
+                    aws_access_key_id=settings.aws_access_key_id,
+                    aws_secret_access_key=settings.aws_secret_access_key,
+                    region_name=settings.aws_region,
+                    endpoint_url=settings.aws_endpoint_url,
+                    # Presigned URLs need SigV4; S3 stand-ins (MinIO, LocalStack) expect path-style URLs
+                    config=Config(
+                        signature_version='s3v4',
+                        s3={'addressing_style': 'path' if settings.aws_endpoint_url else 'auto'},
+                    ),
+                )
+    return _s3_client
+
+def _reset_s3_client_on_reload(old, new):
+    global _s3_client
+    with _s3_client_lock:
+        _s3_client = None
+
+on_settings_reload(_reset_s3_client_on_reload)
+
+def describe_media(filename):
+    """(extension, file_type, content_type) for a file name, e.g. ('mp4', 'video', 'video/mp4')."""
+    file_extension = filename.split('.')[-1].lower() if filename and '.' in filename else 'bin'
+    file_type = "video" if file_extension in VIDEO_EXTENSIONS else "image"
+    return file_extension, file_type, CONTENT_TYPES.get(file_extension, 'application/octet-stream')
+
+def new_s3_key(file_extension, folder="uploads"):
+    """Unique object key for a new upload."""
+    return f"{folder}/{uuid.uuid4().hex}.{file_extension}"
+
+def public_s3_url(s3_key):
+    """Public URL of an object in the media bucket (or in the AWS_ENDPOINT_URL stand-in)."""
+    settings = get_settings()
+    if settings.aws_endpoint_url:
+        return f"{settings.aws_endpoint_url.rstrip('/')}/{settings.aws_bucket_name}/{s3_key}"
+    return f"https://{settings.aws_bucket_name}.s3.{settings.aws_region}.amazonaws.com/{s3_key}"
 
 def upload_to_s3(file, folder="uploads"):
     """
@@ -29,40 +83,27 @@ def upload_to_s3(file, folder="uploads"):
     Returns:
         tuple: (public_url, s3_key, file_type) or (None, None, error_message)
     """
+    from botocore.exceptions import ClientError
+    settings = get_settings()
     try:
-        # Generate unique filename
-        file_extension = file.name.split('.')[-1].lower() if hasattr(file, 'name') and '.' in file.name else 'bin'
-        unique_filename = f"{uuid.uuid4().hex}.{file_extension}"
-        s3_key = f"{folder}/{unique_filename}"
-        
-        # Determine file type
-        file_type = "video" if file_extension in ['mp4', 'mov', 'avi', 'mkv'] else "image"
-        
-        # Set content type for better browser handling
-        content_type_map = {
-            'jpg': 'image/jpeg',
-            'jpeg': 'image/jpeg', 
-            'png': 'image/png',
-            'gif': 'image/gif',
-            'mp4': 'video/mp4',
-            'mov': 'video/quicktime',
-            'avi': 'video/x-msvideo'
-        }
-        content_type = content_type_map.get(file_extension, 'application/octet-stream')
+        # Generate unique filename and determine file type
+        file_extension, file_type, content_type = describe_media(getattr(file, 'name', None))
+        s3_key = new_s3_key(file_extension, folder)
         
         # Upload to S3
-        s3_client.upload_fileobj(
-            file,
-            AWS_BUCKET_NAME,
-            s3_key,
-            ExtraArgs={
-                'ContentType': content_type,
-                'ACL': 'public-read'  # Make file publicly accessible
-            }
-        )
+        with metrics.span("s3_upload", file_type=file_type, size_bytes=getattr(file, "size", None)):
+            get_s3_client().upload_fileobj(
+                file,
+                settings.aws_bucket_name,
+                s3_key,
+                ExtraArgs={
+                    'ContentType': content_type,
+                    'ACL': 'public-read'  # Make file publicly accessible
+                }
+            )
         
         # Generate public URL
-        public_url = f"https://{AWS_BUCKET_NAME}.s3.{AWS_REGION}.amazonaws.com/{s3_key}"
+        public_url = public_s3_url(s3_key)
         
         print(f"✅ Uploaded to S3: {s3_key}")
         return public_url, s3_key, file_type
@@ -76,6 +117,36 @@ def upload_to_s3(file, folder="uploads"):
         print(f"❌ {error_msg}")
         return None, None, error_msg
 
+def upload_multiple_to_s3(files, folder="uploads", max_workers=4):
+    """
+    Upload several files to AWS S3 in parallel (used for carousel posts)
+    
+    Args:
+        files: List of Streamlit uploaded files or file-like objects
+        folder: S3 folder/prefix (default: "uploads")
+        max_workers: Number of concurrent uploads
+    
+    Returns:
+        tuple: (media_items, None) where media_items is a list of {"url", "key", "type"}
+               dicts in upload order, or (None, error_message) if any upload failed
+    """
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(files)))) as pool:
+        uploads = list(pool.map(lambda f: upload_to_s3(f, folder), files))
+    
+    failed = [u for u in uploads if not u[0]]
+    if failed:
+        # Don't leave orphaned objects behind for a carousel that can't be posted
+        for public_url, s3_key, _ in uploads:
+            if public_url:
+                delete_from_s3(s3_key)
+        return None, failed[0][2]
+    
+    media_items = [
+        {"url": public_url, "key": s3_key, "type": file_type}
+        for public_url, s3_key, file_type in uploads
+    ]
+    return media_items, None
+
 def delete_from_s3(s3_key):
     """
     Delete file from AWS S3
@@ -83,8 +154,11 @@ def delete_from_s3(s3_key):
     Args:
         s3_key: S3 object key to delete
     """
+    if not s3_key:
+        return  # Media hosted elsewhere (e.g. bulk-imported URLs)
     try:
-        s3_client.delete_object(Bucket=AWS_BUCKET_NAME, Key=s3_key)
+        with metrics.span("s3_delete"):
+            get_s3_client().delete_object(Bucket=get_settings().aws_bucket_name, Key=s3_key)
         print(f"✅ Deleted from S3: {s3_key}")
     except Exception as e:
         print(f"⚠️ S3 delete error: {e}")
@@ -93,17 +167,19 @@ def check_s3_setup():
     """
     Check if S3 is properly configured
     """
+    from botocore.exceptions import ClientError
+    bucket = get_settings().aws_bucket_name
     try:
         # Test connection by listing bucket
-        s3_client.head_bucket(Bucket=AWS_BUCKET_NAME)
-        print(f"✅ S3 bucket '{AWS_BUCKET_NAME}' is accessible")
+        get_s3_client().head_bucket(Bucket=bucket)
+        print(f"✅ S3 bucket '{bucket}' is accessible")
         return True
     except ClientError as e:
         error_code = e.response['Error']['Code']
         if error_code == '404':
-            print(f"❌ S3 bucket '{AWS_BUCKET_NAME}' does not exist")
+            print(f"❌ S3 bucket '{bucket}' does not exist")
         elif error_code == '403':
-            print(f"❌ Access denied to S3 bucket '{AWS_BUCKET_NAME}'")
+            print(f"❌ Access denied to S3 bucket '{bucket}'")
         else:
             print(f"❌ S3 error: {e}")
         return False
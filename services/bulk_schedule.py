@@ -0,0 +1,321 @@
+"""
+Bulk scheduling: import a content calendar (CSV or JSON) of posts in one go.
+
+Each row has:
+    scheduled_time  "2026-11-01 09:30" (local time, Asia/Kolkata by default) or ISO with offset
+    caption
+    media           file name(s), or already-hosted http(s) URLs; several separated by ";" = carousel
+    accounts        ig_ids separated by ";"           (accounts and/or groups required)
+    groups          group names separated by ";"
+    priority        high | normal | low              (optional, default normal)
+
+Rows are validated first, media for the valid rows is uploaded to S3 in
+parallel, and all posts are inserted with a single executemany in one
+transaction. Bad rows are reported with their row number and skipped; they
+never abort the rest of the batch.
+
+CLI:
+    python -m services.bulk_schedule calendar.csv --username alice
+    python -m services.bulk_schedule calendar.json --username alice --media-dir ./media --dry-run
+"""
+
+import argparse
+import csv
+import datetime
+import io
+import json
+import os
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import pytz
+from db.utils import SessionLocal
+from db.models import Group
+from db.notify import notify_scheduled
+from db.accounts import bulk_insert_scheduled_posts
+from services.aws_utils import upload_to_s3, delete_from_s3
+from services.instagram_api import CAROUSEL_MAX_ITEMS
+from services.scheduling_policy import PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW
+
+BULK_MAX_ROWS = 1000
+BULK_UPLOAD_WORKERS = 4
+CAPTION_MAX_CHARS = 2200  # Instagram caption limit
+MEDIA_EXTENSIONS = {"png", "jpg", "jpeg", "mp4", "mov", "avi"}
+VIDEO_EXTENSIONS = {"mp4", "mov", "avi", "mkv"}
+DEFAULT_TIMEZONE = "Asia/Kolkata"
+
+PRIORITY_NAMES = {
+    "high": PRIORITY_HIGH,
+    "normal": PRIORITY_NORMAL,
+    "low": PRIORITY_LOW,
+    "bulk": PRIORITY_LOW,
+}
+
+# A validated calendar row; row is the 1-based row number in the input file
+BulkRow = namedtuple("BulkRow", "row scheduled_time caption media ig_ids priority")
+BulkResult = namedtuple("BulkResult", "scheduled errors")  # errors: [(row, message)]
+
+def parse_calendar(content, filename):
+    """
+    Parse CSV or JSON calendar content (str or bytes) into a list of dicts.
+    JSON may be a list of objects or {"posts": [...]}.
+    """
+    if isinstance(content, bytes):
+        content = content.decode("utf-8-sig")
+    if filename.lower().endswith(".json"):
+        data = json.loads(content)
+        rows = data.get("posts", []) if isinstance(data, dict) else data
+        if not isinstance(rows, list) or not all(isinstance(r, dict) for r in rows):
+            raise ValueError("JSON calendar must be a list of objects (or {\"posts\": [...]})")
+        return rows
+    return list(csv.DictReader(io.StringIO(content)))
+
+def load_groups():
+    """Group name -> list of ig_ids."""
+    db = SessionLocal()
+    try:
+        return {g.name: [acc.ig_id for acc in g.accounts] for g in db.query(Group).all()}
+    finally:
+        db.close()
+
+def _split(value):
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return [str(v).strip() for v in value if str(v).strip()]
+    return [v.strip() for v in str(value).split(";") if v.strip()]
+
+def _is_url(name):
+    return name.startswith(("http://", "https://"))
+
+def _media_type(name):
+    extension = name.rsplit(".", 1)[-1].lower() if "." in name else ""
+    return "video" if extension in VIDEO_EXTENSIONS else "image"
+
+def validate_rows(raw_rows, groups, known_accounts=None, media_exists=None, now=None, tz_name=DEFAULT_TIMEZONE):
+    """
+    Check every row without touching S3 or the scheduled_posts table.
+
+    Args:
+        raw_rows: List of dicts from parse_calendar()
+        groups: Group name -> ig_ids (from load_groups())
+        known_accounts: Optional collection of valid ig_ids to check accounts against
+        media_exists: Optional callable name -> bool to check media files are available
+        now: Current UTC time (naive); defaults to utcnow()
+
+    Returns:
+        tuple: (valid BulkRows, [(row, error message)])
+    """
+    now = now or datetime.datetime.utcnow()
+    tz = pytz.timezone(tz_name)
+    valid, errors = [], []
+
+    if len(raw_rows) > BULK_MAX_ROWS:
+        return [], [(0, f"Too many rows ({len(raw_rows)}); the limit is {BULK_MAX_ROWS} per import")]
+
+    for row_number, raw in enumerate(raw_rows, start=1):
+        problems = []
+        raw = {str(k).strip().lower(): v for k, v in raw.items() if k is not None}
+
+        # Time (naive values are local to tz_name, stored as naive UTC like schedule_post)
+        scheduled_time = None
+        try:
+            parsed = datetime.datetime.fromisoformat(str(raw.get("scheduled_time") or "").strip())
+            if parsed.tzinfo is None:
+                parsed = tz.localize(parsed)
+            scheduled_time = parsed.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+            if scheduled_time <= now:
+                problems.append("scheduled_time is in the past")
+        except ValueError:
+            problems.append(f"invalid scheduled_time {raw.get('scheduled_time')!r} (use YYYY-MM-DD HH:MM)")
+
+        caption = str(raw.get("caption") or "").strip()
+        if not caption:
+            problems.append("caption is empty")
+        elif len(caption) > CAPTION_MAX_CHARS:
+            problems.append(f"caption is longer than {CAPTION_MAX_CHARS} characters")
+
+        media = _split(raw.get("media"))
+        if not media:
+            problems.append("no media")
+        elif len(media) > CAROUSEL_MAX_ITEMS:
+            problems.append(f"a carousel can have at most {CAROUSEL_MAX_ITEMS} items")
+        for name in media:
+            extension = name.rsplit(".", 1)[-1].lower() if "." in name else ""
+            if _is_url(name):
+                continue
+            if extension not in MEDIA_EXTENSIONS:
+                problems.append(f"unsupported media file {name!r}")
+            elif media_exists and not media_exists(name):
+                problems.append(f"media file {name!r} not found")
+
+        ig_ids = _split(raw.get("accounts"))
+        for group_name in _split(raw.get("groups")):
+            if group_name not in groups:
+                problems.append(f"unknown group {group_name!r}")
+            ig_ids.extend(groups.get(group_name, []))
+        ig_ids = list(dict.fromkeys(ig_ids))
+        if not ig_ids:
+            problems.append("no accounts or groups")
+        elif known_accounts is not None:
+            unknown = [i for i in ig_ids if i not in known_accounts]
+            if unknown:
+                problems.append(f"unknown account(s) {', '.join(unknown)}")
+
+        priority_value = str(raw.get("priority") or "normal").strip().lower()
+        if priority_value.isdigit() and int(priority_value) in PRIORITY_NAMES.values():
+            priority = int(priority_value)
+        elif priority_value in PRIORITY_NAMES:
+            priority = PRIORITY_NAMES[priority_value]
+        else:
+            priority = PRIORITY_NORMAL
+            problems.append(f"invalid priority {priority_value!r} (use high, normal or low)")
+
+        if problems:
+            errors.append((row_number, "; ".join(problems)))
+        else:
+            valid.append(BulkRow(row_number, scheduled_time, caption, media, ig_ids, priority))
+
+    return valid, errors
+
+def upload_rows_media(rows, open_media, max_workers=BULK_UPLOAD_WORKERS):
+    """
+    Upload the media of every row to S3 in parallel.
+    Every row gets its own copy, since a post deletes its media once published.
+
+    Args:
+        rows: Validated BulkRows
+        open_media: Callable name -> binary file-like object with a .name (raises if missing)
+
+    Returns:
+        tuple: ({row number: [{"url", "key", "type"}, ...]}, [(row, error message)])
+    """
+    tasks = [(row.row, index, name) for row in rows for index, name in enumerate(row.media)]
+
+    def upload(task):
+        row_number, index, name = task
+        if _is_url(name):
+            return task, (name, None, _media_type(name))
+        try:
+            file = open_media(name)
+        except (OSError, KeyError) as e:
+            return task, (None, None, f"media {name!r} not found ({e})")
+        try:
+            return task, upload_to_s3(file)
+        finally:
+            file.close()
+
+    uploaded = {row.row: [None] * len(row.media) for row in rows}
+    failures = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(tasks) or 1))) as pool:
+        for (row_number, index, name), (url, key, info) in pool.map(upload, tasks):
+            if url:
+                uploaded[row_number][index] = {"url": url, "key": key, "type": info}
+            else:
+                failures.setdefault(row_number, info)
+
+    errors = []
+    for row_number, message in sorted(failures.items()):
+        # Don't leave the row's other uploads orphaned in S3
+        for item in uploaded.pop(row_number):
+            if item and item["key"]:
+                delete_from_s3(item["key"])
+        errors.append((row_number, message))
+    return uploaded, errors
+
+def insert_scheduled_posts(rows, media_by_row, username):
+    """
+    Insert all posts (and their account rows) with executemany in a single transaction.
+    Returns the number of posts scheduled.
+    """
+    params = []
+    for row in rows:
+        items = media_by_row[row.row]
+        is_carousel = len(items) > 1
+        params.append({
+            "ig_ids": ",".join(row.ig_ids),
+            "caption": row.caption,
+            "media_url": items[0]["url"],
+            "public_id": None if is_carousel else items[0]["key"],
+            "media_type": "carousel" if is_carousel else items[0]["type"],
+            "scheduled_time": row.scheduled_time,
+            "username": username,
+            "in_progress": False,
+            "media_items": json.dumps(items) if is_carousel else None,
+            "priority": row.priority,
+        })
+    if not params:
+        return 0
+
+    db = SessionLocal()
+    try:
+        bulk_insert_scheduled_posts(db, params)
+        # One wake-up is enough: the dispatcher re-reads the next due time itself
+        notify_scheduled(db, None, min(p["scheduled_time"] for p in params))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    return len(params)
+
+def bulk_schedule(raw_rows, username, open_media, known_accounts=None, media_exists=None,
+                  tz_name=DEFAULT_TIMEZONE, max_workers=BULK_UPLOAD_WORKERS, dry_run=False):
+    """
+    Validate, upload and schedule a calendar. Bad rows are skipped and reported.
+
+    Returns:
+        BulkResult(scheduled=number of posts inserted (valid rows for a dry run),
+                   errors=[(row, message)] sorted by row)
+    """
+    valid, errors = validate_rows(raw_rows, load_groups(), known_accounts, media_exists, tz_name=tz_name)
+    if dry_run or not valid:
+        return BulkResult(len(valid) if dry_run else 0, errors)
+
+    media_by_row, upload_errors = upload_rows_media(valid, open_media, max_workers)
+    errors.extend(upload_errors)
+    ready = [row for row in valid if row.row in media_by_row]
+
+    try:
+        scheduled = insert_scheduled_posts(ready, media_by_row, username)
+        print(f"✅ Bulk scheduled {scheduled} posts for {username}")
+    except Exception as e:
+        print(f"❌ Bulk insert failed: {e}")
+        for row in ready:
+            for item in media_by_row[row.row]:
+                if item["key"]:
+                    delete_from_s3(item["key"])
+            errors.append((row.row, f"database insert failed: {e}"))
+        scheduled = 0
+
+    return BulkResult(scheduled, sorted(errors))
+
+def main():
+    parser = argparse.ArgumentParser(description="Schedule a CSV/JSON calendar of Instagram posts")
+    parser.add_argument("calendar", help="Path to a .csv or .json calendar")
+    parser.add_argument("--username", required=True, help="User the posts are scheduled for")
+    parser.add_argument("--media-dir", help="Directory media file names are relative to (default: the calendar's)")
+    parser.add_argument("--timezone", default=DEFAULT_TIMEZONE, help="Timezone for times without an offset")
+    parser.add_argument("--workers", type=int, default=BULK_UPLOAD_WORKERS, help="Parallel S3 uploads")
+    parser.add_argument("--dry-run", action="store_true", help="Validate only; upload and insert nothing")
+    args = parser.parse_args()
+
+    with open(args.calendar, "rb") as f:
+        raw_rows = parse_calendar(f.read(), args.calendar)
+    media_dir = args.media_dir or os.path.dirname(os.path.abspath(args.calendar))
+
+    result = bulk_schedule(
+        raw_rows, args.username,
+        open_media=lambda name: open(os.path.join(media_dir, name), "rb"),
+        media_exists=lambda name: os.path.isfile(os.path.join(media_dir, name)),
+        tz_name=args.timezone, max_workers=args.workers, dry_run=args.dry_run,
+    )
+
+    verb = "valid" if args.dry_run else "scheduled"
+    print(f"📅 {result.scheduled}/{len(raw_rows)} posts {verb}")
+    for row_number, message in result.errors:
+        print(f"❌ Row {row_number}: {message}")
+    raise SystemExit(1 if result.errors else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+Cross-process guards for the posting engine (all state lives in the DB, so they
+hold across the Streamlit app, Post Now jobs and GitHub Actions runs).
+
+- Account leases: at most one run works on a given ig_id at a time. A lease
+  expires after LEASE_SECONDS unless renewed, so a crashed run can't block
+  an account forever. LeaseHeartbeat renews a run's leases in the background,
+  so long processing waits don't let them lapse.
+- Publish records: one row per idempotency key ("<post key>:<ig_id>"), written
+  before media_publish is called and marked published afterwards. A retried
+  job skips accounts that were already published.
+"""
+
+import datetime
+import os
+import socket
+import threading
+import time
+import uuid
+from sqlalchemy import update, delete, or_
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from db.utils import SessionLocal
+from db.models import AccountLease, PublishRecord
+
+LEASE_SECONDS = 600  # Renewed while the run makes progress on the account
+LEASE_WAIT_SECONDS = 300  # How long a run waits for a busy account before giving up on it
+LEASE_POLL_SECONDS = 10
+LEASE_HEARTBEAT_SECONDS = 60  # Well inside LEASE_SECONDS, so several missed renewals are harmless
+
+def new_holder_id():
+    """Unique lease holder id for one post_to_instagram call (host:pid:random)."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+def acquire_account_lease(ig_id, holder, ttl=LEASE_SECONDS):
+    """
+    Try to take (or re-take) the lease on an account without waiting.
+    Returns True if `holder` now owns it.
+    """
+    now = datetime.datetime.utcnow()
+    expires_at = now + datetime.timedelta(seconds=ttl)
+    db = SessionLocal()
+    try:
+        # Take over an expired lease (or extend our own)
+        taken = db.execute(
+            update(AccountLease)
+            .where(AccountLease.ig_id == ig_id)
+            .where(or_(AccountLease.expires_at < now, AccountLease.holder == holder))
+            .values(holder=holder, acquired_at=now, expires_at=expires_at)
+        ).rowcount
+        db.commit()
+        if taken:
+            return True
+
+        # No row yet: the primary key makes concurrent inserts race safely
+        db.add(AccountLease(ig_id=ig_id, holder=holder, acquired_at=now, expires_at=expires_at))
+        db.commit()
+        return True
+    except IntegrityError:
+        db.rollback()
+        return False  # Someone else holds a live lease
+    finally:
+        db.close()
+
+def wait_for_account_lease(ig_id, holder, timeout=LEASE_WAIT_SECONDS):
+    """Poll for the lease on a busy account. Returns True once acquired, False on timeout."""
+    deadline = time.monotonic() + timeout
+    while True:
+        if acquire_account_lease(ig_id, holder):
+            return True
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(LEASE_POLL_SECONDS)
+
+def renew_account_leases(ig_ids, holder, ttl=LEASE_SECONDS):
+    """
+    Push back the expiry of every lease `holder` still owns among ig_ids.
+    Returns the set of ig_ids it renewed (the others were lost to another run),
+    or None if the database couldn't be reached.
+    """
+    if not ig_ids:
+        return set()
+    db = SessionLocal()
+    try:
+        renewed = db.execute(
+            update(AccountLease)
+            .where(AccountLease.ig_id.in_(list(ig_ids)), AccountLease.holder == holder)
+            .values(expires_at=datetime.datetime.utcnow() + datetime.timedelta(seconds=ttl))
+            .returning(AccountLease.ig_id)
+        ).scalars().all()
+        db.commit()
+        return set(renewed)
+    except SQLAlchemyError as e:
+        db.rollback()
+        print(f"⚠️ Could not renew account leases: {e}")
+        return None
+    finally:
+        db.close()
+
+def holds_account_lease(ig_id, holder):
+    """
+    Renew one lease and report whether `holder` still owns it. A database error
+    counts as owned: the background renewals keep a live run's lease valid for a while.
+    """
+    renewed = renew_account_leases([ig_id], holder)
+    return renewed is None or ig_id in renewed
+
+class LeaseHeartbeat:
+    """
+    Renews the leases in `leased` (a set the caller keeps up to date) every
+    LEASE_HEARTBEAT_SECONDS on a daemon thread, however long the run spends
+    waiting on one account. Accounts found taken over are collected in `lost`.
+    """
+
+    def __init__(self, holder, leased, interval=LEASE_HEARTBEAT_SECONDS):
+        self.holder, self.leased, self.interval = holder, leased, interval
+        self.lost = set()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="account-lease-heartbeat", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            held = set(self.leased)
+            renewed = renew_account_leases(held, self.holder)
+            lost = held - renewed - self.lost if renewed is not None else set()
+            if lost:
+                self.lost |= lost
+                print(f"❌ Account leases taken over by another run: {', '.join(sorted(lost))}")
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=5)
+
+def release_account_lease(ig_id, holder):
+    """Give up the lease (only if `holder` still owns it)."""
+    db = SessionLocal()
+    try:
+        db.execute(delete(AccountLease).where(AccountLease.ig_id == ig_id, AccountLease.holder == holder))
+        db.commit()
+    except SQLAlchemyError as e:
+        db.rollback()
+        print(f"⚠️ Could not release lease on {ig_id}: {e}")
+    finally:
+        db.close()
+
+def publish_key(post_key, ig_id):
+    return f"{post_key}:{ig_id}"
+
+def get_publish_record(key):
+    """Return (status, container_id, media_id) for an idempotency key, or None."""
+    db = SessionLocal()
+    try:
+        record = db.get(PublishRecord, key)
+        if record is None:
+            return None
+        return record.status, record.container_id, record.media_id
+    finally:
+        db.close()
+
+def begin_publish(key, ig_id, container_id):
+    """Record that media_publish is about to be called for this key and container."""
+    db = SessionLocal()
+    try:
+        record = db.get(PublishRecord, key)
+        if record is None:
+            db.add(PublishRecord(key=key, ig_id=ig_id, container_id=container_id, status="publishing"))
+        else:
+            record.container_id = container_id
+            record.status = "publishing"
+        db.commit()
+    finally:
+        db.close()
+
+def mark_published(key, media_id):
+    """Record a successful publish for this key."""
+    db = SessionLocal()
+    try:
+        db.execute(
+            update(PublishRecord)
+            .where(PublishRecord.key == key)
+            .values(status="published", media_id=media_id, published_at=datetime.datetime.utcnow())
+        )
+        db.commit()
+    finally:
+        db.close()
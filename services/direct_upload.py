@@ -0,0 +1,177 @@
+"""
+Direct browser-to-S3 uploads.
+
+The app only signs requests; the media itself goes from the browser straight
+to S3, so server memory and egress stay flat no matter how large a video is:
+
+- files up to MULTIPART_THRESHOLD_BYTES: one presigned POST whose policy pins
+  the key, content type, ACL and allowed size range
+- larger files: a multipart upload with one presigned PUT URL per part, so
+  parts go up in parallel and a failed part is simply retried
+
+Before the media is scheduled, verify_upload() checks the object with HEAD
+(it exists, has the expected size and content type). With AWS_ENDPOINT_URL set
+everything runs against an S3 stand-in such as MinIO or LocalStack.
+
+From a shell:
+    python -m services.direct_upload presign clip.mp4 123456789
+    python -m services.direct_upload verify uploads/<key>.mp4
+"""
+
+import json
+import math
+import sys
+from config import get_settings
+from services.aws_utils import get_s3_client, describe_media, new_s3_key, public_s3_url
+from utils import metrics
+
+PRESIGN_EXPIRES_SECONDS = 3600
+MULTIPART_THRESHOLD_BYTES = 100 * 1024 * 1024
+MULTIPART_PART_BYTES = 64 * 1024 * 1024  # S3 needs >= 5 MB per part (except the last) and <= 10,000 parts
+MAX_UPLOAD_BYTES = {
+    "image": 8 * 1024 * 1024,  # Instagram's image limit
+    "video": 1024 * 1024 * 1024,  # Instagram's Reels limit
+}
+UPLOAD_ACL = "public-read"  # Instagram fetches the media by URL
+UPLOAD_EXTENSIONS = ["png", "jpg", "jpeg", "mp4", "mov", "avi"]  # Same as the regular uploader
+
+def plan_upload(filename, size_bytes, folder="uploads"):
+    """
+    Sign the requests a browser needs to upload one file straight to S3.
+
+    Args:
+        filename: Original file name (only its extension is used)
+        size_bytes: Exact file size, as reported by the browser
+        folder: S3 folder/prefix (default: "uploads")
+
+    Returns:
+        dict: {"key", "file_type", "content_type", "size", "method"} plus, for
+              method "post", "url" and "fields" of the presigned POST, or, for
+              method "multipart", "upload_id", "part_size" and "part_urls"
+
+    Raises:
+        ValueError: unsupported file type or size
+    """
+    file_extension, file_type, content_type = describe_media(filename)
+    if file_extension not in UPLOAD_EXTENSIONS:
+        raise ValueError(f"Unsupported file type .{file_extension}")
+    size_bytes = int(size_bytes)
+    if size_bytes <= 0:
+        raise ValueError("File is empty")
+    if size_bytes > MAX_UPLOAD_BYTES[file_type]:
+        raise ValueError(
+            f"{file_type.title()}s can be at most {MAX_UPLOAD_BYTES[file_type] // (1024 * 1024)} MB"
+        )
+
+    bucket = get_settings().aws_bucket_name
+    s3_key = new_s3_key(file_extension, folder)
+    plan = {"key": s3_key, "file_type": file_type, "content_type": content_type, "size": size_bytes}
+    client = get_s3_client()
+
+    with metrics.span("s3_presign", file_type=file_type, size_bytes=size_bytes):
+        if size_bytes <= MULTIPART_THRESHOLD_BYTES:
+            post = client.generate_presigned_post(
+                bucket, s3_key,
+                Fields={"Content-Type": content_type, "acl": UPLOAD_ACL},
+                Conditions=[
+                    {"Content-Type": content_type},
+                    {"acl": UPLOAD_ACL},
+                    ["content-length-range", size_bytes, size_bytes],
+                ],
+                ExpiresIn=PRESIGN_EXPIRES_SECONDS,
+            )
+            plan.update(method="post", url=post["url"], fields=post["fields"])
+            return plan
+
+        upload_id = client.create_multipart_upload(
+            Bucket=bucket, Key=s3_key, ContentType=content_type, ACL=UPLOAD_ACL
+        )["UploadId"]
+        part_count = math.ceil(size_bytes / MULTIPART_PART_BYTES)
+        part_urls = [
+            client.generate_presigned_url(
+                "upload_part",
+                Params={"Bucket": bucket, "Key": s3_key, "UploadId": upload_id, "PartNumber": number},
+                ExpiresIn=PRESIGN_EXPIRES_SECONDS,
+            )
+            for number in range(1, part_count + 1)
+        ]
+    plan.update(method="multipart", upload_id=upload_id, part_size=MULTIPART_PART_BYTES, part_urls=part_urls)
+    return plan
+
+def presigned_put_url(s3_key, content_type):
+    """Single presigned PUT for scripts and other clients (send the same Content-Type header)."""
+    return get_s3_client().generate_presigned_url(
+        "put_object",
+        Params={"Bucket": get_settings().aws_bucket_name, "Key": s3_key, "ContentType": content_type, "ACL": UPLOAD_ACL},
+        ExpiresIn=PRESIGN_EXPIRES_SECONDS,
+    )
+
+def complete_upload(plan, parts):
+    """
+    Finish a multipart upload from the ETags the browser collected.
+
+    Args:
+        plan: The dict returned by plan_upload()
+        parts: [{"PartNumber": 1, "ETag": "..."}, ...]
+    """
+    if plan["method"] != "multipart":
+        return
+    parts = sorted(
+        ({"PartNumber": int(p["PartNumber"]), "ETag": p["ETag"]} for p in parts),
+        key=lambda p: p["PartNumber"],
+    )
+    get_s3_client().complete_multipart_upload(
+        Bucket=get_settings().aws_bucket_name, Key=plan["key"],
+        UploadId=plan["upload_id"], MultipartUpload={"Parts": parts},
+    )
+
+def abort_upload(plan):
+    """Drop the parts of an unfinished multipart upload. Failures are logged, never raised."""
+    if not plan or plan.get("method") != "multipart":
+        return
+    try:
+        get_s3_client().abort_multipart_upload(
+            Bucket=get_settings().aws_bucket_name, Key=plan["key"], UploadId=plan["upload_id"]
+        )
+        print(f"🗑️ Aborted multipart upload of {plan['key']}")
+    except Exception as e:
+        print(f"⚠️ Could not abort multipart upload of {plan['key']}: {e}")
+
+def verify_upload(s3_key, expected_size=None):
+    """
+    Check an uploaded object with HEAD before it is scheduled.
+
+    Returns:
+        tuple: (public_url, s3_key, file_type) or (None, None, error_message),
+               like upload_to_s3()
+    """
+    from botocore.exceptions import ClientError
+    _, file_type, content_type = describe_media(s3_key)
+    try:
+        with metrics.span("s3_verify", file_type=file_type):
+            head = get_s3_client().head_object(Bucket=get_settings().aws_bucket_name, Key=s3_key)
+    except ClientError as e:
+        code = e.response.get("Error", {}).get("Code")
+        error_msg = "Upload not found in S3" if code in ("404", "NoSuchKey") else f"S3 check failed: {e}"
+        print(f"❌ {error_msg}")
+        return None, None, error_msg
+
+    size = head.get("ContentLength")
+    if expected_size is not None and size != int(expected_size):
+        return None, None, f"Upload is incomplete ({size} of {expected_size} bytes)"
+    if not size or size > MAX_UPLOAD_BYTES[file_type]:
+        return None, None, f"Uploaded {file_type} has an invalid size ({size} bytes)"
+    if head.get("ContentType") != content_type:
+        return None, None, f"Uploaded file has content type {head.get('ContentType')}, expected {content_type}"
+
+    print(f"✅ Verified direct upload: {s3_key} ({size} bytes)")
+    return public_s3_url(s3_key), s3_key, file_type
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "presign":
+        print(json.dumps(plan_upload(sys.argv[2], sys.argv[3]), indent=2))
+    elif len(sys.argv) == 3 and sys.argv[1] == "verify":
+        print(verify_upload(sys.argv[2]))
+    else:
+        print(__doc__)
+        sys.exit(1)
@@ -0,0 +1,135 @@
+"""
+Response cache for idempotent Graph API GETs.
+
+Responses are kept in an in-memory LRU (and, with GRAPH_CACHE_DIR set, as one
+JSON file per entry so other processes on the same machine reuse them). An
+entry younger than its ttl is served without a request. An older one is
+revalidated with If-None-Match, and a 304 reuses the stored body.
+
+Entries are keyed by the URL and parameters plus a fingerprint of the access
+token, so responses fetched with one token are never served to a call made
+with another. Only successful responses are stored.
+
+Every lookup increments the graph_cache counter (result=hit|revalidated|miss),
+so hit rates show up in the run summary and the Prometheus textfile.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit, urlunsplit, parse_qsl
+import requests
+from config import get_settings
+from utils import metrics
+
+GRAPH_CACHE_MAX_ENTRIES = 512
+
+_entries = OrderedDict()  # key -> {"body", "etag", "stored_at"}
+_lock = threading.Lock()
+
+def _cache_key(url, params):
+    """(key, token fingerprint) for a GET; the token is taken out of the URL/params and kept as the scope."""
+    parts = urlsplit(url)
+    query = dict(parse_qsl(parts.query))
+    query.update(params or {})
+    token = query.pop("access_token", "")
+    scope = hashlib.sha256(token.encode()).hexdigest()[:16]
+    base = urlunsplit((parts.scheme, parts.netloc, parts.path, "", ""))
+    raw = json.dumps([scope, base, sorted(query.items())])
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+def _disk_path(key):
+    cache_dir = get_settings().graph_cache_dir
+    return os.path.join(cache_dir, f"{key}.json") if cache_dir else None
+
+def _read_disk(key):
+    path = _disk_path(key)
+    if not path:
+        return None
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _write_disk(key, entry):
+    path = _disk_path(key)
+    if not path:
+        return
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # mkstemp creates the file readable by the owner only (bodies can contain page tokens)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"⚠️ Could not write Graph API cache entry: {e}")
+
+def _lookup(key):
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None:
+            _entries.move_to_end(key)
+            return entry
+    entry = _read_disk(key)
+    if entry is not None:
+        _remember(key, entry)
+    return entry
+
+def _remember(key, entry):
+    with _lock:
+        _entries[key] = entry
+        _entries.move_to_end(key)
+        while len(_entries) > GRAPH_CACHE_MAX_ENTRIES:
+            _entries.popitem(last=False)
+
+def cached_get(url, params=None, ttl=0, kind="other"):
+    """
+    GET a Graph API URL through the cache and return the decoded JSON.
+
+    Args:
+        url: Full URL (a paging "next" URL with its own query string is fine)
+        params: Query parameters, including access_token
+        ttl: Seconds a stored response is served without asking the API; 0 always revalidates
+        kind: Label for the graph_cache metric (e.g. "accounts", "page", "status")
+    """
+    key = _cache_key(url, params)
+    entry = _lookup(key)
+    if entry is not None and time.time() - entry["stored_at"] < ttl:
+        metrics.increment("graph_cache", result="hit", kind=kind)
+        return entry["body"]
+
+    headers = {"If-None-Match": entry["etag"]} if entry is not None and entry.get("etag") else {}
+    response = requests.get(url, params=params, headers=headers)
+    if response.status_code == 304 and entry is not None:
+        entry = dict(entry, stored_at=time.time())
+        _remember(key, entry)
+        _write_disk(key, entry)
+        metrics.increment("graph_cache", result="revalidated", kind=kind)
+        return entry["body"]
+
+    metrics.increment("graph_cache", result="miss", kind=kind)
+    body = response.json()
+    if response.ok and "error" not in body:
+        entry = {"body": body, "etag": response.headers.get("ETag"), "stored_at": time.time()}
+        _remember(key, entry)
+        _write_disk(key, entry)
+    return body
+
+def clear():
+    """Drop every cached response (memory and disk), e.g. after pages were connected or removed."""
+    with _lock:
+        _entries.clear()
+    cache_dir = get_settings().graph_cache_dir
+    if cache_dir and os.path.isdir(cache_dir):
+        for name in os.listdir(cache_dir):
+            if name.endswith(".json"):
+                try:
+                    os.remove(os.path.join(cache_dir, name))
+                except OSError:
+                    pass
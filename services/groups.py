@@ -0,0 +1,89 @@
+"""
+Account group membership.
+
+Membership is written in bulk: creating a group inserts all its accounts with
+one executemany, and editing computes the difference to the stored members and
+applies it as one bulk INSERT plus one bulk DELETE in a single transaction.
+The group row is locked while that happens, so two admins saving the same group
+at once can't interleave. (group_id, ig_id) is unique, so a member is never
+stored twice.
+"""
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.exc import IntegrityError
+from db.utils import SessionLocal
+from db.models import Group, GroupAccount
+
+def _member_rows(group_id, ig_ids):
+    return [{"group_id": group_id, "ig_id": ig_id} for ig_id in ig_ids]
+
+def create_group(name, ig_ids):
+    """
+    Create a group with its members. Returns the new group id.
+    Raises ValueError if the name is empty or already taken.
+    """
+    name = (name or "").strip()
+    if not name:
+        raise ValueError("Group name is required")
+    ig_ids = list(dict.fromkeys(ig_ids))
+    db = SessionLocal()
+    try:
+        group = Group(name=name)
+        db.add(group)
+        db.flush()
+        if ig_ids:
+            db.execute(insert(GroupAccount), _member_rows(group.id, ig_ids))
+        db.commit()
+        return group.id
+    except IntegrityError:
+        db.rollback()
+        raise ValueError(f"Group '{name}' already exists")
+    finally:
+        db.close()
+
+def update_group_members(name, ig_ids):
+    """
+    Make ig_ids the exact membership of the group called `name`, writing only the difference.
+
+    Returns:
+        (added, removed) lists of ig_ids. Raises ValueError if the group doesn't exist.
+    """
+    wanted = list(dict.fromkeys(ig_ids))
+    db = SessionLocal()
+    try:
+        # Locking the group row serializes concurrent edits of the same group
+        group_id = db.scalar(select(Group.id).where(Group.name == name).with_for_update())
+        if group_id is None:
+            raise ValueError(f"Group '{name}' no longer exists")
+        current = set(db.scalars(select(GroupAccount.ig_id).where(GroupAccount.group_id == group_id)))
+        added = [ig_id for ig_id in wanted if ig_id not in current]
+        removed = sorted(current - set(wanted))
+
+        if removed:
+            db.execute(
+                delete(GroupAccount)
+                .where(GroupAccount.group_id == group_id, GroupAccount.ig_id.in_(removed))
+            )
+        if added:
+            db.execute(insert(GroupAccount), _member_rows(group_id, added))
+        db.commit()
+        return added, removed
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+def delete_group(name):
+    """Delete a group and its memberships (two statements). Returns True if it existed."""
+    db = SessionLocal()
+    try:
+        group_id = db.scalar(select(Group.id).where(Group.name == name).with_for_update())
+        if group_id is None:
+            return False
+        db.execute(delete(GroupAccount).where(GroupAccount.group_id == group_id))
+        db.execute(delete(Group).where(Group.id == group_id))
+        db.commit()
+        return True
+    finally:
+        db.close()
@@ -1,85 +1,175 @@
 import requests
 import time
+from concurrent.futures import ThreadPoolExecutor
 from services.aws_utils import delete_from_cloudinary
+from services.graph_cache import cached_get
 from db.utils import SessionLocal
-from db.models import PostLog
+from db.models import PostLog, PostLogAccount
+from services.concurrency import (
+    acquire_account_lease, wait_for_account_lease, holds_account_lease, release_account_lease,
+    LeaseHeartbeat, new_holder_id, publish_key, get_publish_record, begin_publish, mark_published,
+)
+from services.processing_model import (
+    plan_processing, record_processing_time, processing_kind, next_poll_delay, observed_seconds,
+)
+from services.token_manager import (
+    get_user_token, get_token_for_account, store_page_tokens, invalidate_account_token,
+    ensure_fresh_token, AUTH_ERROR_CODE,
+)
 import datetime
-from config import get_fb_access_token
+from config import get_settings
+from utils import metrics
 
-# Get access token using hybrid config
-ACCESS_TOKEN = get_fb_access_token()
+# Carousel limits
+CAROUSEL_MAX_ITEMS = 10  # Instagram allows 2-10 items per carousel
+CAROUSEL_MAX_WORKERS = 5  # Child containers created in parallel per account
+
+# Discovery responses (pages, their Instagram accounts) are served from services/graph_cache.py
+# for this long before being revalidated; container status is always revalidated
+DISCOVERY_CACHE_SECONDS = 600
+
+def get_access_token():
+    """User access token (the exchanged long-lived one when available, see services/token_manager.py)."""
+    return get_user_token()
+
+def _account_request(method, path, ig_id, params):
+    """
+    Graph API call on behalf of one account, made with its page token.
+    If that token is rejected (error 190) it is dropped and the call is retried once
+    with the user token. Returns the decoded JSON response.
+    """
+    url = f"{get_settings().graph_api_url}/{path}"
+
+    def send(token):
+        if method == "GET":
+            return cached_get(url, {**params, "access_token": token}, kind="status")
+        return requests.request(method, url, params={**params, "access_token": token}).json()
+
+    token = get_token_for_account(ig_id) if ig_id else get_access_token()
+    resp = send(token)
+    if ig_id and resp.get("error", {}).get("code") == AUTH_ERROR_CODE and token != get_access_token():
+        invalidate_account_token(ig_id)
+        resp = send(get_access_token())
+    return resp
 
 def get_instagram_accounts():
     """
     Fetch all Instagram Business accounts from Facebook Pages.
     Handles pagination to ensure ALL pages are fetched.
+    Responses are cached for DISCOVERY_CACHE_SECONDS, so repeated calls are cheap.
     """
     accounts = {}
+    page_tokens = {}  # ig_id -> (page_id, page_token), cached for per-account calls
     
     # Initial request with higher limit
-    url = "https://graph.facebook.com/v21.0/me/accounts"
+    url = f"{get_settings().graph_api_url}/me/accounts"
     params = {
-        "access_token": ACCESS_TOKEN,
+        "access_token": get_access_token(),
         "limit": 100  # Fetch up to 100 pages per request
     }
     
-    while url:
-        try:
-            response = requests.get(url, params=params).json()
+    with metrics.span("discovery") as discovery_span:
+        while url:
+            try:
+                response = cached_get(url, params, ttl=DISCOVERY_CACHE_SECONDS, kind="accounts")
             
-            # Check for errors
-            if "error" in response:
-                print(f"❌ Facebook API Error: {response['error']}")
-                break
+                # Check for errors
+                if "error" in response:
+                    print(f"❌ Facebook API Error: {response['error']}")
+                    break
             
-            pages = response.get("data", [])
-            print(f"📄 Fetched {len(pages)} pages in this batch")
+                pages = response.get("data", [])
+                print(f"📄 Fetched {len(pages)} pages in this batch")
             
-            # Process each page
-            for page in pages:
-                pid, pname = page["id"], page["name"]
-                page_token = page.get("access_token")
+                # Process each page
+                for page in pages:
+                    pid, pname = page["id"], page["name"]
+                    page_token = page.get("access_token")
                 
-                # Get Instagram account for this page
-                ig_resp = requests.get(
-                    f"https://graph.facebook.com/v21.0/{pid}",
-                    params={
-                        "fields": "instagram_business_account",
-                        "access_token": page_token
-                    }
-                ).json()
+                    # Get Instagram account for this page
+                    with metrics.span("discovery_page_lookup", page_id=pid):
+                        ig_resp = cached_get(
+                            f"{get_settings().graph_api_url}/{pid}",
+                            {
+                                "fields": "instagram_business_account",
+                                "access_token": page_token
+                            },
+                            ttl=DISCOVERY_CACHE_SECONDS,
+                            kind="page",
+                        )
                 
-                igid = ig_resp.get("instagram_business_account", {}).get("id")
-                if igid:
-                    accounts[igid] = pname
+                    igid = ig_resp.get("instagram_business_account", {}).get("id")
+                    if igid:
+                        accounts[igid] = pname
+                        page_tokens[igid] = (pid, page_token)
             
-            # Check for next page of results (pagination)
-            paging = response.get("paging", {})
-            next_url = paging.get("next")
+                # Check for next page of results (pagination)
+                paging = response.get("paging", {})
+                next_url = paging.get("next")
             
-            if next_url:
-                print(f"📄 More pages available, fetching next batch...")
-                url = next_url
-                params = {}  # Next URL contains all params
-            else:
-                # No more pages
-                url = None
+                if next_url:
+                    print(f"📄 More pages available, fetching next batch...")
+                    url = next_url
+                    params = {}  # Next URL contains all params
+                else:
+                    # No more pages
+                    url = None
                 
-        except Exception as e:
-            print(f"❌ Error fetching accounts: {e}")
-            break
-    
+            except Exception as e:
+                print(f"❌ Error fetching accounts: {e}")
+                break
+
+        discovery_span["accounts"] = len(accounts)
+
+    store_page_tokens(page_tokens)
+
     print(f"✅ Total Instagram accounts found: {len(accounts)}")
     return accounts
 
-def create_and_process_container(ig_id, media_url, caption, media_type, wait_time=180):
+def _wait_for_processing(ig_id, container_ids, media_type, first_poll, deadline):
+    """
+    Sleep until the first poll, then poll (backing off) until no container is
+    IN_PROGRESS or `deadline` seconds have passed since the containers were created.
+    Returns (statuses, estimated seconds until all were FINISHED or None).
+    """
+    started = time.monotonic()
+    last_in_progress = None
+    print(f"⏳ Waiting {first_poll} seconds for processing...")
+    with metrics.span("processing_wait", account=ig_id, media_type=media_type, wait_s=first_poll):
+        time.sleep(first_poll)
+
+    while True:
+        if len(container_ids) == 1:
+            statuses = [get_container_status(container_ids[0], ig_id)]
+        else:
+            with ThreadPoolExecutor(max_workers=min(CAROUSEL_MAX_WORKERS, len(container_ids))) as pool:
+                statuses = list(pool.map(lambda c: get_container_status(c, ig_id), container_ids))
+        elapsed = time.monotonic() - started
+        if "IN_PROGRESS" not in statuses:
+            break
+        last_in_progress = elapsed
+        pause = next_poll_delay(elapsed, deadline)
+        if pause is None:
+            break
+        print(f"⏳ Still processing after {elapsed:.0f}s, checking again in {pause:.0f} seconds...")
+        with metrics.span("processing_wait", account=ig_id, media_type=media_type, wait_s=round(pause)):
+            time.sleep(pause)
+
+    finished = all(s in ("FINISHED", "READY") for s in statuses)
+    return statuses, observed_seconds(last_in_progress, elapsed) if finished else None
+
+def create_and_process_container(ig_id, media_url, caption, media_type, wait_time=180, deadline=None, size_bytes=None):
     """
     Create a container and wait for it to process without excessive status checks.
+    The first status check is after wait_time seconds; it is given up on after
+    deadline seconds (by default wait_time plus 120s for videos, 30s for images).
     Returns container_id if successful, None otherwise.
     """
+    if deadline is None:
+        deadline = wait_time + (120 if media_type == "video" else 30)
+
     # Step 1: Create container
-    create_url = f"https://graph.facebook.com/v21.0/{ig_id}/media"
-    params = {"caption": caption, "access_token": ACCESS_TOKEN}
+    params = {"caption": caption}
     
     if media_type == "video":
         params["media_type"] = "REELS"
@@ -89,7 +179,8 @@ def create_and_process_container(ig_id, media_url, caption, media_type, wait_tim
         params["media_type"] = "IMAGE"
     
     try:
-        resp = requests.post(create_url, params=params).json()
+        with metrics.span("container_create", account=ig_id, media_type=media_type):
+            resp = _account_request("POST", f"{ig_id}/media", ig_id, params)
         if "id" not in resp:
             print(f"❌ Failed to create container for {ig_id}: {resp}")
             return None
@@ -97,62 +188,174 @@ def create_and_process_container(ig_id, media_url, caption, media_type, wait_tim
         container_id = resp["id"]
         print(f"✅ Container created for {ig_id}: {container_id}")
         
-        # Step 2: Wait generously for processing (no status checks during wait)
-        print(f"⏳ Waiting {wait_time} seconds for processing...")
-        time.sleep(wait_time)
-        
-        # Step 3: Check status once after waiting
-        status = requests.get(
-            f"https://graph.facebook.com/v21.0/{container_id}",
-            params={"fields": "status_code", "access_token": ACCESS_TOKEN},
-        ).json()
-        
-        status_code = status.get("status_code")
-        print(f"📊 Container {container_id} status after wait: {status_code}")
+        # Step 2: Wait for processing, polling on the schedule learned for this account
+        statuses, seconds = _wait_for_processing(ig_id, [container_id], media_type, wait_time, deadline)
+        print(f"📊 Container {container_id} status: {statuses[0]}")
         
-        if status_code in ("FINISHED", "READY"):
+        if seconds is not None:
+            record_processing_time(ig_id, processing_kind(media_type), seconds, size_bytes)
             return container_id
-        elif status_code == "IN_PROGRESS":
-            # Give it one more chance with additional wait (120 seconds for videos)
-            additional_wait = 120 if media_type == "video" else 30
-            print(f"⏳ Still processing, waiting additional {additional_wait} seconds...")
-            time.sleep(additional_wait)
-            
-            # Final status check
-            status = requests.get(
-                f"https://graph.facebook.com/v21.0/{container_id}",
-                params={"fields": "status_code", "access_token": ACCESS_TOKEN},
-            ).json()
-            
-            status_code = status.get("status_code")
-            print(f"📊 Final status: {status_code}")
-            
-            if status_code in ("FINISHED", "READY"):
-                return container_id
         
-        print(f"❌ Container failed or timed out: {status}")
+        print(f"❌ Container failed or timed out: {statuses[0]}")
         return None
         
     except Exception as e:
         print(f"❌ Exception creating/processing container: {e}")
         return None
 
-def publish_container(ig_id, container_id):
+def get_container_status(container_id, ig_id=None):
+    """
+    Fetch the processing status of a container.
+    Returns the status_code string (e.g. FINISHED, IN_PROGRESS, ERROR) or None.
+    """
+    try:
+        with metrics.span("status_poll", account=ig_id) as poll_span:
+            status = _account_request("GET", container_id, ig_id, {"fields": "status_code"})
+            poll_span["status_code"] = status.get("status_code")
+        return status.get("status_code")
+    except Exception as e:
+        print(f"❌ Exception checking container {container_id}: {e}")
+        return None
+
+def create_carousel_item_container(ig_id, media_url, item_type):
+    """
+    Create a single carousel child container (no caption, is_carousel_item=true).
+    Returns container_id if created, None otherwise.
+    """
+    params = {"is_carousel_item": "true"}
+
+    if item_type == "video":
+        params["media_type"] = "VIDEO"
+        params["video_url"] = media_url
+    else:
+        params["image_url"] = media_url
+
+    try:
+        with metrics.span("container_create", account=ig_id, media_type=f"carousel_{item_type}"):
+            resp = _account_request("POST", f"{ig_id}/media", ig_id, params)
+        if "id" not in resp:
+            print(f"❌ Failed to create carousel item for {ig_id}: {resp}")
+            return None
+        return resp["id"]
+    except Exception as e:
+        print(f"❌ Exception creating carousel item: {e}")
+        return None
+
+def create_and_process_carousel(ig_id, media_items, caption, wait_time=180, deadline=None, size_bytes=None):
+    """
+    Create a CAROUSEL container for one account.
+
+    Child containers are created concurrently, processed during a single shared
+    wait, and then attached to a parent CAROUSEL container.
+
+    Args:
+        ig_id: Instagram Business account ID
+        media_items: List of {"url", "key", "type"} dicts (2-10 items)
+        caption: Post caption (set on the parent only)
+        wait_time: Seconds before the children's first status check
+        deadline: Seconds after which processing children are given up on
+            (default: wait_time plus 120s with videos, 30s without)
+        size_bytes: Largest item's size, recorded with the processing time
+
+    Returns:
+        Parent container_id if successful, None otherwise.
+    """
+    has_video = any(item["type"] == "video" for item in media_items)
+    workers = min(CAROUSEL_MAX_WORKERS, len(media_items))
+    if deadline is None:
+        deadline = wait_time + (120 if has_video else 30)
+
+    # Step 1: Create all child containers in parallel
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        child_ids = list(pool.map(
+            lambda item: create_carousel_item_container(ig_id, item["url"], item["type"]),
+            media_items,
+        ))
+
+    if not all(child_ids):
+        failed = len([c for c in child_ids if not c])
+        print(f"❌ {failed}/{len(media_items)} carousel items failed for {ig_id}")
+        return None
+
+    print(f"✅ {len(child_ids)} carousel items created for {ig_id}")
+
+    # Step 2: Children process concurrently on Instagram's side, so they share one wait
+    statuses, seconds = _wait_for_processing(ig_id, child_ids, "carousel", wait_time, deadline)
+    if seconds is None:
+        print(f"❌ Carousel items failed or timed out: {statuses}")
+        return None
+    record_processing_time(ig_id, processing_kind("carousel", media_items), seconds, size_bytes)
+
+    # Step 3: Create the parent container
+    try:
+        with metrics.span("container_create", account=ig_id, media_type="carousel"):
+            resp = _account_request("POST", f"{ig_id}/media", ig_id, {
+                "media_type": "CAROUSEL",
+                "children": ",".join(child_ids),
+                "caption": caption,
+            })
+    except Exception as e:
+        print(f"❌ Exception creating carousel container: {e}")
+        return None
+
+    if "id" not in resp:
+        print(f"❌ Failed to create carousel container for {ig_id}: {resp}")
+        return None
+
+    container_id = resp["id"]
+    print(f"✅ Carousel container created for {ig_id}: {container_id}")
+
+    # Parent only references already-processed children, so it finishes quickly
+    for _ in range(3):
+        with metrics.span("processing_wait", account=ig_id, media_type="carousel", wait_s=5):
+            time.sleep(5)
+        status_code = get_container_status(container_id, ig_id)
+        if status_code in ("FINISHED", "READY"):
+            return container_id
+        if status_code != "IN_PROGRESS":
+            break
+
+    print(f"❌ Carousel container failed or timed out: {status_code}")
+    return None
+
+def _already_published(ig_id, container_id):
+    """True if Instagram reports the container as published (e.g. a publish call that timed out)."""
+    return get_container_status(container_id, ig_id) == "PUBLISHED"
+
+def publish_container(ig_id, container_id, idempotency_key=None):
     """
     Attempt to publish a ready container.
     Returns published media ID or None.
+
+    With an idempotency_key the attempt is recorded in publish_records, and
+    before every retry the container is checked so a publish that actually
+    went through is never repeated. If that check is what detects the publish,
+    the container ID is returned (the media ID isn't known).
     """
     max_retries = 3
+
+    if idempotency_key:
+        begin_publish(idempotency_key, ig_id, container_id)
+
+    def published(media_id):
+        if idempotency_key:
+            mark_published(idempotency_key, media_id)
+        return media_id
     
     for attempt in range(max_retries):
+        if attempt > 0 and _already_published(ig_id, container_id):
+            print(f"✅ Container {container_id} was already published, not retrying")
+            return published(container_id)
+
         try:
-            publish_resp = requests.post(
-                f"https://graph.facebook.com/v21.0/{ig_id}/media_publish",
-                params={"creation_id": container_id, "access_token": ACCESS_TOKEN},
-            ).json()
+            with metrics.span("publish", account=ig_id, attempt=attempt + 1) as publish_span:
+                publish_resp = _account_request(
+                    "POST", f"{ig_id}/media_publish", ig_id, {"creation_id": container_id}
+                )
+                publish_span["published"] = "id" in publish_resp
             
             if "id" in publish_resp:
-                return publish_resp["id"]
+                return published(publish_resp["id"])
             
             # Check for "media not ready" error
             err = publish_resp.get("error", {})
@@ -160,28 +363,67 @@ def publish_container(ig_id, container_id):
                 # Media not ready, wait and retry
                 wait_time = 15 * (attempt + 1)
                 print(f"⏳ Media not ready for publish, waiting {wait_time} seconds...")
-                time.sleep(wait_time)
+                with metrics.span("publish_retry_wait", account=ig_id, wait_s=wait_time):
+                    time.sleep(wait_time)
                 continue
             
             print(f"❌ Publish failed: {publish_resp}")
+            if _already_published(ig_id, container_id):
+                return published(container_id)
             return None
             
         except Exception as e:
+            # The request may have reached Instagram; the check at the top of the loop decides
             print(f"❌ Exception during publish: {e}")
-            return None
+            if attempt < max_retries - 1:
+                time.sleep(5)
     
+    if _already_published(ig_id, container_id):
+        return published(container_id)
     return None
 
-def post_to_instagram(ig_ids, media_url, caption, public_id, media_type, username: str):
+def media_size_bytes(media_url, media_items=None):
+    """Size of the media (the largest item for carousels) from a HEAD request, or None if unknown."""
+    urls = [item["url"] for item in media_items] if media_items else [media_url]
+    sizes = []
+    for url in urls:
+        try:
+            length = requests.head(url, allow_redirects=True, timeout=10).headers.get("Content-Length")
+        except requests.RequestException:
+            length = None
+        if length and length.isdigit():
+            sizes.append(int(length))
+    return max(sizes) if sizes else None
+
+def post_to_instagram(ig_ids, media_url, caption, public_id, media_type, username: str, media_items=None, on_result=None, idempotency_key=None, keep_media=False, prewarmed=None):
     """
     Post to Instagram by creating a warm-up container for EACH account.
     Each account gets its own container with generous processing time.
+    For media_type "carousel", media_items holds the {"url", "key", "type"} dicts.
+    on_result(result) is called as each account's outcome becomes known (for progress reporting).
+
+    Each account is leased for the duration of the post (renewed in the background),
+    so concurrent runs never work on the same account at once; busy accounts are
+    retried at the end, and an account whose lease was lost isn't published to.
+    idempotency_key identifies the post (e.g. "scheduled:42"): accounts already
+    published under that key are skipped, so retried jobs don't post twice.
+    keep_media leaves the media in S3 (occurrences of a recurring schedule share it).
+    prewarmed maps ig_id -> container_id for containers already processed ahead of
+    time (services/prewarm.py); those accounts only need media_publish.
     """
     results = []
     
+    def add_result(result):
+        results.append(result)
+        if on_result:
+            on_result(result)
+    
     if not ig_ids:
         return results
     
+    # Refresh a token that would expire mid-run before any work starts
+    ensure_fresh_token()
+
     # Get account names for user-friendly results
     all_accounts = get_instagram_accounts()
     
@@ -191,75 +433,163 @@ def post_to_instagram(ig_ids, media_url, caption, public_id, media_type, usernam
     print(f"⏱️  Strategy: Individual warm-up container per account")
     print(f"{'='*60}\n")
     
-    # Determine wait times based on media type (tripled for better processing)
-    if media_type == "video":
-        initial_wait = 90  # 3 minutes for first video account
-        subsequent_wait = 90  # 3 minutes for other video accounts
-    else:
-        initial_wait = 15  # 45 seconds for images
-        subsequent_wait = 5  # 30 seconds for other images
+    is_carousel = media_type == "carousel"
+    if is_carousel:
+        print(f"🖼️  Carousel items: {len(media_items)}")
+
+    # Poll schedule per account, learned from past processing times (services/processing_model.py)
+    size_bytes = media_size_bytes(media_url, media_items)
+    schedule = plan_processing(ig_ids, media_type, media_items, size_bytes)
+    prewarmed = prewarmed or {}
     
     containers_created = {}
-    
-    # Phase 1: Create warm-up containers for all accounts sequentially
-    print("📦 PHASE 1: Creating containers for all accounts")
-    print("-" * 40)
-    
-    for index, ig_id in enumerate(ig_ids):
-        account_name = all_accounts.get(ig_id, ig_id)  # Use name if available, fallback to ID
-        print(f"\n🔄 Account {index + 1}/{len(ig_ids)}: {account_name}")
-        
-        # Add delay between container creations to avoid rate limiting
-        if index > 0:
-            delay = 1  # 5 seconds between container creations
-            print(f"⏳ Waiting {delay} seconds before next container...")
-            time.sleep(delay)
-        
-        # Determine wait time for this account
-        wait_time = initial_wait if index == 0 else subsequent_wait
-        
-        # Create and process container with appropriate wait time
-        container_id = create_and_process_container(
-            ig_id, media_url, caption, media_type, wait_time
-        )
+    holder = new_holder_id()
+    leased = set()
+    busy = []
+
+    def key_for(ig_id):
+        return publish_key(idempotency_key, ig_id) if idempotency_key else None
+
+    def already_published(ig_id, account_name):
+        """Skip accounts a previous attempt of this post already published to."""
+        key = key_for(ig_id)
+        record = get_publish_record(key) if key else None
+        if record is None:
+            return False
+        status, container_id, media_id = record
+        if status == "publishing" and container_id and _already_published(ig_id, container_id):
+            mark_published(key, container_id)
+            status, media_id = "published", container_id
+        if status != "published":
+            return False
+        add_result(f"✅ {account_name}: Already published (ID: {media_id})")
+        print(f"⏭️  {account_name} already published for this post, skipping")
+        return True
+
+    def use_prewarmed(ig_id, account_name):
+        """Take a pre-warmed container if it is still ready to publish."""
+        container_id = prewarmed.get(ig_id)
+        if not container_id:
+            return False
+        if get_container_status(container_id, ig_id) not in ("FINISHED", "READY"):
+            print(f"♻️  Pre-warmed container for {account_name} is no longer usable, creating a new one")
+            metrics.increment("prewarm", result="stale")
+            return False
+        containers_created[ig_id] = container_id
+        print(f"🔥 Using pre-warmed container for {account_name}")
+        metrics.increment("prewarm", result="used")
+        return True
+
+    def create_container(ig_id, account_name):
+        wait_time, deadline = schedule[ig_id]
+        if is_carousel:
+            container_id = create_and_process_carousel(
+                ig_id, media_items, caption, wait_time, deadline, size_bytes
+            )
+        else:
+            container_id = create_and_process_container(
+                ig_id, media_url, caption, media_type, wait_time, deadline, size_bytes
+            )
         
         if container_id:
             containers_created[ig_id] = container_id
             print(f"✅ Container ready for {account_name}")
         else:
             print(f"❌ Container failed for {account_name}")
-            results.append(f"❌ {account_name}: Container processing failed")
-    
-    # Phase 2: Publish all ready containers
-    print(f"\n{'='*60}")
-    print("📤 PHASE 2: Publishing ready containers")
-    print("-" * 40)
+            add_result(f"❌ {account_name}: Container processing failed")
+            release_account_lease(ig_id, holder)
+            leased.discard(ig_id)
     
-    for ig_id, container_id in containers_created.items():
-        account_name = all_accounts.get(ig_id, ig_id)  # Use name if available, fallback to ID
-        print(f"\n📱 Publishing to {account_name}...")
+    heartbeat = LeaseHeartbeat(holder, leased).start()
+    try:
+        # Phase 1: Create warm-up containers for all accounts sequentially
+        print("📦 PHASE 1: Creating containers for all accounts")
+        print("-" * 40)
         
-        # Small delay between publishes
-        time.sleep(2)
+        for index, ig_id in enumerate(ig_ids):
+            account_name = all_accounts.get(ig_id, ig_id)  # Use name if available, fallback to ID
+            print(f"\n🔄 Account {index + 1}/{len(ig_ids)}: {account_name}")
+
+            if already_published(ig_id, account_name):
+                continue
+
+            if not acquire_account_lease(ig_id, holder):
+                print(f"🔒 {account_name} is busy with another run, retrying it at the end")
+                busy.append(ig_id)
+                continue
+            leased.add(ig_id)
+
+            if use_prewarmed(ig_id, account_name):
+                continue
+            
+            # Add delay between container creations to avoid rate limiting
+            if index > 0:
+                delay = 1  # 5 seconds between container creations
+                print(f"⏳ Waiting {delay} seconds before next container...")
+                time.sleep(delay)
+            
+            # Create and process container on this account's poll schedule
+            create_container(ig_id, account_name)
+
+        for ig_id in busy:
+            account_name = all_accounts.get(ig_id, ig_id)
+            print(f"\n🔒 Waiting for {account_name} to be free...")
+            if not wait_for_account_lease(ig_id, holder):
+                add_result(f"❌ {account_name}: Account busy (another run is posting to it)")
+                continue
+            leased.add(ig_id)
+            if not already_published(ig_id, account_name) and not use_prewarmed(ig_id, account_name):
+                create_container(ig_id, account_name)
         
-        publish_id = publish_container(ig_id, container_id)
+        # Phase 2: Publish all ready containers
+        print(f"\n{'='*60}")
+        print("📤 PHASE 2: Publishing ready containers")
+        print("-" * 40)
         
-        if publish_id:
-            results.append(f"✅ {account_name}: Published (ID: {publish_id})")
-            print(f"✅ Successfully published to {account_name}")
-        else:
-            results.append(f"❌ {account_name}: Publish failed")
-            print(f"❌ Failed to publish to {account_name}")
+        for ig_id, container_id in containers_created.items():
+            account_name = all_accounts.get(ig_id, ig_id)  # Use name if available, fallback to ID
+            print(f"\n📱 Publishing to {account_name}...")
+            
+            # Small delay between publishes
+            time.sleep(2)
+            
+            if not holds_account_lease(ig_id, holder):
+                leased.discard(ig_id)
+                add_result(f"❌ {account_name}: Lease lost to another run, not published")
+                print(f"🔒 Lease on {account_name} was taken over, skipping its publish")
+                continue
+            
+            publish_id = publish_container(ig_id, container_id, key_for(ig_id))
+            release_account_lease(ig_id, holder)
+            leased.discard(ig_id)
+            
+            if publish_id:
+                add_result(f"✅ {account_name}: Published (ID: {publish_id})")
+                print(f"✅ Successfully published to {account_name}")
+            else:
+                add_result(f"❌ {account_name}: Publish failed")
+                print(f"❌ Failed to publish to {account_name}")
+    finally:
+        heartbeat.stop()
+        for ig_id in leased:
+            release_account_lease(ig_id, holder)
     
     # Add results for accounts that didn't get containers created
     for ig_id in ig_ids:
         account_name = all_accounts.get(ig_id, ig_id)  # Use name if available, fallback to ID
         if ig_id not in containers_created and not any(account_name in r for r in results):
-            results.append(f"❌ {account_name}: Container creation failed")
+            add_result(f"❌ {account_name}: Container creation failed")
     
     # Cleanup media from AWS/Cloudinary
-    delete_from_cloudinary(public_id, media_type)
-    print(f"\n✅ Deleted from S3: {public_id}")
+    if keep_media:
+        print("\n📎 Keeping media in S3 (shared by a recurring schedule)")
+    elif is_carousel:
+        for item in media_items:
+            delete_from_cloudinary(item["key"], item["type"])
+        print(f"\n✅ Deleted {len(media_items)} carousel items from S3")
+    else:
+        delete_from_cloudinary(public_id, media_type)
+        print(f"\n✅ Deleted from S3: {public_id}")
     
     # Log to DB
     log_post(username, ig_ids, caption, media_type, results)
@@ -273,18 +603,28 @@ def post_to_instagram(ig_ids, media_url, caption, public_id, media_type, usernam
         print("    Consider reducing video size/duration for better success")
     print(f"{'='*60}\n")
     
+    metrics.emit(
+        "post_summary", media_type=media_type, accounts=len(ig_ids), successful=successful,
+    )
+    metrics.flush()
+    
     return results
 
 def log_post(username, ig_ids, caption, media_type, results):
-    db = SessionLocal()
-    entry = PostLog(
-        username=username,
-        ig_ids=",".join(ig_ids),
-        caption=caption,
-        media_type=media_type,
-        results="\n".join(results),
-        timestamp=datetime.datetime.utcnow()
-    )
-    db.add(entry)
-    db.commit()
-    db.close()
\ No newline at end of file
+    with metrics.span("db_log_write"):
+        db = SessionLocal()
+        timestamp = datetime.datetime.utcnow()
+        entry = PostLog(
+            username=username,
+            ig_ids=",".join(ig_ids),
+            caption=caption,
+            media_type=media_type,
+            results="\n".join(results),
+            timestamp=timestamp
+        )
+        db.add(entry)
+        db.flush()
+        # Normalized copy for per-account history (same transaction)
+        db.add_all([PostLogAccount(log_id=entry.id, ig_id=ig_id, logged_at=timestamp) for ig_id in dict.fromkeys(ig_ids)])
+        db.commit()
+        db.close()
\ No newline at end of file
@@ -0,0 +1,250 @@
+import datetime
+import json
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import func, update
+from sqlalchemy.exc import SQLAlchemyError
+from db.utils import SessionLocal
+from db.models import PostJob
+
+JOB_WORKERS = 2  # Concurrent "Post Now" jobs per app process
+ORPHANED_JOB_MINUTES = 10  # Queued jobs never started this long are picked up by the heavy worker
+JOB_HEARTBEAT_SECONDS = 60  # A running job refreshes updated_at this often, whatever it is waiting on
+# Running jobs whose heartbeat stopped this long (several missed beats) lost their process
+STALE_JOB_MINUTES = 5
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def _get_executor():
+    """
+    Process-wide worker pool. It lives at module level, so it survives Streamlit
+    reruns and browser disconnects; jobs run until they finish.
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="post-job")
+    return _executor
+
+def enqueue_post_job(ig_ids, caption, media_url, public_id, media_type, username, media_items=None):
+    """
+    Record an immediate post job and hand it to the background pool.
+    Returns the job id straight away; progress is read back with get_jobs().
+    """
+    db = SessionLocal()
+    try:
+        job = PostJob(
+            username=username,
+            ig_ids=",".join(ig_ids),
+            caption=caption,
+            media_url=media_url,
+            public_id=public_id,
+            media_type=media_type,
+            media_items=json.dumps(media_items) if media_items else None,
+            total=len(ig_ids),
+        )
+        db.add(job)
+        db.commit()
+        job_id = job.id
+    finally:
+        db.close()
+
+    _get_executor().submit(run_post_job, job_id)
+    return job_id
+
+def _claim_job(job_id):
+    """
+    Atomically move a job from queued to running.
+    Returns the run's claim token, or None if someone else has it.
+    """
+    token = uuid.uuid4().hex
+    db = SessionLocal()
+    try:
+        claimed = db.execute(
+            update(PostJob)
+            .where(PostJob.id == job_id, PostJob.status == "queued")
+            .values(
+                status="running", claim_token=token,
+                started_at=datetime.datetime.utcnow(), updated_at=datetime.datetime.utcnow(),
+            )
+        ).rowcount
+        db.commit()
+        return token if claimed == 1 else None
+    finally:
+        db.close()
+
+class _JobHeartbeat:
+    """
+    Refreshes a running job's updated_at every JOB_HEARTBEAT_SECONDS on a daemon
+    thread, so long waits without account results (container processing) don't
+    look like a dead process to _requeue_stale_jobs.
+    """
+
+    def __init__(self, job_id, token, interval=JOB_HEARTBEAT_SECONDS):
+        self.job_id, self.token, self.interval = job_id, token, interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"post-job-heartbeat-{job_id}", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            db = SessionLocal()
+            try:
+                beat = db.execute(
+                    update(PostJob)
+                    .where(PostJob.id == self.job_id, PostJob.claim_token == self.token)
+                    .values(updated_at=datetime.datetime.utcnow())
+                ).rowcount
+                db.commit()
+                if not beat:
+                    print(f"❌ Post job {self.job_id} was re-queued while this run was still going")
+                    return
+            except SQLAlchemyError as e:
+                db.rollback()
+                print(f"⚠️ Post job heartbeat failed: {e}")  # A missed beat is fine; staleness needs several
+            finally:
+                db.close()
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=5)
+
+def _record_progress(job_id, token, result):
+    """Bump the job's progress counters for one account outcome (only while this run owns the job)."""
+    db = SessionLocal()
+    try:
+        db.execute(
+            update(PostJob)
+            .where(PostJob.id == job_id, PostJob.claim_token == token)
+            .values(
+                completed=PostJob.completed + 1,
+                succeeded=PostJob.succeeded + (1 if "✅" in result else 0),
+                updated_at=datetime.datetime.utcnow(),
+            )
+        )
+        db.commit()
+    except SQLAlchemyError as e:
+        db.rollback()
+        print(f"⚠️ Could not record progress for job {job_id}: {e}")
+    finally:
+        db.close()
+
+def run_post_job(job_id):
+    """Run a queued job to completion (called on a pool thread or by the heavy worker)."""
+    from services.instagram_api import post_to_instagram
+    token = _claim_job(job_id)
+    if token is None:
+        return
+
+    db = SessionLocal()
+    try:
+        job = db.get(PostJob, job_id)
+        params = dict(
+            ig_ids=job.ig_ids.split(","),
+            media_url=job.media_url,
+            caption=job.caption,
+            public_id=job.public_id,
+            media_type=job.media_type,
+            username=str(job.username),
+            media_items=job.get_media_items(),
+            idempotency_key=f"job:{job_id}",
+        )
+    finally:
+        db.close()
+
+    status, results, error = "done", [], None
+    heartbeat = _JobHeartbeat(job_id, token).start()
+    try:
+        results = post_to_instagram(**params, on_result=lambda r: _record_progress(job_id, token, r))
+    except Exception as e:
+        status, error = "failed", str(e)
+        print(f"❌ Post job {job_id} failed: {e}")
+    finally:
+        heartbeat.stop()
+
+    db = SessionLocal()
+    try:
+        # A run whose job was re-queued (it looked dead) must not overwrite the new run's outcome
+        finished = db.execute(
+            update(PostJob)
+            .where(PostJob.id == job_id, PostJob.claim_token == token)
+            .values(
+                status=status,
+                results="\n".join(results),
+                error=error,
+                finished_at=datetime.datetime.utcnow(),
+            )
+        ).rowcount
+        db.commit()
+        if not finished:
+            print(f"⚠️ Post job {job_id} was taken over by another run; not recording this run's results")
+    finally:
+        db.close()
+
+def get_jobs(username, limit=5):
+    """
+    Latest jobs for a user as plain dicts (progress columns only, no caption/media).
+    Cheap enough to poll every few seconds from the UI.
+    """
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(
+                PostJob.id, PostJob.status, PostJob.media_type, PostJob.total,
+                PostJob.completed, PostJob.succeeded, PostJob.results, PostJob.error,
+                PostJob.created_at, PostJob.finished_at,
+            )
+            .filter(PostJob.username == username)
+            .order_by(PostJob.created_at.desc())
+            .limit(limit)
+            .all()
+        )
+        return [row._asdict() for row in rows]
+    finally:
+        db.close()
+
+def _requeue_stale_jobs(db):
+    """
+    Put running jobs whose process died (no heartbeat for STALE_JOB_MINUTES) back
+    in the queue. Their idempotency key skips accounts that were already published.
+    Clearing claim_token stops a run that was only slow from recording anything more.
+    """
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(minutes=STALE_JOB_MINUTES)
+    requeued = db.execute(
+        update(PostJob)
+        .where(PostJob.status == "running")
+        .where(func.coalesce(PostJob.updated_at, PostJob.started_at, PostJob.created_at) <= cutoff)
+        .values(status="queued", claim_token=None, completed=0, succeeded=0)
+    ).rowcount
+    db.commit()
+    if requeued:
+        print(f"♻️ Re-queued {requeued} Post Now jobs left running by a stopped process")
+
+def run_orphaned_jobs():
+    """
+    Run jobs that were queued but never started (e.g. the app restarted before
+    its pool got to them) or left running by a process that stopped.
+    Called by the heavy worker. Returns result lines.
+    """
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(minutes=ORPHANED_JOB_MINUTES)
+    db = SessionLocal()
+    try:
+        _requeue_stale_jobs(db)
+        job_ids = [
+            row.id for row in db.query(PostJob.id)
+            .filter(PostJob.status == "queued", PostJob.created_at <= cutoff)
+            .order_by(PostJob.created_at)
+            .all()
+        ]
+    finally:
+        db.close()
+
+    for job_id in job_ids:
+        run_post_job(job_id)
+    return [f"Ran orphaned Post Now job {job_id}" for job_id in job_ids]
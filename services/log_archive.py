@@ -0,0 +1,218 @@
+"""
+Archive old post_logs months to S3.
+
+post_logs and post_log_accounts are partitioned by month (db/partitions.py).
+Months older than LOG_RETENTION_MONTHS are exported to compressed files in the
+media bucket and then detached and dropped, so the live tables (and the Logs
+page) only hold recent history:
+
+    s3://<bucket>/archive/<table>/month=YYYY-MM/<table>.csv.gz   (or .parquet)
+
+The month=YYYY-MM layout can be queried directly by Athena, DuckDB or pandas.
+Rows are streamed from the database to a temporary file in batches, so memory
+use doesn't depend on the size of a month. A month is only dropped after both
+files are in S3 with the expected size and the detached partitions still hold
+exactly the rows that were exported. Parquet needs pyarrow
+(`pip install pyarrow`); CSV.gz only needs the standard library.
+
+    python -m services.log_archive --dry-run
+    python -m services.log_archive --retention-months 6 --format parquet
+"""
+
+import argparse
+import csv
+import datetime
+import gzip
+import os
+import tempfile
+from sqlalchemy import text, column, Integer, Text, DateTime
+from config import get_settings, LOG_ARCHIVE_FORMATS
+from db.utils import get_engine
+from db.partitions import PARTITIONED_TABLES, add_months, month_start, list_partitions
+from utils import metrics
+
+ARCHIVE_PREFIX = "archive"
+ARCHIVE_BATCH_ROWS = 5000
+
+# Exported columns per table, with their type for the Parquet schema
+ARCHIVE_COLUMNS = {
+    "post_logs": [
+        ("id", "int"), ("username", "str"), ("ig_ids", "str"), ("caption", "str"),
+        ("media_type", "str"), ("results", "str"), ("timestamp", "datetime"),
+    ],
+    "post_log_accounts": [("log_id", "int"), ("ig_id", "str"), ("logged_at", "datetime")],
+}
+
+def archive_key(table, month, fmt):
+    return f"{ARCHIVE_PREFIX}/{table}/month={month:%Y-%m}/{table}.{fmt}"
+
+def retention_cutoff(retention_months, now=None):
+    """First month that is kept."""
+    return add_months(month_start(now or datetime.datetime.utcnow()), -retention_months)
+
+def archivable_months(conn, retention_months, now=None):
+    """{month: {table: partition}} of the months older than the retention window, oldest first."""
+    cutoff = retention_cutoff(retention_months, now)
+    by_table = {table: list_partitions(conn, table) for table in PARTITIONED_TABLES}
+    months = sorted(month for month in by_table["post_logs"] if month < cutoff)
+    return {month: {table: by_table[table].get(month) for table in PARTITIONED_TABLES} for month in months}
+
+def _batches(conn, table, partition):
+    """Rows of a partition in batches of ARCHIVE_BATCH_ROWS (server-side cursor)."""
+    sql_types = {"int": Integer, "str": Text, "datetime": DateTime}
+    names = ", ".join(f'"{name}"' for name, _ in ARCHIVE_COLUMNS[table])
+    query = text(f"SELECT {names} FROM {partition}").columns(
+        *(column(name, sql_types[kind]) for name, kind in ARCHIVE_COLUMNS[table])
+    )
+    result = conn.execution_options(yield_per=ARCHIVE_BATCH_ROWS).execute(query)
+    for batch in result.partitions():
+        yield batch
+
+def _write_csv(path, columns, batches, compress):
+    rows = 0
+    opener = gzip.open if compress else open
+    with opener(path, "wt", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow([name for name, _ in columns])
+        for batch in batches:
+            writer.writerows(batch)
+            rows += len(batch)
+    return rows
+
+def _write_parquet(path, columns, batches):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet files need pyarrow (pip install pyarrow)")
+    types = {"int": pa.int64(), "str": pa.string(), "datetime": pa.timestamp("us")}
+    schema = pa.schema([(name, types[kind]) for name, kind in columns])
+    rows = 0
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        for batch in batches:
+            columns = list(zip(*batch))
+            writer.write_table(pa.table(
+                [pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema
+            ))
+            rows += len(batch)
+    return rows
+
+def write_rows(path, columns, batches, fmt):
+    """
+    Write batches of row tuples to a csv, csv.gz or parquet file, one batch at a time.
+
+    Args:
+        path: Local file to write
+        columns: [(name, kind)] with kind "int", "str" or "datetime" (the Parquet type)
+        batches: Iterable of lists of row tuples in column order
+        fmt: "csv", "csv.gz" or "parquet"
+
+    Returns:
+        int: number of rows written
+    """
+    if fmt == "parquet":
+        return _write_parquet(path, columns, batches)
+    return _write_csv(path, columns, batches, compress=fmt == "csv.gz")
+
+def export_partition(conn, table, partition, path, fmt):
+    """Stream one partition to a local file. Returns the number of rows written."""
+    with metrics.span("log_archive_export", table=table, fmt=fmt):
+        return write_rows(path, ARCHIVE_COLUMNS[table], _batches(conn, table, partition), fmt)
+
+def upload_archive(path, key, fmt):
+    """Upload an archive file (multipart from disk) and confirm its size with HEAD."""
+    from services.aws_utils import get_s3_client
+    bucket = get_settings().aws_bucket_name
+    client = get_s3_client()
+    content_type = "application/vnd.apache.parquet" if fmt == "parquet" else "application/gzip"
+    with metrics.span("log_archive_upload", size_bytes=os.path.getsize(path)):
+        client.upload_file(path, bucket, key, ExtraArgs={"ContentType": content_type})
+    size = client.head_object(Bucket=bucket, Key=key)["ContentLength"]
+    if size != os.path.getsize(path):
+        raise RuntimeError(f"s3://{bucket}/{key} has {size} bytes, expected {os.path.getsize(path)}")
+    return f"s3://{bucket}/{key}"
+
+def archive_month(engine, month, partitions, fmt, keep_tables=False):
+    """
+    Export one month of both tables to S3, then detach (and drop) its partitions.
+    Returns {table: (rows, s3 url)}.
+    """
+    archived = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for table, partition in partitions.items():
+            if partition is None:
+                continue
+            path = os.path.join(tmp, f"{table}.{fmt}")
+            with engine.connect() as conn:
+                rows = export_partition(conn, table, partition, path, fmt)
+            archived[table] = (rows, upload_archive(path, archive_key(table, month, fmt), fmt))
+
+    with engine.begin() as conn:
+        # post_log_accounts first: its rows reference the post_logs partition
+        for table in ("post_log_accounts", "post_logs"):
+            partition = partitions.get(table)
+            if partition is None:
+                continue
+            conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {partition}"))
+            remaining = conn.execute(text(f"SELECT count(*) FROM {partition}")).scalar()
+            if remaining != archived[table][0]:
+                raise RuntimeError(
+                    f"{partition} has {remaining} rows but {archived[table][0]} were archived; leaving it attached"
+                )
+            # A detached partition keeps the parent's foreign keys as its own; the one to
+            # post_logs would stop its post_logs partition from being detached next
+            foreign_keys = conn.execute(text(
+                "SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(:table) AND contype = 'f'"
+            ), {"table": partition}).scalars().all()
+            for name in foreign_keys:
+                conn.execute(text(f'ALTER TABLE {partition} DROP CONSTRAINT "{name}"'))
+            if not keep_tables:
+                conn.execute(text(f"DROP TABLE {partition}"))
+    return archived
+
+def archive_old_logs(retention_months=None, fmt=None, keep_tables=False, dry_run=False, now=None):
+    """
+    Archive every month older than the retention window (LOG_RETENTION_MONTHS and
+    LOG_ARCHIVE_FORMAT by default). A retention of 0 archives nothing.
+    Returns the archived (or, with dry_run, archivable) months.
+    """
+    settings = get_settings()
+    retention_months = settings.log_retention_months if retention_months is None else retention_months
+    fmt = fmt or settings.log_archive_format
+    if not retention_months:
+        return []
+
+    engine = get_engine()
+    with engine.connect() as conn:
+        months = archivable_months(conn, retention_months, now)
+        # Only whole monthly partitions are archived; rows of months that never got
+        # their own partition stay in post_logs_default (see db/partitions.py)
+        stranded = conn.execute(
+            text("SELECT count(*) FROM post_logs_default WHERE timestamp < :cutoff"),
+            {"cutoff": retention_cutoff(retention_months, now)},
+        ).scalar()
+    if stranded:
+        print(f"⚠️ {stranded} post logs past the retention window are in post_logs_default and are not archived")
+    if dry_run:
+        for month, partitions in months.items():
+            print(f"🗄️ Would archive {month:%Y-%m}: {', '.join(p for p in partitions.values() if p)}")
+        return list(months)
+
+    for month, partitions in months.items():
+        archived = archive_month(engine, month, partitions, fmt, keep_tables)
+        summary = ", ".join(f"{rows} {table} rows -> {url}" for table, (rows, url) in archived.items())
+        print(f"🗄️ Archived {month:%Y-%m}: {summary}")
+    return list(months)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive post_logs months older than the retention window to S3")
+    parser.add_argument("--retention-months", type=int, help="Months to keep (default: LOG_RETENTION_MONTHS)")
+    parser.add_argument("--format", choices=LOG_ARCHIVE_FORMATS, help="Archive format (default: LOG_ARCHIVE_FORMAT)")
+    parser.add_argument("--keep-tables", action="store_true",
+                        help="Only detach archived partitions instead of dropping them")
+    parser.add_argument("--dry-run", action="store_true", help="List the months that would be archived")
+    args = parser.parse_args()
+
+    months = archive_old_logs(args.retention_months, args.format, args.keep_tables, args.dry_run)
+    if not months:
+        print("📭 Nothing to archive")
@@ -0,0 +1,120 @@
+"""
+Streaming exports of post logs for the Logs page.
+
+Rows are read with a server-side cursor (yield_per) and written to a temporary
+file one batch at a time, so memory stays at EXPORT_BATCH_ROWS rows no matter
+how much history is exported. Two kinds are available:
+
+- "logs": one row per post (PostLog)
+- "deliveries": one row per (post, account), from post_log_accounts
+
+Small files are downloaded straight from the page. Larger ones are uploaded to
+S3 under EXPORT_PREFIX and handed out as a presigned link, so the Streamlit
+process never holds the whole file. A lifecycle rule that expires exports/
+after a few days keeps the bucket clean.
+"""
+
+import os
+import tempfile
+from sqlalchemy import select
+from config import get_settings
+from db.utils import SessionLocal
+from db.models import PostLog, PostLogAccount
+from services.log_archive import write_rows
+from utils import metrics
+
+EXPORT_BATCH_ROWS = 2000
+EXPORT_FORMATS = ("csv", "csv.gz", "parquet")
+EXPORT_INLINE_MAX_BYTES = 20 * 1024 * 1024  # Bigger files are served from S3 instead of the app
+EXPORT_LINK_EXPIRES_SECONDS = 3600
+EXPORT_PREFIX = "exports"
+
+EXPORT_COLUMNS = {
+    "logs": [
+        ("id", "int"), ("timestamp_utc", "datetime"), ("username", "str"), ("ig_ids", "str"),
+        ("media_type", "str"), ("caption", "str"), ("results", "str"),
+    ],
+    "deliveries": [
+        ("log_id", "int"), ("timestamp_utc", "datetime"), ("ig_id", "str"), ("username", "str"),
+        ("media_type", "str"), ("caption", "str"),
+    ],
+}
+
+def _export_query(kind, since, until, ig_id=None):
+    """Select for one export kind; time-bounded so only the matching monthly partitions are read."""
+    if kind == "logs":
+        query = (
+            select(
+                PostLog.id, PostLog.timestamp, PostLog.username, PostLog.ig_ids,
+                PostLog.media_type, PostLog.caption, PostLog.results,
+            )
+            .where(PostLog.timestamp >= since, PostLog.timestamp < until)
+            .order_by(PostLog.timestamp, PostLog.id)
+        )
+        if ig_id:
+            query = query.where(select(PostLogAccount.log_id).where(
+                PostLogAccount.log_id == PostLog.id,
+                PostLogAccount.logged_at == PostLog.timestamp,
+                PostLogAccount.ig_id == ig_id,
+            ).exists())
+        return query
+
+    query = (
+        select(
+            PostLogAccount.log_id, PostLogAccount.logged_at, PostLogAccount.ig_id,
+            PostLog.username, PostLog.media_type, PostLog.caption,
+        )
+        .join(PostLog, (PostLog.id == PostLogAccount.log_id) & (PostLog.timestamp == PostLogAccount.logged_at))
+        .where(PostLogAccount.logged_at >= since, PostLogAccount.logged_at < until)
+        .order_by(PostLogAccount.logged_at, PostLogAccount.log_id, PostLogAccount.ig_id)
+    )
+    if ig_id:
+        query = query.where(PostLogAccount.ig_id == ig_id)
+    return query
+
+def export_logs(path, kind, fmt, since, until, ig_id=None):
+    """
+    Stream post logs to a local file.
+
+    Args:
+        path: File to write
+        kind: "logs" or "deliveries"
+        fmt: "csv", "csv.gz" or "parquet"
+        since, until: Naive UTC bounds (until is exclusive)
+        ig_id: Only posts that included this account
+
+    Returns:
+        int: number of rows written
+    """
+    db = SessionLocal()
+    try:
+        result = db.execute(
+            _export_query(kind, since, until, ig_id).execution_options(yield_per=EXPORT_BATCH_ROWS)
+        )
+        with metrics.span("log_export", kind=kind, fmt=fmt):
+            return write_rows(path, EXPORT_COLUMNS[kind], result.partitions(), fmt)
+    finally:
+        db.close()
+
+def new_export_path(fmt):
+    """Temporary file for an export (the caller deletes it)."""
+    fd, path = tempfile.mkstemp(prefix="post-logs-", suffix=f".{fmt}")
+    os.close(fd)
+    return path
+
+def publish_export(path, file_name):
+    """Upload an export to S3 and return a presigned download link (valid EXPORT_LINK_EXPIRES_SECONDS)."""
+    from services.aws_utils import get_s3_client, new_s3_key
+    bucket = get_settings().aws_bucket_name
+    key = new_s3_key(file_name.split(".", 1)[1], EXPORT_PREFIX)
+    client = get_s3_client()
+    with metrics.span("log_export_upload", size_bytes=os.path.getsize(path)):
+        client.upload_file(path, bucket, key)
+    return client.generate_presigned_url(
+        "get_object",
+        Params={
+            "Bucket": bucket, "Key": key,
+            "ResponseContentDisposition": f'attachment; filename="{file_name}"',
+        },
+        ExpiresIn=EXPORT_LINK_EXPIRES_SECONDS,
+    )
@@ -0,0 +1,196 @@
+"""
+Container pre-warming.
+
+Instagram containers stay valid for 24 hours after creation, so the slow part
+of a post (creating its containers and waiting for them to process) doesn't
+have to wait for scheduled_time. With PREWARM_LEAD_MINUTES set,
+prewarm_upcoming() creates and processes containers for posts due within that
+window and records them in prewarmed_containers. When the post is due,
+run_scheduled_posts() passes them to post_to_instagram(), which then only calls
+media_publish for those accounts.
+
+An account whose pre-warm failed, or whose container is no longer ready when
+the post is due, gets a fresh container at publish time as before.
+
+Pre-warming never holds up due posts: heavy_worker runs them first, and a pass
+ends between accounts once should_stop() says a post is due (or its time budget,
+PREWARM_PASS_SECONDS, is spent). A post stops being pre-warmed once it is due.
+"""
+
+import datetime
+from sqlalchemy import exists, func
+from sqlalchemy.exc import IntegrityError
+from db.utils import SessionLocal
+from db.models import ScheduledPost, PrewarmedContainer
+from db.accounts import split_ig_ids
+from config import get_settings
+from services.concurrency import acquire_account_lease, release_account_lease, new_holder_id, LeaseHeartbeat
+from services.instagram_api import (
+    create_and_process_container, create_and_process_carousel, media_size_bytes,
+)
+from services.processing_model import plan_processing
+from services.scheduling_policy import shard_for
+
+PREWARM_MAX_AGE_HOURS = 23  # Containers expire 24h after creation; older ones are not used
+PREWARM_POLL_SECONDS = 60  # heavy_worker re-checks for due posts at least this often while waiting
+PREWARM_PASS_SECONDS = 300  # heavy_worker ends a pre-warm pass after this long to post what fell due
+
+def _posts_to_prewarm(db, now, lead):
+    """Ids of pending posts due within the lead window with at least one account not yet attempted."""
+    attempted = (
+        db.query(func.count(PrewarmedContainer.ig_id))
+        .filter(PrewarmedContainer.post_id == ScheduledPost.id)
+        .correlate(ScheduledPost)
+        .scalar_subquery()
+    )
+    rows = (
+        db.query(ScheduledPost.id, ScheduledPost.ig_ids, attempted.label("attempted"))
+        .filter(ScheduledPost.scheduled_time > now)
+        .filter(ScheduledPost.scheduled_time <= now + lead)
+        .filter(ScheduledPost.in_progress.is_(False))
+        .order_by(ScheduledPost.scheduled_time)
+        .all()
+    )
+    return [row.id for row in rows if row.attempted < len(split_ig_ids(row.ig_ids))]
+
+def _record(post_id, ig_id, container_id):
+    """Store the outcome for one account. Returns False if the post is gone."""
+    db = SessionLocal()
+    try:
+        db.merge(PrewarmedContainer(
+            post_id=post_id,
+            ig_id=ig_id,
+            container_id=container_id,
+            status="ready" if container_id else "failed",
+            created_at=datetime.datetime.utcnow(),
+        ))
+        db.commit()
+        return True
+    except IntegrityError:
+        db.rollback()
+        return False  # Post was deleted (e.g. its recurring schedule was stopped)
+    finally:
+        db.close()
+
+def _prewarm_post(post_id, shard_index=0, shard_count=1, should_stop=None):
+    """
+    Create containers for the accounts of one post (in this shard) that have none yet.
+    Stops between accounts once the post is due (publishing creates the rest) or
+    should_stop() returns True. Returns the number made ready.
+    """
+    db = SessionLocal()
+    try:
+        post = db.get(ScheduledPost, post_id)
+        if post is None or post.in_progress or post.scheduled_time <= datetime.datetime.utcnow():
+            return 0
+        attempted = {
+            row.ig_id for row in
+            db.query(PrewarmedContainer.ig_id).filter(PrewarmedContainer.post_id == post_id).all()
+        }
+        pending = [
+            ig_id for ig_id in split_ig_ids(post.ig_ids)
+            if ig_id not in attempted and shard_for(ig_id, shard_count) == shard_index
+        ]
+        media_type, media_url, caption = post.media_type, post.media_url, post.caption
+        media_items = post.get_media_items()
+        scheduled_time = post.scheduled_time
+    finally:
+        db.close()
+    if not pending:
+        return 0
+
+    print(f"🔥 Pre-warming post {post_id} (due {scheduled_time:%H:%M} UTC) for {len(pending)} accounts")
+    size_bytes = media_size_bytes(media_url, media_items)
+    schedule = plan_processing(pending, media_type, media_items, size_bytes)
+    holder = new_holder_id()
+    ready = 0
+    for ig_id in pending:
+        if datetime.datetime.utcnow() >= scheduled_time:
+            print(f"⏰ Post {post_id} is due, leaving its remaining accounts to publishing")
+            break
+        if should_stop and should_stop():
+            break
+        if not acquire_account_lease(ig_id, holder):
+            print(f"🔒 {ig_id} is busy with another run, pre-warming it later")
+            continue
+        heartbeat = LeaseHeartbeat(holder, {ig_id}).start()  # Processing can outlast LEASE_SECONDS
+        try:
+            wait_time, deadline = schedule[ig_id]
+            if media_type == "carousel":
+                container_id = create_and_process_carousel(
+                    ig_id, media_items, caption, wait_time, deadline, size_bytes
+                )
+            else:
+                container_id = create_and_process_container(
+                    ig_id, media_url, caption, media_type, wait_time, deadline, size_bytes
+                )
+        finally:
+            heartbeat.stop()
+            release_account_lease(ig_id, holder)
+
+        if not _record(post_id, ig_id, container_id):
+            print(f"⏭️  Post {post_id} was removed, stopping its pre-warm")
+            break
+        ready += 1 if container_id else 0
+    return ready
+
+def prewarm_upcoming(now=None, lead_minutes=None, shard_index=0, shard_count=1, should_stop=None):
+    """
+    Create and process containers for posts due within the lead window
+    (PREWARM_LEAD_MINUTES by default; 0 disables pre-warming).
+    A shard of a sharded heavy run only pre-warms its own accounts.
+    should_stop() is checked between accounts; once it returns True the pass ends.
+    Returns the number of containers made ready.
+    """
+    lead_minutes = get_settings().prewarm_lead_minutes if lead_minutes is None else lead_minutes
+    if not lead_minutes:
+        return 0
+    now = now or datetime.datetime.utcnow()
+
+    db = SessionLocal()
+    try:
+        post_ids = _posts_to_prewarm(db, now, datetime.timedelta(minutes=lead_minutes))
+    finally:
+        db.close()
+
+    ready = 0
+    for post_id in post_ids:
+        if should_stop and should_stop():
+            print("⏸️  Pausing pre-warming to publish due posts")
+            break
+        ready += _prewarm_post(post_id, shard_index, shard_count, should_stop)
+    if post_ids:
+        print(f"🔥 {ready} containers pre-warmed for {len(post_ids)} upcoming posts")
+    return ready
+
+def get_prewarmed_containers(post_id, now=None):
+    """{ig_id: container_id} of a post's pre-warmed containers that are still young enough to use."""
+    now = now or datetime.datetime.utcnow()
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(PrewarmedContainer.ig_id, PrewarmedContainer.container_id)
+            .filter(PrewarmedContainer.post_id == post_id)
+            .filter(PrewarmedContainer.status == "ready")
+            .filter(PrewarmedContainer.created_at > now - datetime.timedelta(hours=PREWARM_MAX_AGE_HOURS))
+            .all()
+        )
+        return {row.ig_id: row.container_id for row in rows}
+    finally:
+        db.close()
+
+def next_prewarmed_due_time():
+    """Earliest scheduled_time (naive UTC) of a pending post with ready containers, or None."""
+    db = SessionLocal()
+    try:
+        return (
+            db.query(func.min(ScheduledPost.scheduled_time))
+            .filter(ScheduledPost.in_progress.is_(False))
+            .filter(exists().where(
+                PrewarmedContainer.post_id == ScheduledPost.id,
+                PrewarmedContainer.status == "ready",
+            ))
+            .scalar()
+        )
+    finally:
+        db.close()
@@ -0,0 +1,171 @@
+"""
+Learned container processing times.
+
+Every container that reaches FINISHED records how long it took, per account,
+kind of media (image, video, carousel, carousel_video) and file size. Before
+a post, plan_processing() turns each account's recent history into a poll
+schedule:
+
+- first status poll at FIRST_POLL_FACTOR x the account's median (p50) processing time
+- give up at DEADLINE_FACTOR x its p95, never earlier than the hand-tuned defaults
+
+With too little history for an account the samples of all accounts in the
+post are pooled. With too little history overall, the hand-tuned defaults are
+used. If enough samples exist in the media's size bucket (powers of two in MB),
+only those are used.
+
+Polls only bracket the real time: it lies between the last poll that saw
+IN_PROGRESS and the first one that saw FINISHED, and the midpoint of that
+interval is recorded. The first poll is an early probe below the median, so a
+container that got faster finishes before it and pulls the estimate down.
+(Polling first at the median and recording the FINISHED poll would make every
+sample at least the median, so the estimate could only ever go up.)
+"""
+
+import datetime
+from sqlalchemy import delete, func, select
+from sqlalchemy.exc import SQLAlchemyError
+from db.utils import SessionLocal
+from db.models import ProcessingObservation
+
+MIN_SAMPLES = 5  # Fewer samples than this fall back to pooled history / defaults
+SAMPLES_PER_ACCOUNT = 50  # Most recent observations used per account
+OBSERVATION_DAYS = 30  # Older observations are ignored (Instagram's processing speed drifts)
+DEADLINE_FACTOR = 2.0
+MAX_DEADLINE_SECONDS = 900
+POLL_MIN_SECONDS = 5
+POLL_BACKOFF = 0.5  # After the first poll, wait this fraction of the time elapsed so far
+FIRST_POLL_FACTOR = 0.5  # Early probe: first poll at this fraction of the median
+
+# Hand-tuned (first account wait, other accounts wait, extra time before giving up)
+DEFAULT_SCHEDULES = {
+    "image": (15, 5, 30),
+    "video": (90, 90, 120),
+    "carousel": (15, 5, 30),
+    "carousel_video": (90, 90, 120),
+}
+
+def processing_kind(media_type, media_items=None):
+    """Observation bucket for a post: image, video, carousel or carousel_video."""
+    if media_type == "carousel":
+        has_video = any(item["type"] == "video" for item in media_items or [])
+        return "carousel_video" if has_video else "carousel"
+    return "video" if media_type == "video" else "image"
+
+def size_bucket(size_bytes):
+    """0 for < 1 MB, then one bucket per doubling (1-2 MB, 2-4 MB, ...); None if unknown."""
+    if not size_bytes:
+        return None
+    return (int(size_bytes) // (1024 * 1024)).bit_length()
+
+def _percentile(sorted_values, pct):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))]
+
+def _load_samples(ig_ids, kind):
+    """Recent (ig_id, seconds, size_bytes) observations, at most SAMPLES_PER_ACCOUNT per account."""
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=OBSERVATION_DAYS)
+    ranked = (
+        select(
+            ProcessingObservation.ig_id,
+            ProcessingObservation.seconds,
+            ProcessingObservation.size_bytes,
+            func.row_number().over(
+                partition_by=ProcessingObservation.ig_id,
+                order_by=ProcessingObservation.observed_at.desc(),
+            ).label("rank"),
+        )
+        .where(ProcessingObservation.ig_id.in_(list(ig_ids)))
+        .where(ProcessingObservation.kind == kind)
+        .where(ProcessingObservation.observed_at > cutoff)
+        .subquery()
+    )
+    db = SessionLocal()
+    try:
+        rows = db.execute(
+            select(ranked.c.ig_id, ranked.c.seconds, ranked.c.size_bytes)
+            .where(ranked.c.rank <= SAMPLES_PER_ACCOUNT)
+        ).all()
+        return [tuple(row) for row in rows]
+    except SQLAlchemyError as e:
+        print(f"⚠️ Could not load processing history: {e}")
+        return []
+    finally:
+        db.close()
+
+def record_processing_time(ig_id, kind, seconds, size_bytes=None):
+    """Store one time-to-FINISHED observation. Failures are logged, never raised."""
+    db = SessionLocal()
+    try:
+        db.add(ProcessingObservation(ig_id=ig_id, kind=kind, seconds=seconds, size_bytes=size_bytes))
+        db.commit()
+    except SQLAlchemyError as e:
+        db.rollback()
+        print(f"⚠️ Could not record processing time: {e}")
+    finally:
+        db.close()
+
+def prune_processing_history():
+    """Delete observations older than OBSERVATION_DAYS. Returns the number deleted."""
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=OBSERVATION_DAYS)
+    db = SessionLocal()
+    try:
+        deleted = db.execute(
+            delete(ProcessingObservation).where(ProcessingObservation.observed_at < cutoff)
+        ).rowcount
+        db.commit()
+        return deleted
+    finally:
+        db.close()
+
+def _estimate(samples, bucket):
+    """(p50, p95) of samples (seconds, size_bytes), preferring ones in the same size bucket."""
+    same_size = [s for s, size in samples if bucket is not None and size_bucket(size) == bucket]
+    values = sorted(same_size if len(same_size) >= MIN_SAMPLES else [s for s, _ in samples])
+    if len(values) < MIN_SAMPLES:
+        return None
+    return _percentile(values, 50), _percentile(values, 95)
+
+def plan_processing(ig_ids, media_type, media_items=None, size_bytes=None):
+    """
+    Poll schedule per account for one post.
+    Returns {ig_id: (first_poll_seconds, deadline_seconds)}; ig_ids[0] is treated as the first account.
+    """
+    kind = processing_kind(media_type, media_items)
+    first_wait, other_wait, extra = DEFAULT_SCHEDULES[kind]
+    samples = _load_samples(ig_ids, kind) if ig_ids else []
+    bucket = size_bucket(size_bytes)
+
+    by_account = {}
+    for ig_id, seconds, size in samples:
+        by_account.setdefault(ig_id, []).append((seconds, size))
+    pooled = _estimate([(s, size) for _, s, size in samples], bucket)
+
+    plan = {}
+    for index, ig_id in enumerate(ig_ids):
+        default_wait = first_wait if index == 0 else other_wait
+        default_deadline = default_wait + extra
+        estimate = _estimate(by_account.get(ig_id, []), bucket) or pooled
+        if estimate is None:
+            plan[ig_id] = (default_wait, default_deadline)
+            continue
+        p50, p95 = estimate
+        deadline = min(max(default_deadline, p95 * DEADLINE_FACTOR), MAX_DEADLINE_SECONDS)
+        plan[ig_id] = (max(POLL_MIN_SECONDS, round(p50 * FIRST_POLL_FACTOR)), round(deadline))
+    return plan
+
+def observed_seconds(last_in_progress, finished):
+    """
+    Processing time to record for a container that was still IN_PROGRESS at
+    last_in_progress seconds (None if the first poll already saw it done) and
+    FINISHED at `finished` seconds: the midpoint of that interval.
+    """
+    if last_in_progress is None:
+        return finished
+    return (last_in_progress + finished) / 2
+
+def next_poll_delay(elapsed, deadline):
+    """Seconds until the next status poll, or None once the deadline has passed."""
+    remaining = deadline - elapsed
+    if remaining <= 0:
+        return None
+    return min(remaining, max(POLL_MIN_SECONDS, elapsed * POLL_BACKOFF))
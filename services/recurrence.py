@@ -0,0 +1,297 @@
+"""
+Recurring schedules.
+
+A ScheduleTemplate holds an RRULE (RFC 5545, parsed with python-dateutil).
+expand_templates() materializes its occurrences up to EXPANSION_HORIZON_DAYS
+ahead as ordinary ScheduledPost rows, so the checker and the heavy worker only
+ever run the cheap indexed due-query on scheduled_posts. Templates are only
+re-expanded once their materialized horizon runs low (EXPANSION_REFILL_DAYS),
+so most runs touch no rules at all.
+
+Every expansion also materializes the first occurrence past the horizon. An
+active template therefore always has a pending post, and the heavy worker run
+for that post tops the template up again. Rare rules (e.g. monthly) keep
+going without any extra cron.
+
+CLI:
+    python -m services.recurrence expand
+    python -m services.recurrence list
+"""
+
+import argparse
+import datetime
+import json
+import pytz
+from dateutil.rrule import rrulestr
+from sqlalchemy import delete, false
+from sqlalchemy.exc import SQLAlchemyError
+from db.utils import SessionLocal
+from db.models import ScheduleTemplate, ScheduledPost
+from db.notify import notify_scheduled
+from db.accounts import bulk_insert_scheduled_posts
+from services.aws_utils import delete_from_s3
+from services.scheduling_policy import PRIORITY_NORMAL
+
+EXPANSION_HORIZON_DAYS = 14  # Occurrences are materialized this far ahead
+EXPANSION_REFILL_DAYS = 7  # Re-expand a template once fewer days than this are materialized
+MAX_OCCURRENCES_PER_EXPANSION = 500
+ALLOWED_FREQUENCIES = ("HOURLY", "DAILY", "WEEKLY", "MONTHLY", "YEARLY")
+MIN_OCCURRENCE_GAP = datetime.timedelta(hours=1)  # Posting more often than this is rejected
+GAP_CHECK_OCCURRENCES = 50  # Occurrences inspected when checking the gap
+
+# Repeat options offered by the Post page (label -> RRULE; times come from dtstart)
+REPEAT_PRESETS = {
+    "Daily": "FREQ=DAILY",
+    "Weekdays (Mon-Fri)": "FREQ=WEEKLY;BYDAY=MO,TU,WE,TH,FR",
+    "Weekly": "FREQ=WEEKLY",
+    "Monthly": "FREQ=MONTHLY",
+}
+
+def parse_rule(rule, dtstart):
+    """
+    Parse an RRULE string for a naive local dtstart. Raises ValueError if invalid
+    or if it would post more often than once per MIN_OCCURRENCE_GAP.
+    Accepts "FREQ=DAILY;..." or "RRULE:FREQ=DAILY;...".
+    """
+    rule = rule.strip()
+    if rule.upper().startswith("RRULE:"):
+        rule = rule[len("RRULE:"):]
+    parts = dict(p.split("=", 1) for p in rule.upper().split(";") if "=" in p)
+    if parts.get("FREQ") not in ALLOWED_FREQUENCIES:
+        raise ValueError(f"Recurrence rule needs FREQ set to one of {', '.join(ALLOWED_FREQUENCIES)}")
+    for part in ("BYMINUTE", "BYSECOND"):
+        if "," in parts.get(part, ""):
+            raise ValueError(f"Recurrence rule can't list several {part} values (at most one post per hour)")
+    parsed = rrulestr(rule, dtstart=dtstart)
+
+    # BYHOUR/BYDAY combinations can still be denser than hourly, so check the first occurrences too
+    first = list(parsed.xafter(dtstart, count=GAP_CHECK_OCCURRENCES, inc=True))
+    if any(later - earlier < MIN_OCCURRENCE_GAP for earlier, later in zip(first, first[1:])):
+        raise ValueError("Recurrence rule repeats more often than once an hour")
+    return parsed
+
+def _to_local(utc_dt, tz):
+    return utc_dt.replace(tzinfo=datetime.timezone.utc).astimezone(tz).replace(tzinfo=None)
+
+def _to_utc(local_dt, tz):
+    return tz.localize(local_dt).astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+def occurrences_between(template, start_utc, end_utc):
+    """
+    Occurrence times of a template in (start_utc, end_utc], as naive UTC datetimes.
+    The rule is evaluated in the template's local timezone, so "every day at 09:00"
+    stays at 09:00 local time across DST changes.
+    """
+    tz = pytz.timezone(template.timezone)
+    rule = parse_rule(template.rrule, template.dtstart)
+
+    times = []
+    for local_dt in rule.xafter(_to_local(start_utc, tz), count=MAX_OCCURRENCES_PER_EXPANSION):
+        utc_dt = _to_utc(local_dt, tz)
+        if utc_dt > end_utc:
+            break
+        if utc_dt > start_utc:
+            times.append(utc_dt)
+    return times
+
+def next_occurrence_after(template, utc_dt):
+    """Next occurrence strictly after utc_dt (naive UTC), or None once the rule is exhausted."""
+    tz = pytz.timezone(template.timezone)
+    local_dt = parse_rule(template.rrule, template.dtstart).after(_to_local(utc_dt, tz))
+    return _to_utc(local_dt, tz) if local_dt else None
+
+def create_template(name, ig_ids, caption, media_url, public_id, media_type, rule, dtstart_local,
+                    username, media_items=None, priority=PRIORITY_NORMAL, timezone="Asia/Kolkata"):
+    """
+    Save a recurring schedule and materialize its first occurrences.
+
+    Args:
+        rule: RRULE string, e.g. "FREQ=WEEKLY;BYDAY=MO,WE,FR;UNTIL=20261231T235959"
+        dtstart_local: Naive datetime of the first occurrence in `timezone`
+
+    Returns:
+        The new template id. Raises ValueError if the rule is invalid.
+    """
+    parse_rule(rule, dtstart_local)
+    db = SessionLocal()
+    try:
+        template = ScheduleTemplate(
+            name=name,
+            username=username,
+            ig_ids=",".join(ig_ids),
+            caption=caption,
+            media_url=media_url,
+            public_id=public_id,
+            media_type=media_type,
+            media_items=json.dumps(media_items) if media_items else None,
+            priority=priority,
+            rrule=rule.strip(),
+            dtstart=dtstart_local,
+            timezone=timezone,
+        )
+        db.add(template)
+        db.commit()
+        template_id = template.id
+    finally:
+        db.close()
+
+    expand_templates(template_ids=[template_id])
+    return template_id
+
+def _expand_one(db, template, now, horizon_end):
+    """Insert occurrences of one template up to horizon_end. Returns the number inserted."""
+    start = max(template.expanded_until or now, now)
+    times = occurrences_between(template, start, horizon_end)
+    capped = len(times) >= MAX_OCCURRENCES_PER_EXPANSION
+    if not capped and start < horizon_end:
+        beyond = next_occurrence_after(template, horizon_end)
+        if beyond:
+            times.append(beyond)
+        else:
+            template.active = False  # Finished; its media goes once the last occurrence has posted
+
+    if times:
+        bulk_insert_scheduled_posts(db, [{
+            "ig_ids": template.ig_ids,
+            "caption": template.caption,
+            "media_url": template.media_url,
+            "public_id": template.public_id,
+            "media_type": template.media_type,
+            "media_items": template.media_items,
+            "scheduled_time": t,
+            "username": template.username,
+            "in_progress": False,
+            "priority": template.priority,
+            "template_id": template.id,
+            "keep_media": True,
+        } for t in times])
+        notify_scheduled(db, None, times[0])
+
+    # Everything up to the last materialized occurrence exists; the rest comes next time
+    template.expanded_until = times[-1] if times else horizon_end
+    return len(times)
+
+def expand_templates(now=None, template_ids=None):
+    """
+    Materialize occurrences of active templates whose horizon is running low.
+    Each template is expanded in its own transaction; rows already locked by a
+    concurrent expander are skipped. Returns the number of posts scheduled.
+    """
+    now = now or datetime.datetime.utcnow()
+    horizon_end = now + datetime.timedelta(days=EXPANSION_HORIZON_DAYS)
+    refill_before = now + datetime.timedelta(days=EXPANSION_REFILL_DAYS)
+    scheduled = 0
+
+    db = SessionLocal()
+    try:
+        query = db.query(ScheduleTemplate.id).filter(ScheduleTemplate.active.is_(True))
+        if template_ids:
+            query = query.filter(ScheduleTemplate.id.in_(template_ids))
+        else:
+            query = query.filter(
+                (ScheduleTemplate.expanded_until.is_(None)) | (ScheduleTemplate.expanded_until < refill_before)
+            )
+        due_ids = [row.id for row in query.all()]
+
+        for template_id in due_ids:
+            try:
+                template = (
+                    db.query(ScheduleTemplate)
+                    .filter(ScheduleTemplate.id == template_id)
+                    .with_for_update(skip_locked=True)
+                    .first()
+                )
+                if template is None:
+                    continue
+                count = _expand_one(db, template, now, horizon_end)
+                db.commit()
+                scheduled += count
+                if count:
+                    print(f"🔁 Template {template.id} ({template.name}): scheduled {count} occurrences")
+                if not template.active:
+                    release_template_media(template_id)  # e.g. a rule that ended before any occurrence
+            except (SQLAlchemyError, ValueError) as e:
+                db.rollback()
+                print(f"❌ Could not expand template {template_id}: {e}")
+    finally:
+        db.close()
+
+    return scheduled
+
+def release_template_media(template_id):
+    """
+    Delete a template's media from S3 once the template is no longer active and
+    none of its occurrences are left. Called after each occurrence is posted.
+    Returns True if the media was deleted.
+    """
+    db = SessionLocal()
+    try:
+        template = db.get(ScheduleTemplate, template_id)
+        if template is None or template.active or not template.media_url:
+            return False
+        remaining = db.query(ScheduledPost.id).filter(ScheduledPost.template_id == template_id).first()
+        if remaining:
+            return False
+
+        if template.media_items:
+            for item in json.loads(template.media_items):
+                delete_from_s3(item["key"])
+        else:
+            delete_from_s3(template.public_id)
+        # Recorded so the media isn't deleted twice
+        template.media_url, template.public_id, template.media_items = "", None, None
+        db.commit()
+        return True
+    finally:
+        db.close()
+
+def stop_template(template_id):
+    """Deactivate a template and remove its occurrences that haven't started."""
+    db = SessionLocal()
+    try:
+        template = db.get(ScheduleTemplate, template_id)
+        if template is None:
+            return False
+        template.active = False
+        db.execute(
+            delete(ScheduledPost)
+            .where(ScheduledPost.template_id == template_id)
+            .where(ScheduledPost.in_progress == false())
+        )
+        db.commit()
+    finally:
+        db.close()
+
+    release_template_media(template_id)
+    return True
+
+def list_templates(username=None, active_only=True):
+    """Templates as plain dicts (newest first), optionally for one user."""
+    db = SessionLocal()
+    try:
+        query = db.query(
+            ScheduleTemplate.id, ScheduleTemplate.name, ScheduleTemplate.username,
+            ScheduleTemplate.rrule, ScheduleTemplate.dtstart, ScheduleTemplate.timezone,
+            ScheduleTemplate.media_type, ScheduleTemplate.active, ScheduleTemplate.expanded_until,
+        )
+        if username:
+            query = query.filter(ScheduleTemplate.username == username)
+        if active_only:
+            query = query.filter(ScheduleTemplate.active.is_(True))
+        return [row._asdict() for row in query.order_by(ScheduleTemplate.created_at.desc()).all()]
+    finally:
+        db.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage recurring schedules")
+    parser.add_argument("command", choices=["expand", "list"])
+    args = parser.parse_args()
+
+    if args.command == "expand":
+        print(f"📅 Scheduled {expand_templates()} occurrences")
+    else:
+        for t in list_templates():
+            print(f"{t['id']:>5}  {t['name']:<30} {t['rrule']:<40} until {t['expanded_until']}")
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,27 @@
 import datetime
+import json
+from collections import defaultdict
 from db.utils import SessionLocal
-from db.models import ScheduledPost
+from db.models import ScheduledPost, ScheduledPostAccount, PrewarmedContainer
+from db.notify import notify_scheduled
+from db.workflow_lock import fence_clause, shard_lock_name, claim_label, live_claim_clause
 from services.instagram_api import post_to_instagram
-import streamlit as st
-from sqlalchemy import true, false
+from services.aws_utils import delete_from_cloudinary
+from services.recurrence import release_template_media
+from services.prewarm import get_prewarmed_containers
+from services.scheduling_policy import (
+    DueCandidate, PRIORITY_LABELS, PRIORITY_NORMAL, estimate_cost, pick_next, shard_for,
+)
+from sqlalchemy import true, false, func, update, delete, exists, or_, and_
+from sqlalchemy.orm import aliased
 from sqlalchemy.exc import SQLAlchemyError
 
 SCHEDULE_RUN_INTERVAL = 300  # 5 minutes
 
-def schedule_post(ig_ids, caption, media_url, public_id, media_type, local_dt_tz, username):
+def schedule_post(ig_ids, caption, media_url, public_id, media_type, local_dt_tz, username, media_items=None, priority=PRIORITY_NORMAL):
     utc_dt = local_dt_tz.astimezone(datetime.timezone.utc).replace(tzinfo=None)
     db = SessionLocal()
-    db.add(ScheduledPost(
+    post = ScheduledPost(
         ig_ids=",".join(ig_ids),
         caption=caption,
         media_url=media_url,
@@ -19,49 +29,387 @@ def schedule_post(ig_ids, caption, media_url, public_id, media_type, local_dt_tz
         media_type=media_type,
         scheduled_time=utc_dt,
         username=username,
-    ))
+        media_items=json.dumps(media_items) if media_items else None,
+        priority=priority,
+        accounts=[ScheduledPostAccount(ig_id=ig_id, position=i) for i, ig_id in enumerate(dict.fromkeys(ig_ids))],
+    )
+    db.add(post)
+    db.flush()
+    # Wake the dispatcher so it can arm a timer for this post
+    notify_scheduled(db, post.id, utc_dt)
     db.commit()
     db.close()
 
-def run_scheduled_posts():
+def _load_due_candidates(db, now):
+    """
+    Lightweight view of the due, not-yet-started posts (no captions loaded).
+    Accounts a stopped sharded run already finished don't count towards the cost.
+    """
+    prewarmed = (
+        db.query(func.count(PrewarmedContainer.ig_id))
+        .filter(PrewarmedContainer.post_id == ScheduledPost.id, PrewarmedContainer.status == "ready")
+        .correlate(ScheduledPost)
+        .scalar_subquery()
+    )
+    remaining = (
+        db.query(func.count(ScheduledPostAccount.ig_id))
+        .filter(ScheduledPostAccount.post_id == ScheduledPost.id, ScheduledPostAccount.done == false())
+        .correlate(ScheduledPost)
+        .scalar_subquery()
+    )
+    has_accounts = exists().where(ScheduledPostAccount.post_id == ScheduledPost.id)
+    rows = (
+        db.query(
+            ScheduledPost.id,
+            ScheduledPost.username,
+            ScheduledPost.priority,
+            ScheduledPost.media_type,
+            ScheduledPost.ig_ids,
+            ScheduledPost.media_items,
+            ScheduledPost.scheduled_time,
+            prewarmed.label("prewarmed"),
+            remaining.label("remaining"),
+            has_accounts.label("has_accounts"),
+        )
+        .filter(ScheduledPost.scheduled_time <= now)
+        .filter(ScheduledPost.in_progress == false())
+        .all()
+    )
+    return [
+        DueCandidate(
+            id=r.id,
+            username=r.username,
+            priority=r.priority,
+            media_type=r.media_type,
+            account_count=r.remaining if r.has_accounts else len(r.ig_ids.split(",")) if r.ig_ids else 0,
+            media_items=r.media_items,
+            scheduled_time=r.scheduled_time,
+            prewarmed=r.prewarmed,
+        )
+        for r in rows
+    ]
+
+def _load_shard_candidates(db, now, shard_index, shard_count):
+    """
+    Due posts with unclaimed accounts in this shard, as DueCandidates counting only
+    those accounts, plus {post_id: [ig_id, ...]} of the accounts themselves.
+    Posts an unsharded run has claimed whole (in_progress with a post-level claim) are skipped.
+    """
+    claimed = aliased(ScheduledPostAccount)
+    sharded_in_progress = exists().where(claimed.post_id == ScheduledPost.id, claimed.claimed_by.isnot(None))
+    rows = (
+        db.query(
+            ScheduledPost.id,
+            ScheduledPost.username,
+            ScheduledPost.priority,
+            ScheduledPost.media_type,
+            ScheduledPost.media_items,
+            ScheduledPost.scheduled_time,
+            ScheduledPostAccount.ig_id,
+        )
+        .join(ScheduledPostAccount, ScheduledPostAccount.post_id == ScheduledPost.id)
+        .filter(ScheduledPost.scheduled_time <= now)
+        .filter(ScheduledPostAccount.claimed_by.is_(None))
+        .filter(or_(
+            ScheduledPost.in_progress == false(),
+            and_(sharded_in_progress, ScheduledPost.claimed_by.is_(None)),
+        ))
+        .order_by(ScheduledPost.id, ScheduledPostAccount.position)
+        .all()
+    )
+    accounts, posts = defaultdict(list), {}
+    for r in rows:
+        if shard_for(r.ig_id, shard_count) == shard_index:
+            accounts[r.id].append(r.ig_id)
+            posts[r.id] = r
+    if not posts:
+        return [], {}
+
+    ready = set(
+        db.query(PrewarmedContainer.post_id, PrewarmedContainer.ig_id)
+        .filter(PrewarmedContainer.post_id.in_(list(posts)), PrewarmedContainer.status == "ready")
+        .all()
+    )
+    candidates = [
+        DueCandidate(
+            id=r.id,
+            username=r.username,
+            priority=r.priority,
+            media_type=r.media_type,
+            account_count=len(accounts[r.id]),
+            media_items=r.media_items,
+            scheduled_time=r.scheduled_time,
+            prewarmed=sum((r.id, ig_id) in ready for ig_id in accounts[r.id]),
+        )
+        for r in posts.values()
+    ]
+    return candidates, accounts
+
+def _release_dead_claims(db, fencing_token, lock_name):
+    """
+    Return work claimed by runs that no longer hold their lock (crashed or killed
+    mid-post) so it isn't stuck forever: unfinished scheduled_post_accounts rows
+    become unclaimed, and in-progress posts go back to pending once no live run
+    (or live shard) is working on them. Posting them again is safe: publish_records
+    skip accounts that were already published to.
+    """
+    now = datetime.datetime.utcnow()
+    release_accounts = (
+        update(ScheduledPostAccount)
+        .where(ScheduledPostAccount.claimed_by.isnot(None), ScheduledPostAccount.done == false())
+        .where(~live_claim_clause(ScheduledPostAccount.claimed_by, now))
+        .values(claimed_by=None)
+    )
+    live_shard_claim = exists().where(
+        ScheduledPostAccount.post_id == ScheduledPost.id,
+        ScheduledPostAccount.done == false(),
+        live_claim_clause(ScheduledPostAccount.claimed_by, now),
+    )
+    release = (
+        update(ScheduledPost)
+        .where(ScheduledPost.in_progress == true())
+        .where(~live_claim_clause(ScheduledPost.claimed_by, now))
+        .where(~live_shard_claim)
+        .values(in_progress=False, claimed_by=None, claimed_at=None)
+    )
+    if fencing_token is not None:
+        release_accounts = release_accounts.where(fence_clause(fencing_token, lock_name))
+        release = release.where(fence_clause(fencing_token, lock_name))
+    released_accounts = db.execute(release_accounts).rowcount
+    released = db.execute(release).rowcount
+    db.commit()
+    if released_accounts:
+        print(f"♻️  Unclaimed {released_accounts} accounts of scheduled posts claimed by a stopped run")
+    if released:
+        print(f"♻️  Returned {released} scheduled posts left in progress by a stopped run to pending")
+
+def _delete_post_media(media_type, public_id, media_items):
+    if media_items:
+        for item in media_items:
+            delete_from_cloudinary(item["key"], item["type"])
+    else:
+        delete_from_cloudinary(public_id, media_type)
+
+def _run_shard(db, results, fencing_token, shard_index, shard_count):
+    """
+    run_scheduled_posts() for one shard of a sharded heavy run: the same ordering,
+    but only for the accounts shard_for() assigns to this shard. Accounts are
+    claimed in scheduled_post_accounts, so shards never post to the same account,
+    and the shard that finishes a post's last account deletes it (and its media).
+    """
+    claimant = claim_label(fencing_token, shard_lock_name(shard_index, shard_count))
+    served_seconds_by_user = defaultdict(float)
+
+    while True:
+        now = datetime.datetime.utcnow()
+        candidates, accounts = _load_shard_candidates(db, now, shard_index, shard_count)
+        candidate = pick_next(candidates, now, served_seconds_by_user)
+        if candidate is None:
+            break
+
+        claim = (
+            update(ScheduledPostAccount)
+            .where(ScheduledPostAccount.post_id == candidate.id)
+            .where(ScheduledPostAccount.ig_id.in_(accounts[candidate.id]))
+            .where(ScheduledPostAccount.claimed_by.is_(None))
+            .values(claimed_by=claimant)
+        )
+        if fencing_token is not None:
+            claim = claim.where(fence_clause(fencing_token, shard_lock_name(shard_index, shard_count)))
+        claimed = db.execute(claim).rowcount
+        if claimed:
+            # Keeps pre-warming and unsharded runs away from the post
+            db.execute(update(ScheduledPost).where(ScheduledPost.id == candidate.id).values(in_progress=True))
+        db.commit()
+        if not claimed:
+            still_pending = (
+                db.query(ScheduledPostAccount.ig_id)
+                .filter(ScheduledPostAccount.post_id == candidate.id)
+                .filter(ScheduledPostAccount.ig_id.in_(accounts[candidate.id]))
+                .filter(ScheduledPostAccount.claimed_by.is_(None))
+                .first()
+            )
+            if still_pending is not None:  # Only the fence can refuse unclaimed accounts
+                results.append(f"Workflow lock lost, stopped before scheduled post ID {candidate.id}")
+                break
+            continue  # Claimed by another run (or deleted) in the meantime
+
+        post = db.get(ScheduledPost, candidate.id)
+        if post is None:
+            continue
+        ig_ids = [
+            row.ig_id for row in
+            db.query(ScheduledPostAccount.ig_id)
+            .filter(ScheduledPostAccount.post_id == candidate.id, ScheduledPostAccount.claimed_by == claimant)
+            .order_by(ScheduledPostAccount.position)
+        ]
+        cost = estimate_cost(candidate.media_type, len(ig_ids), candidate.media_items, candidate.prewarmed)
+        print(f"🗂️  Next post {post.id} ({candidate.media_type} x {len(ig_ids)} of {len(post.accounts)} accounts, "
+              f"shard {shard_index + 1}/{shard_count}, ~{cost / 60:.1f} min)")
+
+        prewarmed = get_prewarmed_containers(post.id)
+        try:
+            results.extend(post_to_instagram(
+                ig_ids=ig_ids,
+                media_url=post.media_url,
+                caption=post.caption,
+                public_id=post.public_id,
+                media_type=post.media_type,
+                username=str(post.username),
+                media_items=post.get_media_items(),
+                idempotency_key=f"scheduled:{post.id}",
+                keep_media=True,  # Other shards may still need it; deleted below with the post
+                prewarmed={ig_id: prewarmed[ig_id] for ig_id in ig_ids if ig_id in prewarmed},
+            ))
+        except Exception as e:
+            results.append(f"Error processing scheduled post ID {post.id}: {e}")
+
+        served_seconds_by_user[candidate.username] += cost
+
+        # Delete the post once every account (in any shard) is done
+        post_id, template_id, keep_media = post.id, post.template_id, post.keep_media
+        media_type, public_id, media_items = post.media_type, post.public_id, post.get_media_items()
+        try:
+            db.execute(
+                update(ScheduledPostAccount)
+                .where(ScheduledPostAccount.post_id == post_id, ScheduledPostAccount.claimed_by == claimant)
+                .values(done=True)
+            )
+            db.commit()
+            finished = db.execute(
+                delete(ScheduledPost)
+                .where(ScheduledPost.id == post_id)
+                .where(~exists().where(
+                    ScheduledPostAccount.post_id == post_id, ScheduledPostAccount.done == false()
+                ))
+            ).rowcount == 1
+            db.commit()
+        except SQLAlchemyError as e:
+            db.rollback()
+            results.append(f"Error finishing scheduled post ID {post_id}: {e}")
+            continue
+
+        if finished and not keep_media:
+            _delete_post_media(media_type, public_id, media_items)
+        if finished and template_id:
+            release_template_media(template_id)
+
+def has_due_posts(shard_index=0, shard_count=1):
+    """True if a post (or, for a shard, one of its accounts of a post) is due and not yet claimed."""
+    db = SessionLocal()
+    try:
+        now = datetime.datetime.utcnow()
+        if shard_count > 1:
+            return bool(_load_shard_candidates(db, now, shard_index, shard_count)[0])
+        return db.query(
+            exists().where(ScheduledPost.scheduled_time <= now, ScheduledPost.in_progress == false())
+        ).scalar()
+    finally:
+        db.close()
+
+def run_scheduled_posts(fencing_token=None, shard_index=0, shard_count=1):
     """
     Run scheduled posts that are due.
     Marks posts as in-progress to prevent duplicate execution.
     Passes the correct username (string) to post_to_instagram for proper logging.
+
+    Posts are picked one at a time by services.scheduling_policy (priority class
+    with aging, per-user fair share, shortest job first). The due list is
+    re-read after every post, so small posts that become due while a large
+    batch is running don't wait behind the rest of the batch.
+
+    With a fencing_token (heavy_worker's workflow lock), a post is only claimed
+    while that token still holds the lock; once it doesn't, no more posts are started.
+    Claimed posts and their unfinished accounts record claim_label(fencing_token),
+    and every run first takes back the work of runs that lost their lock
+    (_release_dead_claims). Accounts a stopped shard already finished are skipped.
+
+    With shard_count > 1 this run is one of several parallel heavy workers and only
+    posts to the accounts of shard_index (see _run_shard).
     """
     db = SessionLocal()
-    now = datetime.datetime.utcnow()
     results = []
+    served_seconds_by_user = defaultdict(float)
+    claimant = claim_label(fencing_token)
 
     try:
-        due_posts = (
-            db.query(ScheduledPost)
-            .filter(ScheduledPost.scheduled_time <= now)
-            .filter(ScheduledPost.in_progress == false())
-            .all()
-        )
+        _release_dead_claims(db, fencing_token, shard_lock_name(shard_index, shard_count))
+        if shard_count > 1:
+            _run_shard(db, results, fencing_token, shard_index, shard_count)
+            return results
+
+        while True:
+            now = datetime.datetime.utcnow()
+            candidate = pick_next(_load_due_candidates(db, now), now, served_seconds_by_user)
+            if candidate is None:
+                break
 
-        for post in due_posts:
-            # Mark as in-progress safely
-            setattr(post, "in_progress", True)
+            # Mark as in-progress safely: a single UPDATE, fenced by the workflow lock
+            claim = (
+                update(ScheduledPost)
+                .where(ScheduledPost.id == candidate.id, ScheduledPost.in_progress == false())
+                .values(in_progress=True, claimed_by=claimant, claimed_at=now)
+            )
+            if fencing_token is not None:
+                claim = claim.where(fence_clause(fencing_token))
+            claimed = db.execute(claim).rowcount == 1
+            if claimed:
+                # Claim its unfinished accounts too, the same way shards do
+                db.execute(
+                    update(ScheduledPostAccount)
+                    .where(ScheduledPostAccount.post_id == candidate.id, ScheduledPostAccount.done == false())
+                    .values(claimed_by=claimant)
+                )
             db.commit()
+            if not claimed:
+                still_pending = (
+                    db.query(ScheduledPost.id)
+                    .filter(ScheduledPost.id == candidate.id, ScheduledPost.in_progress == false())
+                    .first()
+                )
+                if still_pending is not None:  # Only the fence can refuse an unclaimed post
+                    results.append(f"Workflow lock lost, stopped before scheduled post ID {candidate.id}")
+                    break
+                continue  # Claimed by another run (or deleted) in the meantime
+
+            post = db.get(ScheduledPost, candidate.id)
+            if post is None:
+                continue
+
+            cost = estimate_cost(
+                candidate.media_type, candidate.account_count, candidate.media_items, candidate.prewarmed
+            )
+            print(f"🗂️  Next post {post.id} ({candidate.media_type} x {candidate.account_count}, "
+                  f"~{cost / 60:.1f} min, priority {PRIORITY_LABELS.get(candidate.priority, candidate.priority)})")
 
+            # A sharded run that stopped may have finished some accounts already
+            done = {account.ig_id for account in post.accounts if account.done}
+            ig_ids = [ig_id for ig_id in post.ig_ids.split(",") if ig_id not in done]
             try:
-                ig_ids = post.ig_ids.split(",")
-                username = str(post.username)  # This is the instance attribute, not the Column
-                post_results = post_to_instagram(
-                    ig_ids=ig_ids,
-                    media_url=post.media_url,
-                    caption=post.caption,
-                    public_id=post.public_id,
-                    media_type=post.media_type,
-                    username=username  # ✅ pass actual string
-                )
-                results.extend(post_results)
+                if ig_ids:
+                    username = str(post.username)  # This is the instance attribute, not the Column
+                    post_results = post_to_instagram(
+                        ig_ids=ig_ids,
+                        media_url=post.media_url,
+                        caption=post.caption,
+                        public_id=post.public_id,
+                        media_type=post.media_type,
+                        username=username,  # ✅ pass actual string
+                        media_items=post.get_media_items(),
+                        idempotency_key=f"scheduled:{post.id}",
+                        keep_media=post.keep_media,
+                        prewarmed=get_prewarmed_containers(post.id),
+                    )
+                    results.extend(post_results)
+                elif not post.keep_media:
+                    _delete_post_media(post.media_type, post.public_id, post.get_media_items())
             except Exception as e:
                 results.append(f"Error processing scheduled post ID {post.id}: {e}")
 
+            served_seconds_by_user[candidate.username] += cost
+
             # Delete post after processing
+            template_id = post.template_id
             try:
                 db.delete(post)
                 db.commit()
@@ -69,10 +417,14 @@ def run_scheduled_posts():
                 db.rollback()
                 results.append(f"Error deleting scheduled post ID {post.id}: {e}")
 
+            # Last occurrence of a finished recurring schedule: its media can go now
+            if template_id:
+                release_template_media(template_id)
+
     except SQLAlchemyError as e:
         db.rollback()
         results.append(f"Database error fetching scheduled posts: {e}")
     finally:
         db.close()
 
-    return results
\ No newline at end of file
+    return results
@@ -0,0 +1,103 @@
+"""
+Ordering policy for due scheduled posts.
+
+Kept free of heavy imports (stdlib only) so lightweight entry points such as
+smart_checker.py can use the same cost model.
+
+Order, most significant first:
+  1. effective priority class (overdue posts are promoted up to High, so big batches can't starve)
+  2. per-user fair share (users served least engine time in this run go first)
+  3. shortest estimated job first
+  4. scheduled_time (FIFO)
+"""
+
+import json
+import math
+import zlib
+from collections import namedtuple
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+PRIORITY_LABELS = {
+    PRIORITY_HIGH: "High",
+    PRIORITY_NORMAL: "Normal",
+    PRIORITY_LOW: "Bulk (low)",
+}
+
+# Approximate engine seconds per account (processing waits + API calls in post_to_instagram)
+MEDIA_COST_SECONDS = {
+    "image": 25,
+    "video": 200,
+}
+CAROUSEL_BASE_SECONDS = 20  # parent container creation + publish
+CAROUSEL_ITEM_SECONDS = 5   # children are created in parallel, so each extra item is cheap
+PREWARMED_COST_SECONDS = 5  # accounts with a pre-warmed container only need media_publish
+
+# Posts overdue by more than this are promoted one priority class per period, never past High
+AGING_MINUTES = 30
+
+# smart_checker.py starts one more heavy worker per this much estimated backlog
+SHARD_TARGET_SECONDS = 60 * 60
+
+DueCandidate = namedtuple(
+    "DueCandidate", "id username priority media_type account_count media_items scheduled_time prewarmed",
+    defaults=(0,),
+)
+
+def estimate_cost(media_type, account_count, media_items=None, prewarmed=0):
+    """
+    Estimated engine time in seconds for posting one ScheduledPost.
+    media_items may be a list or its JSON encoding (as stored on ScheduledPost).
+    prewarmed is the number of accounts whose container was created ahead of time.
+    """
+    if media_type == "carousel":
+        items = json.loads(media_items) if isinstance(media_items, str) else (media_items or [])
+        has_video = any(item.get("type") == "video" for item in items)
+        wait = MEDIA_COST_SECONDS["video" if has_video else "image"]
+        per_account = wait + CAROUSEL_BASE_SECONDS + CAROUSEL_ITEM_SECONDS * len(items)
+    else:
+        per_account = MEDIA_COST_SECONDS.get(media_type, MEDIA_COST_SECONDS["image"])
+    if prewarmed:
+        return per_account * max(account_count - prewarmed, 0) + PREWARMED_COST_SECONDS * prewarmed
+    return per_account * max(account_count, 1)
+
+def effective_priority(priority, scheduled_time, now):
+    """
+    Priority class after aging: every AGING_MINUTES overdue promotes one class.
+    Clamped at PRIORITY_HIGH, so once posts reach High the remaining tie-breakers
+    (fair share, then shortest job first) order them instead of how late they are.
+    """
+    base = PRIORITY_NORMAL if priority is None else priority
+    overdue_minutes = max(0.0, (now - scheduled_time).total_seconds() / 60)
+    return max(PRIORITY_HIGH, base - int(overdue_minutes // AGING_MINUTES))
+
+def sort_key(candidate, now, served_seconds_by_user):
+    return (
+        effective_priority(candidate.priority, candidate.scheduled_time, now),
+        served_seconds_by_user.get(candidate.username, 0.0),
+        estimate_cost(candidate.media_type, candidate.account_count, candidate.media_items, candidate.prewarmed),
+        candidate.scheduled_time,
+    )
+
+def pick_next(candidates, now, served_seconds_by_user):
+    """Return the candidate that should run next, or None if there are none."""
+    if not candidates:
+        return None
+    return min(candidates, key=lambda c: sort_key(c, now, served_seconds_by_user))
+
+def shard_for(ig_id, shard_count):
+    """Shard (0 .. shard_count-1) that posts to an account. Stable across processes, unlike hash()."""
+    if shard_count <= 1:
+        return 0
+    return zlib.crc32(str(ig_id).encode()) % shard_count
+
+def plan_shard_count(backlog_seconds, account_count, max_shards):
+    """
+    Heavy workers needed to drain backlog_seconds of estimated work within
+    SHARD_TARGET_SECONDS each. Never more than max_shards or one per account
+    (accounts are the unit of sharding).
+    """
+    wanted = math.ceil(backlog_seconds / SHARD_TARGET_SECONDS)
+    return max(1, min(wanted, max_shards, account_count))
@@ -0,0 +1,215 @@
+"""
+Graph API access tokens.
+
+- User token: with FB_APP_ID / FB_APP_SECRET set, the configured FB_ACCESS_TOKEN
+  is exchanged for a long-lived (~60 day) token, and exchanged again once it has
+  less than TOKEN_REFRESH_DAYS left. post_to_instagram() checks this before every
+  run, so a multi-hour run never starts on a token that is about to expire.
+- Page tokens: /me/accounts returns one per Facebook Page; they are cached per
+  Instagram account and used for that account's calls. A page token the Graph
+  API rejects is dropped and the call falls back to the user token.
+
+Tokens are kept in memory and persisted to the access_tokens table, so the
+Streamlit app, Post Now jobs and GitHub Actions runs reuse them instead of
+exchanging again. Rows derived from a different FB_ACCESS_TOKEN than the one
+currently configured are ignored.
+
+CLI:
+    python -m services.token_manager status
+    python -m services.token_manager refresh
+"""
+
+import argparse
+import datetime
+import hashlib
+import threading
+import requests
+from sqlalchemy import delete
+from sqlalchemy.exc import SQLAlchemyError
+from db.utils import SessionLocal
+from db.models import AccessToken
+from config import get_fb_access_token, get_settings
+from utils import metrics
+
+TOKEN_REFRESH_DAYS = 7  # Exchange the user token again once it expires sooner than this
+AUTH_ERROR_CODE = 190  # Graph API OAuthException: token expired or invalid
+USER_TOKEN_KEY = "user"
+
+_tokens = {}  # key -> {"token", "page_id", "expires_at"}
+_tokens_source = None  # fingerprint of the FB_ACCESS_TOKEN _tokens was loaded for
+_lock = threading.RLock()
+
+def _fingerprint(token):
+    return hashlib.sha256(token.encode()).hexdigest()[:16]
+
+def _page_key(ig_id):
+    return f"page:{ig_id}"
+
+def _is_expired(entry, margin=datetime.timedelta(0)):
+    return entry["expires_at"] is not None and entry["expires_at"] - margin <= datetime.datetime.utcnow()
+
+def _load_tokens(source):
+    """Cached tokens derived from `source` as {key: entry}; empty if they can't be read."""
+    db = SessionLocal()
+    try:
+        rows = db.query(AccessToken).filter(AccessToken.source == source).all()
+        return {
+            row.key: {"token": row.token, "page_id": row.page_id, "expires_at": row.expires_at}
+            for row in rows
+        }
+    except SQLAlchemyError as e:
+        print(f"⚠️ Could not load cached tokens: {e}")
+        return {}
+    finally:
+        db.close()
+
+def _save_tokens(source, entries):
+    """Persist {key: entry} (an entry of None deletes the key). Failures only cost a re-fetch later."""
+    db = SessionLocal()
+    try:
+        now = datetime.datetime.utcnow()
+        for key, entry in entries.items():
+            if entry is None:
+                db.execute(delete(AccessToken).where(AccessToken.key == key))
+            else:
+                db.merge(AccessToken(key=key, source=source, updated_at=now, **entry))
+        db.commit()
+    except SQLAlchemyError as e:
+        db.rollback()
+        print(f"⚠️ Could not save tokens: {e}")
+    finally:
+        db.close()
+
+def _cache():
+    """(source, tokens) for the configured FB_ACCESS_TOKEN, loaded from the DB on first use."""
+    global _tokens_source
+    source = _fingerprint(get_fb_access_token())
+    with _lock:
+        if _tokens_source != source:
+            _tokens.clear()
+            _tokens.update(_load_tokens(source))
+            _tokens_source = source
+    return source, _tokens
+
+def get_user_token():
+    """The exchanged long-lived user token if there is a live one, else FB_ACCESS_TOKEN."""
+    _, tokens = _cache()
+    entry = tokens.get(USER_TOKEN_KEY)
+    if entry and not _is_expired(entry):
+        return entry["token"]
+    return get_fb_access_token()
+
+def get_token_for_account(ig_id):
+    """Page token of the account's Facebook Page if known, else the user token."""
+    _, tokens = _cache()
+    entry = tokens.get(_page_key(ig_id))
+    if entry and not _is_expired(entry):
+        return entry["token"]
+    return get_user_token()
+
+def store_page_tokens(pages):
+    """
+    Cache page tokens found during account discovery. Only tokens that changed are written.
+
+    Args:
+        pages: {ig_id: (page_id, page_token)}
+    """
+    source, tokens = _cache()
+    with _lock:
+        user_entry = tokens.get(USER_TOKEN_KEY)
+        # A page token lives as long as the user token it was fetched with
+        expires_at = user_entry["expires_at"] if user_entry else None
+        changed = {}
+        for ig_id, (page_id, page_token) in pages.items():
+            if not page_token:
+                continue
+            entry = {"token": page_token, "page_id": page_id, "expires_at": expires_at}
+            if tokens.get(_page_key(ig_id)) != entry:
+                tokens[_page_key(ig_id)] = entry
+                changed[_page_key(ig_id)] = entry
+    if changed:
+        _save_tokens(source, changed)
+
+def invalidate_account_token(ig_id):
+    """Drop an account's page token after the Graph API rejected it."""
+    source, tokens = _cache()
+    with _lock:
+        entry = tokens.pop(_page_key(ig_id), None)
+    if entry:
+        print(f"🔑 Page token for {ig_id} was rejected, using the user token")
+        _save_tokens(source, {_page_key(ig_id): None})
+
+def exchange_for_long_lived(token):
+    """
+    Exchange a user token for a long-lived one (grant_type=fb_exchange_token).
+    Returns (token, expires_at) or None if the exchange failed.
+    """
+    settings = get_settings().require("fb_app_id", "fb_app_secret")
+    try:
+        with metrics.span("token_exchange") as exchange_span:
+            resp = requests.get(
+                f"{settings.graph_api_url}/oauth/access_token",
+                params={
+                    "grant_type": "fb_exchange_token",
+                    "client_id": settings.fb_app_id,
+                    "client_secret": settings.fb_app_secret,
+                    "fb_exchange_token": token,
+                },
+            ).json()
+            exchange_span["exchanged"] = "access_token" in resp
+    except (requests.RequestException, ValueError) as e:
+        print(f"❌ Token exchange failed: {e}")
+        return None
+
+    if "access_token" not in resp:
+        print(f"❌ Token exchange failed: {resp.get('error', resp)}")
+        return None
+    expires_in = resp.get("expires_in")
+    expires_at = datetime.datetime.utcnow() + datetime.timedelta(seconds=int(expires_in)) if expires_in else None
+    return resp["access_token"], expires_at
+
+def ensure_fresh_token(min_valid=datetime.timedelta(days=TOKEN_REFRESH_DAYS)):
+    """
+    Exchange the user token if it was never exchanged or expires within min_valid.
+    Does nothing without FB_APP_ID / FB_APP_SECRET. Returns the user token to use.
+    """
+    settings = get_settings()
+    if not (settings.fb_app_id and settings.fb_app_secret):
+        return get_user_token()
+
+    source, tokens = _cache()
+    with _lock:  # One exchange per process, even with concurrent runs
+        entry = tokens.get(USER_TOKEN_KEY)
+        if entry and not _is_expired(entry, min_valid):
+            return entry["token"]
+
+        current = entry["token"] if entry and not _is_expired(entry) else get_fb_access_token()
+        exchanged = exchange_for_long_lived(current)
+        if exchanged is None:
+            return current
+        token, expires_at = exchanged
+        entry = {"token": token, "page_id": None, "expires_at": expires_at}
+        tokens[USER_TOKEN_KEY] = entry
+
+    _save_tokens(source, {USER_TOKEN_KEY: entry})
+    print(f"🔑 Long-lived token refreshed (expires: {expires_at or 'never'})")
+    return token
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage cached Graph API tokens")
+    parser.add_argument("command", choices=["status", "refresh"])
+    args = parser.parse_args()
+
+    if args.command == "refresh":
+        ensure_fresh_token()
+    _, tokens = _cache()
+    user_entry = tokens.get(USER_TOKEN_KEY)
+    pages = [key for key in tokens if key.startswith("page:")]
+    if user_entry:
+        print(f"👤 Long-lived user token, expires: {user_entry['expires_at'] or 'never'}")
+    else:
+        print("👤 Using FB_ACCESS_TOKEN as configured (not exchanged)")
+    print(f"📄 {len(pages)} cached page tokens")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Queries behind the Users admin page.
+
+Counts are SQL aggregates, and the listing is keyset-paginated by username and
+selects only the columns it shows (never password_hash). Activity is looked up
+only for the users on the current page, using the (username, timestamp) index
+on post_logs. The page costs the same with ten users or ten thousand.
+"""
+
+import datetime
+from sqlalchemy import func, select
+from db.utils import SessionLocal
+from db.models import User, UserRole, PostLog
+
+ACTIVITY_DAYS = 7  # "Posts this week"
+
+def get_user_stats():
+    """{"total", "active", "admins"} user counts, from one aggregate query."""
+    db = SessionLocal()
+    try:
+        row = db.execute(
+            select(
+                func.count().label("total"),
+                func.count().filter(User.is_active.is_(True)).label("active"),
+                func.count().filter(User.role == UserRole.ADMIN).label("admins"),
+            ).select_from(User)
+        ).one()
+        return row._asdict()
+    finally:
+        db.close()
+
+def list_users(search=None, limit=20, after=None):
+    """
+    One page of users ordered by username, as plain dicts.
+    search matches part of the username (case-insensitive); pass the previous
+    page's last username as `after`.
+    """
+    db = SessionLocal()
+    try:
+        query = select(
+            User.id, User.username, User.role, User.is_active, User.created_at, User.last_login_at,
+        )
+        if search:
+            query = query.where(User.username.icontains(search.strip(), autoescape=True))
+        if after:
+            query = query.where(User.username > after)
+        rows = db.execute(query.order_by(User.username).limit(limit)).all()
+        return [row._asdict() for row in rows]
+    finally:
+        db.close()
+
+def count_recent_posts(usernames, days=ACTIVITY_DAYS):
+    """{username: number of posts logged in the last `days` days} for the given users."""
+    if not usernames:
+        return {}
+    since = datetime.datetime.utcnow() - datetime.timedelta(days=days)
+    db = SessionLocal()
+    try:
+        rows = db.execute(
+            select(PostLog.username, func.count())
+            .where(PostLog.username.in_(list(usernames)), PostLog.timestamp >= since)
+            .group_by(PostLog.username)
+        ).all()
+        return dict(rows)
+    finally:
+        db.close()
@@ -2,23 +2,41 @@
 Lightweight script that checks if posts are due and triggers the heavy workflow.
 This runs every 15 minutes but only takes 1-2 seconds.
 Includes lock checking to prevent concurrent workflow runs.
+
+With --listen it instead runs as a dispatcher daemon: it LISTENs for new
+scheduled posts (NOTIFY from services.scheduler.schedule_post), arms a timer
+for the next due post and dispatches it within seconds. The cron run then
+only acts as a slow safety net.
 """
 
 import os
 import sys
 import json
+import select
+import time
+import argparse
+import subprocess
 import requests
 from datetime import datetime, timedelta
 from sqlalchemy import create_engine, text
 from sqlalchemy.pool import NullPool
+from db.notify import SCHEDULE_CHANNEL
+from db.workflow_lock import get_lock_holder
+from db.accounts import split_ig_ids
+from config import get_settings
+from services.scheduling_policy import estimate_cost, plan_shard_count
+from services.jobs import ORPHANED_JOB_MINUTES, STALE_JOB_MINUTES
 
-# Lock configuration
-LOCK_TIMEOUT_MINUTES = 360  # Max time a lock can be held
+# Dispatcher (--listen) configuration
+SAFETY_POLL_SECONDS = 300  # Re-check the DB at least this often even without notifications
+DISPATCH_COOLDOWN_SECONDS = 120  # Don't re-trigger the heavy workflow while it's starting up
+LISTEN_RETRY_MAX_SECONDS = 60  # Reconnect backoff cap after the LISTEN connection drops
 
 def check_if_locked():
     """
     Check if another workflow is currently running.
     Returns True if locked (skip this run), False if free to proceed.
+    A run that stopped heartbeating loses the lock within LOCK_TTL_SECONDS.
     """
     database_url = os.getenv("DATABASE_URL")
     if not database_url:
@@ -27,47 +45,19 @@ def check_if_locked():
     
     try:
         engine = create_engine(database_url, poolclass=NullPool)
+        holder = get_lock_holder(engine)
         
-        with engine.connect() as conn:
-            # Create lock table if it doesn't exist
-            conn.execute(text("""
-                CREATE TABLE IF NOT EXISTS workflow_locks (
-                    lock_name VARCHAR(100) PRIMARY KEY,
-                    locked_at TIMESTAMP NOT NULL,
-                    locked_by VARCHAR(200)
-                )
-            """))
-            conn.commit()
-            
-            # Check for existing lock
-            result = conn.execute(text("""
-                SELECT locked_at, locked_by 
-                FROM workflow_locks 
-                WHERE lock_name = 'instagram_poster'
-            """)).fetchone()
-            
-            if result:
-                locked_at, locked_by = result
-                age = datetime.utcnow() - locked_at
-                age_minutes = age.total_seconds() / 60
-                
-                if age_minutes < LOCK_TIMEOUT_MINUTES:
-                    print(f"⏳ Lock held by '{locked_by}' for {age_minutes:.1f} minutes")
-                    print(f"⏭️  Skipping - another workflow is running")
-                    return True  # Locked, skip this run
-                else:
-                    # Stale lock (workflow probably failed), remove it
-                    print(f"🧹 Removing stale lock ({age_minutes:.1f} minutes old)")
-                    conn.execute(text("""
-                        DELETE FROM workflow_locks 
-                        WHERE lock_name = 'instagram_poster'
-                    """))
-                    conn.commit()
-                    return False  # Lock removed, free to proceed
-            
-            # No lock exists
-            print("✅ No active lock found")
-            return False  # Free to proceed
+        if holder:
+            locked_by, locked_at, heartbeat_at = holder
+            age_minutes = (datetime.utcnow() - locked_at).total_seconds() / 60
+            beat = f", last heartbeat {heartbeat_at.strftime('%H:%M:%S')} UTC" if heartbeat_at else ""
+            print(f"⏳ Lock held by '{locked_by}' for {age_minutes:.1f} minutes{beat}")
+            print(f"⏭️  Skipping - another workflow is running")
+            return True  # Locked, skip this run
+        
+        # No live lock (an expired one belongs to a run that stopped heartbeating)
+        print("✅ No active lock found")
+        return False  # Free to proceed
             
     except Exception as e:
         print(f"❌ Error checking lock: {e}")
@@ -104,16 +94,94 @@ def check_for_due_posts():
             count = result[0] if result else 0
             
             print(f"📊 Found {count} posts due by {check_time.strftime('%Y-%m-%d %H:%M:%S')} UTC")
-            return count > 0
+            
+            # Posts still marked in progress although no heavy run holds the lock: the run
+            # that claimed them died, and the next run returns them to pending
+            stranded = conn.execute(text(
+                "SELECT COUNT(*) FROM scheduled_posts WHERE scheduled_time <= :check_time AND in_progress = true"
+            ), {"check_time": check_time}).scalar() or 0
+            if stranded:
+                print(f"📊 Found {stranded} posts left in progress by a stopped run")
+            
+            # Posts entering the pre-warm window whose containers haven't been created yet
+            lead_minutes = get_settings().prewarm_lead_minutes
+            to_prewarm = 0
+            if lead_minutes:
+                to_prewarm = conn.execute(text("""
+                    SELECT COUNT(*) FROM scheduled_posts p
+                    WHERE p.scheduled_time <= :prewarm_time
+                    AND p.in_progress = false
+                    AND NOT EXISTS (SELECT 1 FROM prewarmed_containers c WHERE c.post_id = p.id)
+                """), {"prewarm_time": datetime.utcnow() + timedelta(minutes=lead_minutes)}).scalar() or 0
+                if to_prewarm:
+                    print(f"📊 Found {to_prewarm} posts to pre-warm in the next {lead_minutes} minutes")
+            
+            # "Post Now" jobs that were queued but never started, or stopped mid-run (app restarted)
+            orphaned = conn.execute(text("""
+                SELECT COUNT(*) FROM post_jobs
+                WHERE (status = 'queued' AND created_at <= :cutoff)
+                   OR (status = 'running' AND COALESCE(updated_at, started_at, created_at) <= :stale_cutoff)
+            """), {
+                "cutoff": datetime.utcnow() - timedelta(minutes=ORPHANED_JOB_MINUTES),
+                "stale_cutoff": datetime.utcnow() - timedelta(minutes=STALE_JOB_MINUTES),
+            }).fetchone()
+            orphaned_count = orphaned[0] if orphaned else 0
+            if orphaned_count:
+                print(f"📊 Found {orphaned_count} orphaned Post Now jobs")
+            
+            return count > 0 or stranded > 0 or orphaned_count > 0 or to_prewarm > 0
             
     except Exception as e:
         print(f"❌ Database check error: {e}")
         # On error, trigger the workflow anyway to be safe
         return True
 
-def trigger_heavy_workflow():
+def plan_shards():
+    """
+    Number of parallel heavy workers (matrix shards) for the posts due now:
+    the estimated backlog (posts x accounts x media cost, see
+    services/scheduling_policy.py) split into SHARD_TARGET_SECONDS per worker,
+    capped by MAX_SHARDS. Returns 1 if anything is unclear.
+    """
+    max_shards = get_settings().max_shards
+    database_url = os.getenv("DATABASE_URL")
+    if max_shards <= 1 or not database_url:
+        return 1
+
+    try:
+        engine = create_engine(database_url, poolclass=NullPool)
+        with engine.connect() as conn:
+            rows = conn.execute(text("""
+                SELECT p.media_type, p.ig_ids, p.media_items,
+                    (SELECT COUNT(*) FROM prewarmed_containers c
+                     WHERE c.post_id = p.id AND c.status = 'ready') AS prewarmed,
+                    EXISTS (SELECT 1 FROM scheduled_post_accounts a WHERE a.post_id = p.id) AS has_accounts
+                FROM scheduled_posts p
+                WHERE p.scheduled_time <= :check_time
+                AND p.in_progress = false
+            """), {"check_time": datetime.utcnow() + timedelta(minutes=10)}).fetchall()
+    except Exception as e:
+        print(f"❌ Backlog check error: {e}")
+        return 1
+
+    if any(not row.has_accounts for row in rows):
+        # Shards claim accounts in scheduled_post_accounts; run --backfill-accounts for older posts
+        print("📊 Some due posts have no account rows, running a single worker")
+        return 1
+
+    backlog_seconds, accounts = 0, set()
+    for row in rows:
+        ig_ids = split_ig_ids(row.ig_ids)
+        accounts.update(ig_ids)
+        backlog_seconds += estimate_cost(row.media_type, len(ig_ids), row.media_items, row.prewarmed)
+    shards = plan_shard_count(backlog_seconds, len(accounts), max_shards)
+    print(f"📊 Backlog: ~{backlog_seconds / 60:.0f} min across {len(accounts)} accounts -> {shards} worker(s)")
+    return shards
+
+def trigger_heavy_workflow(shards=1):
     """
     Trigger the heavy posting workflow via GitHub API.
+    With shards > 1 it runs that many workers in parallel (a job matrix).
     """
     token = os.getenv("GITHUB_TOKEN")
     repository = os.getenv("GITHUB_REPOSITORY")  # Format: owner/repo
@@ -135,7 +203,8 @@ def trigger_heavy_workflow():
         "ref": "main",  # or "master" - your default branch
         "inputs": {
             "triggered_by": "smart_checker",
-            "check_time": datetime.utcnow().isoformat()
+            "check_time": datetime.utcnow().isoformat(),
+            "shards": str(shards)
         }
     }
     
@@ -154,6 +223,131 @@ def trigger_heavy_workflow():
         print(f"❌ Error triggering workflow: {e}")
         return False
 
+def get_next_due_time(engine):
+    """
+    Return the earliest time (naive UTC) a pending post needs the worker, or None:
+    its scheduled_time, or the start of its pre-warm window if it hasn't been pre-warmed.
+    """
+    lead_minutes = get_settings().prewarm_lead_minutes
+    with engine.connect() as conn:
+        next_due = conn.execute(text("""
+            SELECT MIN(scheduled_time)
+            FROM scheduled_posts
+            WHERE in_progress = false
+        """)).scalar()
+        if lead_minutes:
+            next_prewarm = conn.execute(text("""
+                SELECT MIN(p.scheduled_time)
+                FROM scheduled_posts p
+                WHERE p.in_progress = false
+                AND NOT EXISTS (SELECT 1 FROM prewarmed_containers c WHERE c.post_id = p.id)
+            """)).scalar()
+            if next_prewarm:
+                next_prewarm -= timedelta(minutes=lead_minutes)
+                next_due = min(next_due, next_prewarm) if next_due else next_prewarm
+        return next_due
+
+def dispatch(run_local, local_worker):
+    """
+    Start processing due posts, either by triggering the heavy workflow or by
+    running heavy_worker.py locally. Returns the local worker process (if any).
+    """
+    if check_if_locked():
+        return local_worker
+
+    if not run_local:
+        trigger_heavy_workflow(plan_shards())
+        return None
+
+    if local_worker is not None and local_worker.poll() is None:
+        print("⏳ Local worker still running")
+        return local_worker
+
+    print("🚀 Starting local heavy worker")
+    return subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "heavy_worker.py")])
+
+def listen_and_dispatch(run_local=False):
+    """
+    Dispatcher daemon: sleep until the next post is due or a NOTIFY arrives,
+    then dispatch. Polls at least every SAFETY_POLL_SECONDS as a safety net.
+    If the LISTEN connection drops (e.g. a database restart), it reconnects with
+    backoff while the timer and safety poll keep running.
+    """
+    import psycopg2
+    import psycopg2.extensions
+
+    database_url = os.getenv("DATABASE_URL")
+    if not database_url:
+        print("❌ DATABASE_URL not set")
+        sys.exit(1)
+
+    def connect_listener():
+        conn = psycopg2.connect(database_url)
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        conn.cursor().execute(f"LISTEN {SCHEDULE_CHANNEL}")
+        print(f"👂 Listening on '{SCHEDULE_CHANNEL}' (safety poll every {SAFETY_POLL_SECONDS}s)")
+        return conn
+
+    engine = create_engine(database_url, poolclass=NullPool)
+    listen_conn = None
+    retry_delay, next_retry = 1, datetime.utcnow()
+
+    last_dispatch = None
+    local_worker = None
+
+    while True:
+        now = datetime.utcnow()
+        try:
+            next_due = get_next_due_time(engine)
+        except Exception as e:
+            print(f"❌ Database check error: {e}")
+            next_due = None
+
+        cooling_down = last_dispatch and (now - last_dispatch).total_seconds() < DISPATCH_COOLDOWN_SECONDS
+        if next_due and next_due <= now and not cooling_down:
+            print(f"📬 Post due at {next_due.strftime('%H:%M:%S')} UTC - dispatching")
+            local_worker = dispatch(run_local, local_worker)
+            last_dispatch = now
+
+        # Arm a timer for the next due post (capped by the safety poll)
+        timeout = SAFETY_POLL_SECONDS
+        if next_due and next_due > now:
+            timeout = min(timeout, (next_due - now).total_seconds())
+        elif next_due and cooling_down:
+            timeout = min(timeout, DISPATCH_COOLDOWN_SECONDS - (now - last_dispatch).total_seconds())
+        timeout = max(timeout, 0.5)
+
+        if listen_conn is None and datetime.utcnow() >= next_retry:
+            try:
+                listen_conn = connect_listener()
+            except psycopg2.Error as e:
+                print(f"⚠️ Could not LISTEN (retrying in {retry_delay}s): {e}")
+                next_retry = datetime.utcnow() + timedelta(seconds=retry_delay)
+                retry_delay = min(retry_delay * 2, LISTEN_RETRY_MAX_SECONDS)
+
+        if listen_conn is None:
+            # No notifications until the listener is back; keep the timer and safety poll going
+            time.sleep(max(0.5, min(timeout, (next_retry - datetime.utcnow()).total_seconds())))
+            continue
+
+        try:
+            if select.select([listen_conn], [], [], timeout) != ([], [], []):
+                listen_conn.poll()
+                while listen_conn.notifies:
+                    notify = listen_conn.notifies.pop(0)
+                    print(f"🔔 New scheduled post: {notify.payload}")
+            retry_delay = 1
+        except (psycopg2.OperationalError, psycopg2.InterfaceError, OSError, ValueError) as e:
+            # ValueError/OSError: select() on a connection whose socket is already gone
+            print(f"⚠️ LISTEN connection lost, reconnecting: {e}")
+            try:
+                listen_conn.close()
+            except psycopg2.Error:
+                pass
+            listen_conn = None
+            next_retry = datetime.utcnow() + timedelta(seconds=retry_delay)
+            retry_delay = min(retry_delay * 2, LISTEN_RETRY_MAX_SECONDS)
+
 def main():
     """
     Main function - check and trigger if needed.
@@ -173,7 +367,7 @@ def main():
     
     if posts_due:
         print("📬 Posts are due! Triggering heavy workflow...")
-        success = trigger_heavy_workflow()
+        success = trigger_heavy_workflow(plan_shards())
         
         if success:
             print("🚀 Heavy poster workflow will acquire lock and run shortly")
@@ -189,4 +383,12 @@ def main():
     print(f"{'='*60}\n")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Trigger the heavy poster when scheduled posts are due")
+    parser.add_argument("--listen", action="store_true", help="Run as a LISTEN/NOTIFY dispatcher daemon")
+    parser.add_argument("--run-local", action="store_true", help="With --listen, run heavy_worker.py locally instead of triggering GitHub Actions")
+    args = parser.parse_args()
+
+    if args.listen:
+        listen_and_dispatch(run_local=args.run_local)
+    else:
+        main()
\ No newline at end of file
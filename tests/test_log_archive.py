@@ -0,0 +1,94 @@
+"""
+Archiving against a real PostgreSQL (partitions, DETACH, foreign keys).
+Set TEST_DATABASE_URL to an empty scratch database to run these; they are skipped otherwise.
+"""
+
+import datetime
+import os
+import shutil
+import pytest
+from sqlalchemy import create_engine, text
+from db.models import PostLog, PostLogAccount
+from db.partitions import add_months, month_start, ensure_log_partitions, list_partitions, partition_name
+from services import log_archive
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+pytestmark = pytest.mark.skipif(not TEST_DATABASE_URL, reason="needs TEST_DATABASE_URL (PostgreSQL)")
+
+NOW = datetime.datetime(2026, 10, 15)
+OLD_MONTH = add_months(month_start(NOW), -14)
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    engine = create_engine(TEST_DATABASE_URL)
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS post_log_accounts, post_logs CASCADE"))
+        for month in (OLD_MONTH, add_months(OLD_MONTH, 1)):
+            for table in ("post_log_accounts", "post_logs"):
+                conn.execute(text(f"DROP TABLE IF EXISTS {partition_name(table, month)}"))
+    PostLog.__table__.create(engine)
+    PostLogAccount.__table__.create(engine)
+    with engine.begin() as conn:
+        ensure_log_partitions(conn, OLD_MONTH)  # OLD_MONTH .. 3 months later
+        ensure_log_partitions(conn, NOW)
+        for day, month in enumerate((OLD_MONTH, OLD_MONTH, add_months(OLD_MONTH, 1), month_start(NOW))):
+            logged_at = month + datetime.timedelta(days=day)
+            log_id = conn.execute(text(
+                "INSERT INTO post_logs (username, ig_ids, caption, media_type, results, timestamp) "
+                "VALUES ('u', 'a,b', 'c', 'image', 'ok', :ts) RETURNING id"
+            ), {"ts": logged_at}).scalar()
+            for ig_id in ("a", "b"):
+                conn.execute(text(
+                    "INSERT INTO post_log_accounts (log_id, ig_id, logged_at) VALUES (:id, :ig, :ts)"
+                ), {"id": log_id, "ig": ig_id, "ts": logged_at})
+
+    def upload(path, key, fmt):  # Keep archives on disk instead of S3
+        target = tmp_path / key
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy(path, target)
+        return str(target)
+    monkeypatch.setattr(log_archive, "upload_archive", upload)
+    yield engine
+    engine.dispose()
+
+def archive_oldest(engine, keep_tables):
+    with engine.connect() as conn:
+        months = log_archive.archivable_months(conn, 12, NOW)
+    assert list(months) == [OLD_MONTH, add_months(OLD_MONTH, 1)]
+    return log_archive.archive_month(engine, OLD_MONTH, months[OLD_MONTH], "csv.gz", keep_tables)
+
+def table_exists(engine, name):
+    with engine.connect() as conn:
+        return conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar() is not None
+
+@pytest.mark.parametrize("keep_tables", [False, True])
+def test_archive_month_detaches_both_tables(engine, keep_tables):
+    archived = archive_oldest(engine, keep_tables)
+    assert archived["post_logs"][0] == 2 and archived["post_log_accounts"][0] == 4
+
+    with engine.connect() as conn:
+        for table in ("post_logs", "post_log_accounts"):
+            assert OLD_MONTH not in list_partitions(conn, table)
+            assert table_exists(engine, partition_name(table, OLD_MONTH)) == keep_tables
+        assert conn.execute(text("SELECT count(*) FROM post_logs")).scalar() == 2
+        assert conn.execute(text("SELECT count(*) FROM post_log_accounts")).scalar() == 4
+    if keep_tables:
+        kept = partition_name("post_log_accounts", OLD_MONTH)
+        with engine.connect() as conn:
+            assert conn.execute(text(f"SELECT count(*) FROM {kept}")).scalar() == 4
+            # The kept table must not reference post_logs, whose matching rows were detached with it
+            foreign_keys = conn.execute(text(
+                "SELECT count(*) FROM pg_constraint WHERE conrelid = to_regclass(:table) AND contype = 'f'"
+            ), {"table": kept}).scalar()
+            assert foreign_keys == 0
+
+def test_rows_in_default_partition_are_reported(engine, monkeypatch, capsys):
+    with engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO post_logs (username, ig_ids, caption, media_type, results, timestamp) "
+            "VALUES ('u', 'a', 'c', 'image', 'ok', :ts)"
+        ), {"ts": add_months(OLD_MONTH, -3)})
+    monkeypatch.setattr(log_archive, "get_engine", lambda: engine)
+    months = log_archive.archive_old_logs(retention_months=12, fmt="csv.gz", dry_run=True, now=NOW)
+    assert months == [OLD_MONTH, add_months(OLD_MONTH, 1)]
+    assert "1 post logs past the retention window are in post_logs_default" in capsys.readouterr().out
@@ -0,0 +1,47 @@
+"""
+Legacy log table handling in run_migrations() against a real PostgreSQL.
+Set TEST_DATABASE_URL to an empty scratch database to run these; they are skipped otherwise.
+"""
+
+import os
+import pytest
+from sqlalchemy import create_engine, text
+from db import migrations
+from db.partitions import is_legacy_log_table, list_partitions
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+pytestmark = pytest.mark.skipif(not TEST_DATABASE_URL, reason="needs TEST_DATABASE_URL (PostgreSQL)")
+
+@pytest.fixture
+def engine(monkeypatch):
+    engine = create_engine(TEST_DATABASE_URL)
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS post_log_accounts, post_logs CASCADE"))
+        # post_logs as created by versions before partitioning
+        conn.execute(text(
+            "CREATE TABLE post_logs (id SERIAL PRIMARY KEY, username VARCHAR, ig_ids TEXT, "
+            "caption TEXT, media_type VARCHAR, results TEXT, timestamp TIMESTAMP)"
+        ))
+        conn.execute(text(
+            "INSERT INTO post_logs (username, ig_ids, caption, media_type, results, timestamp) "
+            "VALUES ('u', 'a', 'c', 'image', 'ok', now())"
+        ))
+    monkeypatch.setattr(migrations, "get_engine", lambda: engine)
+    yield engine
+    engine.dispose()
+
+def test_app_migrations_leave_legacy_log_tables_alone(engine):
+    migrations.run_migrations(convert_legacy_logs=False)
+    with engine.begin() as conn:
+        assert is_legacy_log_table(conn)
+        assert list_partitions(conn, "post_logs") == {}
+        # The app can keep logging until the CLI converts the tables
+        conn.execute(text("INSERT INTO post_log_accounts (log_id, ig_id, logged_at) SELECT id, 'a', timestamp FROM post_logs"))
+
+def test_cli_migrations_convert_legacy_log_tables(engine):
+    migrations.run_migrations(convert_legacy_logs=False)
+    migrations.run_migrations()
+    with engine.begin() as conn:
+        assert not is_legacy_log_table(conn)
+        assert list_partitions(conn, "post_logs")
+        assert conn.execute(text("SELECT count(*) FROM post_logs")).scalar() == 1
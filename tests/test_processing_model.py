@@ -0,0 +1,52 @@
+import pytest
+from services import processing_model
+from services.processing_model import plan_processing, next_poll_delay, observed_seconds
+
+IG_ID = "17841400000000001"
+
+def simulate_wait(first_poll, deadline, true_seconds):
+    """Poll the way _wait_for_processing does; return the time that would be recorded."""
+    elapsed, last_in_progress = first_poll, None
+    while elapsed < true_seconds:
+        last_in_progress = elapsed
+        pause = next_poll_delay(elapsed, deadline)
+        if pause is None:
+            return None
+        elapsed += pause
+    return observed_seconds(last_in_progress, elapsed)
+
+@pytest.fixture
+def history(monkeypatch):
+    samples = []
+    monkeypatch.setattr(
+        processing_model, "_load_samples",
+        lambda ig_ids, kind: [(IG_ID, s, None) for s in samples[-processing_model.SAMPLES_PER_ACCOUNT:]],
+    )
+    return samples
+
+def post_video(history, true_seconds):
+    first_poll, deadline = plan_processing([IG_ID], "video")[IG_ID]
+    history.append(simulate_wait(first_poll, deadline, true_seconds))
+    return first_poll
+
+def test_estimate_falls_when_processing_gets_faster(history):
+    history.extend([120] * 20)
+    first_poll = post_video(history, 120)
+
+    for _ in range(60):
+        post_video(history, 40)
+    assert plan_processing([IG_ID], "video")[IG_ID][0] < first_poll
+    assert sorted(history[-20:])[10] < 60  # The median has followed processing down to ~40s
+
+def test_estimate_rises_when_processing_gets_slower(history):
+    history.extend([40] * 20)
+    first_poll = post_video(history, 40)
+
+    for _ in range(60):
+        post_video(history, 120)
+    assert plan_processing([IG_ID], "video")[IG_ID][0] > first_poll
+    assert 100 < sorted(history[-20:])[10] < 150
+
+def test_observed_seconds_is_midpoint_of_censoring_interval():
+    assert observed_seconds(None, 30) == 30
+    assert observed_seconds(30, 45) == 37.5
@@ -0,0 +1,29 @@
+import datetime
+import pytest
+from services.recurrence import parse_rule, REPEAT_PRESETS
+
+DTSTART = datetime.datetime(2026, 3, 2, 9, 0)
+
+@pytest.mark.parametrize("rule", [
+    "FREQ=HOURLY;BYMINUTE=0,15,30,45",
+    "FREQ=DAILY;BYHOUR=9;BYMINUTE=0,10,20,30,40,50",
+    "FREQ=DAILY;BYHOUR=9;BYMINUTE=0;BYSECOND=0,30",
+    "RRULE:FREQ=WEEKLY;BYDAY=MO;BYHOUR=9;BYMINUTE=0,59",
+])
+def test_sub_hourly_rules_are_rejected(rule):
+    with pytest.raises(ValueError):
+        parse_rule(rule, DTSTART)
+
+@pytest.mark.parametrize("rule", [
+    "FREQ=HOURLY",
+    "FREQ=HOURLY;BYMINUTE=30",
+    "FREQ=DAILY;BYHOUR=9,10,11;BYMINUTE=0",
+    "FREQ=WEEKLY;BYDAY=MO,WE,FR;UNTIL=20261231T235959",
+] + list(REPEAT_PRESETS.values()))
+def test_hourly_or_slower_rules_are_accepted(rule):
+    first = list(parse_rule(rule, DTSTART).xafter(DTSTART, count=10, inc=True))
+    assert all(later - earlier >= datetime.timedelta(hours=1) for earlier, later in zip(first, first[1:]))
+
+def test_frequency_must_be_allowed():
+    with pytest.raises(ValueError):
+        parse_rule("FREQ=MINUTELY", DTSTART)
@@ -4,17 +4,11 @@ import hashlib
 from typing import Optional, cast
 
 import streamlit as st
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from config import get_database_url
+from sqlalchemy import update
 
+from db.utils import SessionLocal
 from db.models import Session as DBSession, User, UserRole
 
-# --- DB connection using hybrid config ---
-DATABASE_URL = get_database_url()
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
 # session lifetime
 SESSION_DURATION_MINUTES = 1440
 
@@ -41,6 +35,8 @@ def _create_session(username: str) -> str:
         expires = datetime.datetime.utcnow() + datetime.timedelta(minutes=SESSION_DURATION_MINUTES)
         db_row = DBSession(username=username, session_token=token, expires_at=expires)
         db.add(db_row)
+        # Shown as "last login" on the Users page
+        db.execute(update(User).where(User.username == username).values(last_login_at=datetime.datetime.utcnow()))
         db.commit()
         return token
     finally:
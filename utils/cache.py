@@ -2,6 +2,8 @@ import streamlit as st
 from db.utils import SessionLocal
 from db.models import Group
 
+ACCOUNTS_CACHE_SECONDS = 600  # Same as the Graph API discovery cache (services/instagram_api.py)
+
 def load_groups_from_db():
     db = SessionLocal()
     groups = db.query(Group).all()
@@ -12,4 +14,24 @@ def load_groups_from_db():
 def get_groups_cache(force=False):
     if force or "groups_cache" not in st.session_state:
         st.session_state["groups_cache"] = load_groups_from_db()
-    return st.session_state["groups_cache"]
\ No newline at end of file
+    return st.session_state["groups_cache"]
+
+@st.cache_data(ttl=ACCOUNTS_CACHE_SECONDS, show_spinner="Loading Instagram accounts...")
+def _load_account_directory():
+    from services.instagram_api import get_instagram_accounts
+    return get_instagram_accounts()
+
+def get_account_directory(force=False):
+    """
+    {ig_id: account name} of every linked Instagram account.
+    Shared by all pages and sessions: discovery runs at most once per
+    ACCOUNTS_CACHE_SECONDS. force=True discovers again (e.g. after connecting a page).
+    """
+    if force:
+        from services import graph_cache
+        graph_cache.clear()
+        _load_account_directory.clear()
+    accounts = _load_account_directory()
+    if not accounts:
+        _load_account_directory.clear()  # Don't keep a failed discovery for the whole TTL
+    return accounts
@@ -0,0 +1,238 @@
+"""
+Per-phase timing instrumentation for the posting engine.
+
+Every instrumented phase (discovery, container create, processing wait, status
+polls, publish, S3 upload/delete, DB log write) is wrapped in span(), which:
+  - emits one JSON line per span (METRICS_JSONL: a file path, or "stderr")
+  - feeds per-run and per-account histograms, summarized by print_run_summary()
+  - is written as a Prometheus textfile by flush() (PROMETHEUS_TEXTFILE)
+  - is mirrored to OpenTelemetry when opentelemetry is installed and
+    OTEL_EXPORTER_OTLP_ENDPOINT is set
+"""
+
+import contextlib
+import datetime
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+from config import get_settings
+
+RUN_ID = os.getenv("GITHUB_RUN_ID") or uuid.uuid4().hex[:12]
+
+# Histogram buckets in seconds (Instagram processing waits run to several minutes)
+HISTOGRAM_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+MAX_SAMPLES_PER_SERIES = 10000  # raw samples kept for percentiles
+
+_lock = threading.Lock()
+_samples = defaultdict(list)       # (phase, account) -> [seconds]
+_errors = defaultdict(int)         # (phase, account) -> error count
+_counters = defaultdict(float)     # (name, labels) -> value
+_jsonl_file = None
+
+def _get_tracer():
+    """Return an OpenTelemetry tracer if it's installed and configured, else None."""
+    if not os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT"):
+        return None
+    try:
+        from opentelemetry import trace
+        return trace.get_tracer("instagram_poster")
+    except ImportError:
+        return None
+
+_tracer = _get_tracer()
+
+def _write_jsonl(record):
+    global _jsonl_file
+    target = get_settings().metrics_jsonl
+    if not target:
+        return
+    line = json.dumps(record, default=str)
+    with _lock:
+        if target == "stderr":
+            print(line, file=sys.stderr, flush=True)
+            return
+        if _jsonl_file is None:
+            _jsonl_file = open(target, "a", buffering=1)
+        _jsonl_file.write(line + "\n")
+
+def emit(event, **fields):
+    """Write a one-off structured event (e.g. a run summary) as a JSON line."""
+    _write_jsonl({
+        "ts": datetime.datetime.utcnow().isoformat(),
+        "run_id": RUN_ID,
+        "event": event,
+        **fields,
+    })
+
+def observe(phase, seconds, account=None, error=False):
+    """Record a duration for a phase without using span()."""
+    key = (phase, account or "")
+    with _lock:
+        samples = _samples[key]
+        if len(samples) < MAX_SAMPLES_PER_SERIES:
+            samples.append(seconds)
+        if error:
+            _errors[key] += 1
+
+def increment(name, value=1, **labels):
+    """Increment a counter (e.g. cache hits) identified by name and labels."""
+    with _lock:
+        _counters[(name, tuple(sorted(labels.items())))] += value
+
+@contextlib.contextmanager
+def span(phase, account=None, **attrs):
+    """
+    Time a phase of the posting engine.
+
+    Yields a dict; keys added to it are included in the emitted JSON line,
+    e.g. `with span("status_poll", account=ig_id) as s: s["status_code"] = code`.
+    """
+    fields = dict(attrs)
+    otel_cm = _tracer.start_as_current_span(phase) if _tracer else contextlib.nullcontext()
+    error = None
+    start = time.perf_counter()
+    with otel_cm as otel_span:
+        try:
+            yield fields
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            observe(phase, duration, account, error=error is not None)
+            if otel_span is not None:
+                otel_span.set_attribute("account", account or "")
+                for k, v in fields.items():
+                    otel_span.set_attribute(k, str(v))
+            _write_jsonl({
+                "ts": datetime.datetime.utcnow().isoformat(),
+                "run_id": RUN_ID,
+                "event": "span",
+                "phase": phase,
+                "account": account,
+                "duration_ms": round(duration * 1000, 1),
+                "status": "error" if error else "ok",
+                **({"error": str(error)} if error else {}),
+                **fields,
+            })
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def _summarize(values, errors=0):
+    values = sorted(values)
+    return {
+        "count": len(values),
+        "errors": errors,
+        "total_s": round(sum(values), 3),
+        "p50_s": round(_percentile(values, 50), 3),
+        "p95_s": round(_percentile(values, 95), 3),
+        "max_s": round(values[-1], 3) if values else 0.0,
+    }
+
+def run_summary():
+    """
+    Aggregate everything recorded so far.
+    Returns {"phases": {phase: stats}, "accounts": {account: {phase: stats}}, "counters": {...}}
+    """
+    with _lock:
+        samples = {k: list(v) for k, v in _samples.items()}
+        errors = dict(_errors)
+        counters = dict(_counters)
+
+    by_phase = defaultdict(list)
+    phase_errors = defaultdict(int)
+    accounts = defaultdict(dict)
+    for (phase, account), values in samples.items():
+        by_phase[phase].extend(values)
+        phase_errors[phase] += errors.get((phase, account), 0)
+        if account:
+            accounts[account][phase] = _summarize(values, errors.get((phase, account), 0))
+
+    return {
+        "phases": {p: _summarize(v, phase_errors[p]) for p, v in by_phase.items()},
+        "accounts": dict(accounts),
+        "counters": {
+            name + ("{" + ",".join(f"{k}={v}" for k, v in labels) + "}" if labels else ""): value
+            for (name, labels), value in counters.items()
+        },
+    }
+
+def print_run_summary():
+    """Print a per-phase timing table and emit it as a JSON line."""
+    summary = run_summary()
+    if not summary["phases"]:
+        return summary
+
+    print(f"\n⏱️  Phase timings (run {RUN_ID})")
+    print(f"{'phase':<24}{'count':>7}{'errors':>8}{'total s':>10}{'p50 s':>9}{'p95 s':>9}{'max s':>9}")
+    for phase, s in sorted(summary["phases"].items(), key=lambda kv: -kv[1]["total_s"]):
+        print(f"{phase:<24}{s['count']:>7}{s['errors']:>8}{s['total_s']:>10.1f}"
+              f"{s['p50_s']:>9.2f}{s['p95_s']:>9.2f}{s['max_s']:>9.2f}")
+
+    emit("run_summary", **summary)
+    return summary
+
+def write_prometheus_textfile(path):
+    """Write histograms and counters in the Prometheus textfile-collector format."""
+    with _lock:
+        samples = {k: list(v) for k, v in _samples.items()}
+        errors = dict(_errors)
+        counters = dict(_counters)
+
+    lines = [
+        "# HELP instagram_poster_phase_seconds Duration of posting engine phases",
+        "# TYPE instagram_poster_phase_seconds histogram",
+    ]
+    for (phase, account), values in sorted(samples.items()):
+        labels = f'phase="{phase}",account="{account}"'
+        for bound in HISTOGRAM_BUCKETS:
+            lines.append(f'instagram_poster_phase_seconds_bucket{{{labels},le="{bound}"}} '
+                         f"{len([v for v in values if v <= bound])}")
+        lines.append(f'instagram_poster_phase_seconds_bucket{{{labels},le="+Inf"}} {len(values)}')
+        lines.append(f"instagram_poster_phase_seconds_sum{{{labels}}} {sum(values):.6f}")
+        lines.append(f"instagram_poster_phase_seconds_count{{{labels}}} {len(values)}")
+
+    lines.append("# TYPE instagram_poster_phase_errors_total counter")
+    for (phase, account), count in sorted(errors.items()):
+        lines.append(f'instagram_poster_phase_errors_total{{phase="{phase}",account="{account}"}} {count}')
+
+    typed = set()
+    for (name, labels), value in sorted(counters.items()):
+        if name not in typed:
+            lines.append(f"# TYPE instagram_poster_{name}_total counter")
+            typed.add(name)
+        label_str = ",".join(f'{k}="{v}"' for k, v in labels)
+        lines.append(f"instagram_poster_{name}_total{{{label_str}}} {value}")
+
+    # Write atomically so the node exporter never reads a partial file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp_path, path)
+
+def flush():
+    """Print the run summary and write the Prometheus textfile if configured."""
+    summary = print_run_summary()
+    textfile = get_settings().prometheus_textfile
+    if textfile:
+        try:
+            write_prometheus_textfile(textfile)
+        except OSError as e:
+            print(f"⚠️ Could not write Prometheus textfile: {e}")
+    return summary
+
+def reset():
+    """Clear all recorded samples and counters (e.g. between benchmark cases)."""
+    with _lock:
+        _samples.clear()
+        _errors.clear()
+        _counters.clear()
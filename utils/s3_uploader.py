@@ -0,0 +1,80 @@
+"""
+Streamlit widget for direct browser-to-S3 uploads (services/direct_upload.py).
+
+The browser half lives in s3_uploader_frontend/index.html. The widget and the
+app exchange small events only:
+
+- "picked": the user chose a file; the app signs an upload plan and renders it
+- "uploaded": S3 has the file; the app completes a multipart upload and verifies it with HEAD
+- "failed": the browser gave up; the app aborts the multipart upload
+
+The verified upload is kept in session state until take_direct_upload()
+hands it to a post, so one object is never scheduled twice.
+"""
+
+import os
+import streamlit as st
+import streamlit.components.v1 as components
+from services.direct_upload import plan_upload, complete_upload, abort_upload, verify_upload
+
+_component = components.declare_component(
+    "s3_uploader", path=os.path.join(os.path.dirname(__file__), "s3_uploader_frontend")
+)
+
+def _state(key):
+    return st.session_state.setdefault(f"{key}_state", {"plan": None, "result": None, "error": None, "seq": None})
+
+def _handle(state, event):
+    """Apply one widget event to the upload state."""
+    plan = state["plan"]
+    if event["event"] == "picked":
+        if plan and not state["result"]:
+            abort_upload(plan)  # A different file replaces an unfinished upload
+        state.update(plan=None, result=None, error=None)
+        try:
+            state["plan"] = plan_upload(event["name"], event["size"])
+        except ValueError as e:
+            state["error"] = str(e)
+        except Exception as e:
+            state["error"] = f"Could not start the upload: {e}"
+        return
+
+    if not plan or event.get("key") != plan["key"]:
+        return  # Stale event for an upload that was already replaced
+    if event["event"] == "failed":
+        abort_upload(plan)
+        state.update(plan=None, error=f"Upload failed: {event.get('message')}")
+        return
+
+    try:
+        complete_upload(plan, event.get("parts") or [])
+    except Exception as e:
+        abort_upload(plan)
+        state.update(plan=None, error=f"Could not complete the upload: {e}")
+        return
+    media_url, s3_key, file_type = verify_upload(plan["key"], plan["size"])
+    if media_url:
+        state["result"] = (media_url, s3_key, file_type)
+    else:
+        state.update(plan=None, error=file_type)
+
+def s3_uploader(key="direct_upload"):
+    """
+    Render the direct-to-S3 uploader.
+    Returns (public_url, s3_key, file_type) once the upload is verified, else None.
+    """
+    state = _state(key)
+    event = _component(plan=state["plan"], done=bool(state["result"]), error=state["error"], key=key, default=None)
+    if event and event.get("seq") != state["seq"]:
+        state["seq"] = event["seq"]
+        with st.spinner("Checking upload..."):
+            _handle(state, event)
+        st.rerun()  # Send the new plan/result to the widget
+    return state["result"]
+
+def take_direct_upload(key="direct_upload"):
+    """Hand the verified upload to a post and reset the widget for the next file."""
+    state = _state(key)
+    result = state["result"]
+    state.update(plan=None, result=None, error=None)
+    return result